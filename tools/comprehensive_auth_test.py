@@ -13,6 +13,10 @@ from playwright.async_api import async_playwright
 import json
 from datetime import datetime
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'utilities'))
+from artifact_store import ArtifactStore
 
 class AuthenticationTester:
     def __init__(self):
@@ -21,6 +25,8 @@ class AuthenticationTester:
         self.admin_password = "Admin123!"
         self.results = []
         self.screenshots_dir = "auth_test_screenshots"
+        self.artifacts = ArtifactStore()
+        self.run_id = self.artifacts.start_run(self.screenshots_dir)
         
     async def setup_browser(self, mobile=False):
         """Setup browser with appropriate viewport"""
@@ -52,7 +58,9 @@ class AuthenticationTester:
         """Take screenshot for debugging"""
         os.makedirs(self.screenshots_dir, exist_ok=True)
         screenshot_path = f"{self.screenshots_dir}/{name}.png"
-        await page.screenshot(path=screenshot_path)
+        data = await page.screenshot()
+        # PNG recompression is CPU-bound; keep it off the event loop
+        await asyncio.to_thread(self.artifacts.save_screenshot, self.run_id, f"{name}.png", data, screenshot_path)
         return screenshot_path
 
     async def login_admin(self, page, console_errors):
@@ -352,6 +360,7 @@ class AuthenticationTester:
         report_file = f"auth_test_results_{timestamp}.json"
         with open(report_file, 'w') as f:
             json.dump(report, f, indent=2)
+        self.artifacts.put_file(self.run_id, report_file, report_file)
         
         # Print summary
         print("\n" + "=" * 50)
@@ -369,6 +378,7 @@ class AuthenticationTester:
         
         print(f"\n📁 Detailed report saved: {report_file}")
         print(f"📸 Screenshots saved in: {self.screenshots_dir}/")
+        print(self.artifacts.stats.summary())
         
         return report
 
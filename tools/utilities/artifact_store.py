@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+
+import argparse
+import hashlib
+import io
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+from PIL import Image
+
+# Next to the repository checkout so materialized files can be hard links
+DEFAULT_STORE_PATH = Path(__file__).resolve().parents[2] / '.artifacts'
+
+class Artifact(NamedTuple):
+    """One named file of a run."""
+    run: str
+    name: str
+    blob: str
+    size: int  # Size of the file as written by the caller
+
+@dataclass
+class StoreStats:
+    """Counters for one process."""
+    stored: int = 0          # Artifacts recorded
+    new_blobs: int = 0       # Of which had content not seen before
+    bytes_in: int = 0        # Bytes handed to the store
+    bytes_written: int = 0   # Blob bytes actually written
+
+    def summary(self) -> str:
+        saved = self.bytes_in - self.bytes_written
+        rate = saved / self.bytes_in * 100 if self.bytes_in else 0.0
+        return (f"Artifacts: {self.stored} stored, {self.new_blobs} new blobs, "
+                f"{self.bytes_written / 1024:.0f} KB written for {self.bytes_in / 1024:.0f} KB "
+                f"({rate:.0f}% saved)")
+
+class ArtifactStore:
+    """
+    Content-addressed store for screenshots and reports of audit runs.
+
+    Files are kept once per distinct content under ``blobs/``; a SQLite
+    manifest maps (run, name) to blobs. PNGs are keyed by their decoded pixels,
+    so re-encoded but identical screenshots share a blob, and are stored
+    recompressed losslessly when that is smaller. Other files are keyed by
+    their bytes. gc() drops old runs and the blobs only they referenced.
+    Safe to share between threads.
+    """
+
+    def __init__(self, path: Path = DEFAULT_STORE_PATH):
+        self.path = Path(path)
+        self.stats = StoreStats()
+        self._lock = threading.Lock()
+        (self.path / 'blobs').mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path / 'manifest.sqlite'), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS runs (
+                run TEXT PRIMARY KEY,
+                label TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS artifacts (
+                run TEXT NOT NULL,
+                name TEXT NOT NULL,
+                blob TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                PRIMARY KEY (run, name)
+            );
+            CREATE INDEX IF NOT EXISTS artifacts_blob ON artifacts (blob);
+            CREATE TABLE IF NOT EXISTS blobs (
+                blob TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL
+            );
+            -- Raw input digest -> blob, so repeated identical files skip decoding
+            CREATE TABLE IF NOT EXISTS aliases (
+                digest TEXT PRIMARY KEY,
+                blob TEXT NOT NULL
+            );
+        """)
+        self._db.commit()
+
+    def start_run(self, label: str, run: Optional[str] = None) -> str:
+        """Register a run and return its id (``<label>-<timestamp>`` by default)."""
+        run = run or f"{label}-{time.strftime('%Y%m%dT%H%M%S')}"
+        with self._lock:
+            self._db.execute("INSERT OR IGNORE INTO runs VALUES (?, ?, ?)", (run, label, time.time()))
+            self._db.commit()
+        return run
+
+    def blob_path(self, blob: str) -> Path:
+        return self.path / 'blobs' / blob[:2] / blob
+
+    @staticmethod
+    def _encode(data: bytes, suffix: str):
+        """Return (blob key, bytes to store) for ``data``."""
+        if suffix == '.png':
+            try:
+                with Image.open(io.BytesIO(data)) as image:
+                    image.load()
+                    h = hashlib.sha256(f"{image.mode}:{image.size}:".encode())
+                    h.update(image.tobytes())
+                    out = io.BytesIO()
+                    image.save(out, 'PNG', optimize=True)
+                recompressed = out.getvalue()
+                return h.hexdigest() + suffix, min(recompressed, data, key=len)
+            except Exception:
+                pass  # Not a readable PNG; store it as plain bytes
+        return hashlib.sha256(data).hexdigest() + suffix, data
+
+    def put_bytes(self, run: str, name: str, data: bytes, suffix: str = '.png') -> Artifact:
+        """
+        Store ``data`` as ``name`` in ``run``.
+
+        Args:
+            run (str): Run id from start_run
+            name (str): Artifact name within the run, e.g. ``public__shoes.png``
+            data (bytes): File content
+            suffix (str): File type; '.png' enables pixel keys and recompression
+
+        Returns:
+            Artifact: Manifest entry
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            row = self._db.execute("SELECT blob FROM aliases WHERE digest = ?", (digest,)).fetchone()
+        blob = row[0] if row else None
+        written = 0
+        if blob is None or not self.blob_path(blob).exists():
+            blob, stored = self._encode(data, suffix)
+            path = self.blob_path(blob)
+            if not path.exists():
+                path.parent.mkdir(exist_ok=True)
+                tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}")
+                tmp.write_bytes(stored)
+                os.chmod(tmp, 0o444)  # Blobs are shared through hard links; never edit in place
+                os.replace(tmp, path)
+                written = len(stored)
+        with self._lock:
+            if written:
+                self._db.execute("INSERT OR REPLACE INTO blobs VALUES (?, ?, ?)", (blob, written, time.time()))
+            self._db.execute("INSERT OR REPLACE INTO aliases VALUES (?, ?)", (digest, blob))
+            self._db.execute("INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?, ?)", (run, name, blob, len(data)))
+            self._db.commit()
+            self.stats.stored += 1
+            self.stats.bytes_in += len(data)
+            if written:
+                self.stats.new_blobs += 1
+                self.stats.bytes_written += written
+        return Artifact(run, name, blob, len(data))
+
+    def put_file(self, run: str, name: str, path: Path) -> Artifact:
+        """Store the file at ``path``."""
+        path = Path(path)
+        return self.put_bytes(run, name, path.read_bytes(), path.suffix.lower())
+
+    def materialize(self, artifact: Artifact, dest: Path) -> Path:
+        """
+        Make ``dest`` show the artifact, as a hard link to its blob when possible.
+
+        Any existing file at ``dest`` is replaced rather than written through,
+        so a link to another blob is never modified.
+        """
+        dest = Path(dest)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        if dest.exists() or dest.is_symlink():
+            dest.unlink()
+        try:
+            os.link(self.blob_path(artifact.blob), dest)
+        except OSError:
+            shutil.copyfile(self.blob_path(artifact.blob), dest)
+        return dest
+
+    def save_screenshot(self, run: str, name: str, data: bytes, dest: Path) -> Path:
+        """
+        Store PNG bytes from ``page.screenshot()`` and materialize them at ``dest``.
+
+        New screenshots are decoded and recompressed, which takes a while for
+        full pages; async callers should run this with ``asyncio.to_thread``.
+        """
+        return self.materialize(self.put_bytes(run, name, data, '.png'), dest)
+
+    def artifacts(self, run: str) -> List[Artifact]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT run, name, blob, size FROM artifacts WHERE run = ? ORDER BY name", (run,)).fetchall()
+        return [Artifact(*row) for row in rows]
+
+    def runs(self, label: Optional[str] = None) -> List[Dict]:
+        """Runs, newest first, with their artifact count and logical size."""
+        query = """SELECT r.run, r.label, r.created_at, COUNT(a.name), COALESCE(SUM(a.size), 0)
+                   FROM runs r LEFT JOIN artifacts a ON a.run = r.run
+                   {} GROUP BY r.run ORDER BY r.created_at DESC"""
+        with self._lock:
+            if label is None:
+                rows = self._db.execute(query.format("")).fetchall()
+            else:
+                rows = self._db.execute(query.format("WHERE r.label = ?"), (label,)).fetchall()
+        return [{'run': run, 'label': lbl, 'created_at': created, 'artifacts': count, 'bytes': size}
+                for run, lbl, created, count, size in rows]
+
+    def export(self, run: str, dest: Path) -> int:
+        """Materialize every artifact of ``run`` under ``dest``. Returns the number of files."""
+        artifacts = self.artifacts(run)
+        for artifact in artifacts:
+            self.materialize(artifact, Path(dest) / artifact.name)
+        return len(artifacts)
+
+    def gc(self, keep_last: Optional[int] = None, max_age_days: Optional[float] = None,
+           dry_run: bool = False) -> Dict[str, int]:
+        """
+        Drop runs outside the retention policy, then blobs no run references.
+
+        Args:
+            keep_last (int, optional): Runs kept per label, newest first
+            max_age_days (float, optional): Runs older than this are dropped
+                (unless among the ``keep_last`` newest of their label)
+            dry_run (bool): Only report what would be removed
+
+        Returns:
+            Dict[str, int]: Runs and blobs removed and bytes freed
+        """
+        now = time.time()
+        with self._lock:
+            rows = self._db.execute("SELECT run, label, created_at FROM runs ORDER BY created_at DESC").fetchall()
+            rank: Dict[str, int] = {}
+            doomed = []
+            for run, label, created_at in rows:
+                rank[label] = rank.get(label, 0) + 1
+                protected = keep_last is not None and rank[label] <= keep_last
+                too_many = keep_last is not None and rank[label] > keep_last
+                too_old = max_age_days is not None and now - created_at > max_age_days * 86400
+                if not protected and (too_many or too_old):
+                    doomed.append(run)
+
+            remaining = {blob for (blob,) in self._db.execute(
+                f"SELECT DISTINCT blob FROM artifacts WHERE run NOT IN ({','.join('?' * len(doomed))})", doomed)}
+            orphans = [(blob, size) for blob, size in self._db.execute("SELECT blob, size FROM blobs")
+                       if blob not in remaining]
+            if not dry_run:
+                self._db.executemany("DELETE FROM artifacts WHERE run = ?", ((run,) for run in doomed))
+                self._db.executemany("DELETE FROM runs WHERE run = ?", ((run,) for run in doomed))
+                self._db.executemany("DELETE FROM blobs WHERE blob = ?", ((blob,) for blob, _ in orphans))
+                self._db.executemany("DELETE FROM aliases WHERE blob = ?", ((blob,) for blob, _ in orphans))
+                self._db.commit()
+        if not dry_run:
+            for blob, _ in orphans:
+                # Hard-linked copies in audit directories keep their content
+                self.blob_path(blob).unlink(missing_ok=True)
+        return {'runs': len(doomed), 'blobs': len(orphans), 'bytes': sum(size for _, size in orphans)}
+
+    def usage(self) -> Dict[str, int]:
+        """Runs, artifacts and blobs, with logical and stored bytes."""
+        with self._lock:
+            runs = self._db.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+            artifacts, logical = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM artifacts").fetchone()
+            blobs, stored = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+        return {'runs': runs, 'artifacts': artifacts, 'logical_bytes': logical, 'blobs': blobs,
+                'stored_bytes': stored}
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+def ingest_directory(store: ArtifactStore, directory: Path, label: Optional[str] = None,
+                     link: bool = False) -> str:
+    """
+    Record every file below ``directory`` as a new run.
+
+    Args:
+        store (ArtifactStore): Target store
+        directory (Path): e.g. an existing audit screenshot directory
+        label (str, optional): Run label; defaults to the directory name
+        link (bool): Replace the originals with hard links to the blobs, so
+            duplicate files stop taking space
+
+    Returns:
+        str: Run id
+    """
+    directory = Path(directory)
+    run = store.start_run(label or directory.resolve().name)
+    for path in sorted(p for p in directory.rglob('*') if p.is_file()):
+        artifact = store.put_file(run, path.relative_to(directory).as_posix(), path)
+        if link:
+            store.materialize(artifact, path)
+    return run
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect, fill and clean the audit artifact store')
+    parser.add_argument('--path', type=Path, default=DEFAULT_STORE_PATH,
+                        help=f'Store directory (default: {DEFAULT_STORE_PATH})')
+    parser.add_argument('--ingest', type=Path, action='append', default=[], metavar='DIR',
+                        help='Record the files of an existing directory as a new run (repeatable)')
+    parser.add_argument('--label', help='Run label for --ingest (default: directory name)')
+    parser.add_argument('--link', action='store_true',
+                        help='With --ingest, replace the original files with read-only hard links into '
+                             'the store; tools that rewrite them in place must delete them first')
+    parser.add_argument('--export', nargs=2, metavar=('RUN', 'DIR'), help='Write the files of a run to DIR')
+    parser.add_argument('--runs', action='store_true', help='List runs')
+    parser.add_argument('--gc', action='store_true', help='Remove runs outside the retention policy')
+    parser.add_argument('--keep-last', type=int, help='With --gc, runs kept per label')
+    parser.add_argument('--max-age-days', type=float, help='With --gc, drop runs older than this')
+    parser.add_argument('--dry-run', action='store_true', help='With --gc, only report what would go')
+    args = parser.parse_args()
+
+    store = ArtifactStore(args.path)
+    for directory in args.ingest:
+        run = ingest_directory(store, directory, args.label, args.link)
+        print(f"Ingested {directory} as {run}")
+    if args.ingest:
+        print(store.stats.summary())
+    if args.export:
+        count = store.export(*args.export)
+        print(f"Exported {count} files to {args.export[1]}")
+    if args.gc:
+        if args.keep_last is None and args.max_age_days is None:
+            parser.error("--gc needs --keep-last and/or --max-age-days")
+        removed = store.gc(args.keep_last, args.max_age_days, args.dry_run)
+        prefix = "Would remove" if args.dry_run else "Removed"
+        print(f"{prefix} {removed['runs']} runs and {removed['blobs']} blobs "
+              f"({removed['bytes'] / 1024 / 1024:.1f} MB)")
+    if args.runs:
+        for info in store.runs():
+            created = time.strftime('%Y-%m-%d %H:%M', time.localtime(info['created_at']))
+            print(f"{info['run']:50} {created}  {info['artifacts']:4} files  {info['bytes'] / 1024 / 1024:7.1f} MB")
+    usage = store.usage()
+    print(f"{args.path}: {usage['runs']} runs, {usage['artifacts']} artifacts "
+          f"({usage['logical_bytes'] / 1024 / 1024:.1f} MB) in {usage['blobs']} blobs "
+          f"({usage['stored_bytes'] / 1024 / 1024:.1f} MB stored)", file=sys.stderr)
+    store.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,77 +1,154 @@
 #!/usr/bin/env /workspace/tmp_windsurf/venv/bin/python3
 
-import google.generativeai as genai
-from openai import OpenAI, AzureOpenAI
-from anthropic import Anthropic
 import argparse
+import asyncio
 import os
-from dotenv import load_dotenv
 from pathlib import Path
+import random
 import sys
-import base64
-from typing import Optional, Union, List
-import mimetypes
+import threading
+import time
+from typing import AsyncIterable, AsyncIterator, Dict, Iterable, Iterator, NamedTuple, Optional, Union, List
 
-def load_environment():
-    """Load environment variables from .env files in order of precedence"""
+# Provider SDKs (openai, anthropic, google.generativeai) and python-dotenv are
+# imported on first use, so importing this module or running a single query
+# only pays for the SDK that is actually needed. See llm_import_benchmark.py.
+
+_env_lock = threading.Lock()
+_env_loaded = False
+
+def load_environment(verbose: bool = False, force: bool = False):
+    """
+    Load environment variables from .env files in order of precedence.
+    
+    Runs once per process; later calls return immediately unless ``force``.
+    Provider clients call it on demand, so importing this module reads nothing.
+    
+    Args:
+        verbose (bool): Report which files were loaded and how many keys each set
+        force (bool): Load the files again even if they were loaded already
+    """
     # Order of precedence:
     # 1. System environment variables (already loaded)
     # 2. .env.local (user-specific overrides)
     # 3. .env (project defaults)
     # 4. .env.example (example configuration)
-    
-    env_files = ['.env.local', '.env', '.env.example']
-    env_loaded = False
-    
-    print("Current working directory:", Path('.').absolute(), file=sys.stderr)
-    print("Looking for environment files:", env_files, file=sys.stderr)
-    
-    for env_file in env_files:
-        env_path = Path('.') / env_file
-        print(f"Checking {env_path.absolute()}", file=sys.stderr)
-        if env_path.exists():
-            print(f"Found {env_file}, loading variables...", file=sys.stderr)
+    global _env_loaded
+    with _env_lock:
+        if _env_loaded and not force:
+            return
+        _env_loaded = True
+        
+        env_files = ['.env.local', '.env', '.env.example']
+        found = [Path('.') / env_file for env_file in env_files if (Path('.') / env_file).exists()]
+        if not found:
+            if verbose:
+                print(f"No .env files in {Path('.').absolute()}; using system environment variables only.",
+                      file=sys.stderr)
+            return
+        
+        from dotenv import dotenv_values, load_dotenv
+        for env_path in found:
             load_dotenv(dotenv_path=env_path)
-            env_loaded = True
-            print(f"Loaded environment variables from {env_file}", file=sys.stderr)
-            # Print loaded keys (but not values for security)
-            with open(env_path) as f:
-                keys = [line.split('=')[0].strip() for line in f if '=' in line and not line.startswith('#')]
-                print(f"Keys loaded from {env_file}: {keys}", file=sys.stderr)
-    
-    if not env_loaded:
-        print("Warning: No .env files found. Using system environment variables only.", file=sys.stderr)
-        print("Available system environment variables:", list(os.environ.keys()), file=sys.stderr)
-
-# Load environment variables at module import
-load_environment()
+            if verbose:
+                # Count keys only; names and values stay out of the logs
+                print(f"Loaded {len(dotenv_values(env_path))} variables from {env_path.absolute()}",
+                      file=sys.stderr)
 
-def encode_image_file(image_path: str) -> tuple[str, str]:
+def encode_image_file(image_path: str, provider: Optional[str] = None) -> tuple[str, str]:
     """
     Encode an image file to base64 and determine its MIME type.
     
+    With a provider, the image is first scaled and recompressed to that
+    provider's limits (see llm_images.prepare_image). Encodings are memoized
+    by file content.
+    
     Args:
         image_path (str): Path to the image file
+        provider (str, optional): Provider the image is sent to
         
     Returns:
         tuple: (base64_encoded_string, mime_type)
     """
-    mime_type, _ = mimetypes.guess_type(image_path)
-    if not mime_type:
-        mime_type = 'image/png'  # Default to PNG if type cannot be determined
-        
-    with open(image_path, "rb") as image_file:
-        encoded_string = base64.b64encode(image_file.read()).decode('utf-8')
-        
-    return encoded_string, mime_type
+    from llm_images import prepare_image
+    image = prepare_image(image_path, provider)
+    return image.base64(), image.mime_type
+
+_gemini_uploads = None
+
+def _gemini_file_part(genai, image_path: str) -> dict:
+    """Reference to ``image_path`` on Gemini, reusing an earlier upload of the same image."""
+    global _gemini_uploads
+    from llm_images import GeminiUploads, prepare_image
+    with _gemini_lock:
+        if _gemini_uploads is None:
+            _gemini_uploads = GeminiUploads()
+    return _gemini_uploads.file_part(genai, prepare_image(image_path, "gemini"))
+
+class ClientLimits(NamedTuple):
+    """HTTP connection pool and timeout settings for provider clients."""
+    max_connections: int = 20           # Open connections per client
+    max_keepalive_connections: int = 10  # Idle connections kept warm
+    keepalive_expiry: float = 60.0      # Seconds an idle connection is kept
+    timeout: float = 120.0              # Seconds per request
+    max_retries: int = 2                # SDK-level retries on connection errors, 429 and 5xx (query_many retries itself)
+
+DEFAULT_CLIENT_LIMITS = ClientLimits()
 
-def create_llm_client(provider="openai"):
+def _http_module(sdk):
+    """The HTTP library the SDK's default client is built on (httpx, or httpx2 in newer releases)."""
+    for base in sdk.DefaultHttpxClient.__mro__[1:]:
+        module = sys.modules.get(base.__module__.partition('.')[0])
+        if module is not None and hasattr(module, 'Limits'):
+            return module
+    raise ImportError(f"Cannot find the HTTP library of {sdk.__name__}")
+
+def _http_options(sdk, limits: ClientLimits) -> dict:
+    """Keyword arguments giving an OpenAI or Anthropic client a keep-alive connection pool."""
+    http = _http_module(sdk)
+    return {
+        # The SDK's default client class keeps its redirect and header defaults
+        "http_client": sdk.DefaultHttpxClient(
+            limits=http.Limits(max_connections=limits.max_connections,
+                               max_keepalive_connections=limits.max_keepalive_connections,
+                               keepalive_expiry=limits.keepalive_expiry),
+            timeout=limits.timeout,
+        ),
+        "timeout": limits.timeout,
+        "max_retries": limits.max_retries,
+    }
+
+_gemini_lock = threading.Lock()
+_gemini_api_key = None
+
+def create_llm_client(provider="openai", limits: Optional[ClientLimits] = None):
+    """
+    Create a new client for ``provider``.
+    
+    Prefer get_llm_client, which reuses one client (and its warm connections)
+    per provider.
+    
+    Args:
+        provider (str): The API provider
+        limits (ClientLimits, optional): Connection pool settings. Defaults to DEFAULT_CLIENT_LIMITS.
+    """
+    global _gemini_api_key
+    load_environment()
+    limits = limits or DEFAULT_CLIENT_LIMITS
+    if provider in ("openai", "azure", "deepseek", "siliconflow", "local"):
+        import openai as sdk
+        from openai import OpenAI, AzureOpenAI
+    elif provider == "anthropic":
+        import anthropic as sdk
+        from anthropic import Anthropic
+    
     if provider == "openai":
         api_key = os.getenv('OPENAI_API_KEY')
         if not api_key:
             raise ValueError("OPENAI_API_KEY not found in environment variables")
         return OpenAI(
-            api_key=api_key
+            api_key=api_key,
+            **_http_options(sdk, limits)
         )
     elif provider == "azure":
         api_key = os.getenv('AZURE_OPENAI_API_KEY')
@@ -80,7 +157,8 @@ def create_llm_client(provider="openai"):
         return AzureOpenAI(
             api_key=api_key,
             api_version="2024-08-01-preview",
-            azure_endpoint="https://msopenai.openai.azure.com"
+            azure_endpoint="https://msopenai.openai.azure.com",
+            **_http_options(sdk, limits)
         )
     elif provider == "deepseek":
         api_key = os.getenv('DEEPSEEK_API_KEY')
@@ -89,6 +167,7 @@ def create_llm_client(provider="openai"):
         return OpenAI(
             api_key=api_key,
             base_url="https://api.deepseek.com/v1",
+            **_http_options(sdk, limits)
         )
     elif provider == "siliconflow":
         api_key = os.getenv('SILICONFLOW_API_KEY')
@@ -96,177 +175,876 @@ def create_llm_client(provider="openai"):
             raise ValueError("SILICONFLOW_API_KEY not found in environment variables")
         return OpenAI(
             api_key=api_key,
-            base_url="https://api.siliconflow.cn/v1"
+            base_url="https://api.siliconflow.cn/v1",
+            **_http_options(sdk, limits)
         )
     elif provider == "anthropic":
         api_key = os.getenv('ANTHROPIC_API_KEY')
         if not api_key:
             raise ValueError("ANTHROPIC_API_KEY not found in environment variables")
         return Anthropic(
-            api_key=api_key
+            api_key=api_key,
+            **_http_options(sdk, limits)
         )
     elif provider == "gemini":
         api_key = os.getenv('GOOGLE_API_KEY')
         if not api_key:
             raise ValueError("GOOGLE_API_KEY not found in environment variables")
-        genai.configure(api_key=api_key)
+        import google.generativeai as genai
+        # genai is configured process-wide; only do it when the key changes
+        with _gemini_lock:
+            if api_key != _gemini_api_key:
+                genai.configure(api_key=api_key)
+                _gemini_api_key = api_key
         return genai
     elif provider == "local":
         return OpenAI(
-            base_url="http://192.168.180.137:8006/v1",
-            api_key="not-needed"
+            base_url=os.getenv('LOCAL_LLM_BASE_URL', "http://192.168.180.137:8006/v1"),
+            api_key="not-needed",
+            **_http_options(sdk, limits)
         )
     else:
         raise ValueError(f"Unsupported provider: {provider}")
 
-def query_llm(prompt: str, client=None, model=None, provider="openai", image_path: Optional[str] = None) -> Optional[str]:
+_clients: Dict[str, object] = {}
+_clients_lock = threading.Lock()
+_client_limits: Dict[str, ClientLimits] = {}
+
+def configure_client_limits(provider: Optional[str] = None, **limits) -> ClientLimits:
+    """
+    Change connection pool settings, for one provider or (``provider=None``) all.
+    
+    Clients already created with other settings are closed and rebuilt on next use.
+    
+    Example:
+        configure_client_limits("openai", max_connections=50, timeout=60)
+    
+    Returns:
+        ClientLimits: The new settings
+    """
+    global DEFAULT_CLIENT_LIMITS
+    with _clients_lock:
+        if provider is None:
+            DEFAULT_CLIENT_LIMITS = DEFAULT_CLIENT_LIMITS._replace(**limits)
+            _client_limits.clear()
+            new = DEFAULT_CLIENT_LIMITS
+            stale = list(_clients)
+        else:
+            new = _client_limits.get(provider, DEFAULT_CLIENT_LIMITS)._replace(**limits)
+            _client_limits[provider] = new
+            stale = [provider] if provider in _clients else []
+        for name in stale:
+            _close_client(_clients.pop(name))
+    return new
+
+def get_llm_client(provider="openai"):
+    """
+    Return the shared client for ``provider``, creating it on first use.
+    
+    Clients are thread-safe and keep their HTTP connections alive between
+    calls, so loops and worker threads should use this instead of creating
+    clients per call.
+    """
+    client = _clients.get(provider)
+    if client is not None:
+        return client
+    with _clients_lock:
+        client = _clients.get(provider)
+        if client is None:
+            client = create_llm_client(provider, _client_limits.get(provider, DEFAULT_CLIENT_LIMITS))
+            _clients[provider] = client
+    return client
+
+def _close_client(client) -> None:
+    close = getattr(client, "close", None)
+    if callable(close) and not isinstance(client, type(sys)):  # genai is a module
+        close()
+
+def close_llm_clients() -> None:
+    """Close the connection pools of every shared client."""
+    with _clients_lock:
+        for client in _clients.values():
+            _close_client(client)
+        _clients.clear()
+
+DEFAULT_MODELS = {
+    "openai": "gpt-4o",
+    "deepseek": "deepseek-chat",
+    "siliconflow": "deepseek-ai/DeepSeek-R1",
+    "anthropic": "claude-3-7-sonnet-20250219",
+    "gemini": "gemini-2.0-flash-exp",
+    "local": "Qwen/Qwen2.5-32B-Instruct-AWQ",
+}
+
+def default_model(provider: str) -> Optional[str]:
+    """Model used when none is given."""
+    if provider == "azure":
+        load_environment()
+        return os.getenv('AZURE_OPENAI_MODEL_DEPLOYMENT', 'gpt-4o-ms')  # Get from env with fallback
+    return DEFAULT_MODELS.get(provider)
+
+OPENAI_COMPATIBLE = ("openai", "local", "deepseek", "azure", "siliconflow")
+
+def request_params(provider: str, model: str) -> dict:
+    """Generation parameters sent with every request (and part of its cache key)."""
+    if provider in OPENAI_COMPATIBLE:
+        if model == "o1":
+            # o1-specific parameters
+            return {"response_format": {"type": "text"}, "reasoning_effort": "low"}
+        return {"temperature": 0.7}
+    if provider == "anthropic":
+        return {"max_tokens": 1000}
+    return {}
+
+class Prompt(NamedTuple):
+    """
+    A prompt split into stable parts and a variable tail.
+    
+    ``system`` and ``prefix`` should be identical across calls (audit
+    instructions, checklists, examples). They are sent first and marked
+    cacheable where the provider supports it, so repeated calls pay full price
+    only for ``text``. OpenAI-compatible providers cache repeated prefixes
+    automatically, Anthropic needs the cache_control markers added here, and
+    the saving shows up as cached tokens in llm_metrics.
+    """
+    text: str                     # Variable part: page text, the question
+    system: Optional[str] = None  # Stable instructions, sent as the system prompt
+    prefix: Optional[str] = None  # Stable context at the start of the user message
+
+def as_prompt(prompt: Union[str, Prompt]) -> Prompt:
+    return prompt if isinstance(prompt, Prompt) else Prompt(prompt)
+
+def _key_prompt(prompt: Union[str, Prompt]):
+    """Prompt as part of a cache key; plain strings keep the keys they always had."""
+    return prompt._asdict() if isinstance(prompt, Prompt) else prompt
+
+# Marks the end of a stable prompt prefix for Anthropic's prompt cache
+CACHE_CONTROL = {"type": "ephemeral"}
+
+def _openai_messages(provider: str, prompt: Union[str, Prompt], image_path: Optional[str]) -> list:
+    prompt = as_prompt(prompt)
+    messages = []
+    if prompt.system:
+        messages.append({"role": "system", "content": prompt.system})
+    
+    # Stable parts first, so that repeated prefixes can be served from the provider's cache
+    content = []
+    if prompt.prefix:
+        content.append({"type": "text", "text": prompt.prefix})
+    content.append({
+        "type": "text",
+        "text": prompt.text
+    })
+    
+    # Add image content if provided
+    if image_path:
+        if provider == "openai":
+            encoded_image, mime_type = encode_image_file(image_path, provider)
+            content.append(
+                {"type": "image_url", "image_url": {"url": f"data:{mime_type};base64,{encoded_image}"}}
+            )
+    messages.append({"role": "user", "content": content})
+    return messages
+
+def _anthropic_request(prompt: Union[str, Prompt], image_path: Optional[str]) -> dict:
+    """Messages (and system prompt) arguments, with cache breakpoints after the stable parts."""
+    prompt = as_prompt(prompt)
+    content = []
+    if prompt.prefix:
+        content.append({"type": "text", "text": prompt.prefix, "cache_control": CACHE_CONTROL})
+    content.append({
+        "type": "text",
+        "text": prompt.text
+    })
+    
+    # Add image content if provided
+    if image_path:
+        encoded_image, mime_type = encode_image_file(image_path, "anthropic")
+        content.append({
+            "type": "image",
+            "source": {
+                "type": "base64",
+                "media_type": mime_type,
+                "data": encoded_image
+            }
+        })
+    request = {"messages": [{"role": "user", "content": content}]}
+    if prompt.system:
+        request["system"] = [{"type": "text", "text": prompt.system, "cache_control": CACHE_CONTROL}]
+    return request
+
+def _gemini_chat(client, model: str, prompt: Union[str, Prompt], image_path: Optional[str]):
+    prompt = as_prompt(prompt)
+    if prompt.system:
+        model = client.GenerativeModel(model, system_instruction=prompt.system)
+    else:
+        model = client.GenerativeModel(model)
+    parts = [prompt.prefix, prompt.text] if prompt.prefix else [prompt.text]
+    if image_path:
+        file = _gemini_file_part(client, image_path)
+        return model.start_chat(
+            history=[{
+                "role": "user",
+                "parts": [file] + parts
+            }]
+        )
+    return model.start_chat(
+        history=[{
+            "role": "user",
+            "parts": parts
+        }]
+    )
+
+def _set_usage(usage: Optional[dict], provider: str, reported) -> None:
+    """Copy token counts, including prompt tokens served from the provider's cache, into ``usage``."""
+    if usage is None or reported is None:
+        return
+    if provider in OPENAI_COMPATIBLE:
+        usage["input_tokens"] = reported.prompt_tokens or 0
+        usage["output_tokens"] = reported.completion_tokens or 0
+        details = getattr(reported, "prompt_tokens_details", None)
+        # DeepSeek reports cache hits in a field of its own
+        usage["cached_tokens"] = (getattr(details, "cached_tokens", None)
+                                  or getattr(reported, "prompt_cache_hit_tokens", None) or 0)
+    elif provider == "anthropic":
+        # input_tokens leaves out tokens read from or written to the cache
+        cache_read = getattr(reported, "cache_read_input_tokens", None) or 0
+        cache_write = getattr(reported, "cache_creation_input_tokens", None) or 0
+        usage["input_tokens"] = (reported.input_tokens or 0) + cache_read + cache_write
+        usage["output_tokens"] = reported.output_tokens or 0
+        usage["cached_tokens"] = cache_read
+    elif provider == "gemini":
+        usage["input_tokens"] = reported.prompt_token_count or 0
+        usage["output_tokens"] = reported.candidates_token_count or 0
+        usage["cached_tokens"] = getattr(reported, "cached_content_token_count", None) or 0
+
+def _complete(client, provider: str, model: str, prompt: Union[str, Prompt], image_path: Optional[str],
+              usage: Optional[dict] = None) -> Optional[str]:
+    """
+    Send one request to ``provider`` and return the response text. Errors propagate.
+    
+    Token counts reported by the provider are stored in ``usage`` if given.
+    """
+    if provider in OPENAI_COMPATIBLE:
+        response = client.chat.completions.create(
+            model=model,
+            messages=_openai_messages(provider, prompt, image_path),
+            **request_params(provider, model)
+        )
+        _set_usage(usage, provider, response.usage)
+        return response.choices[0].message.content
+        
+    elif provider == "anthropic":
+        response = client.messages.create(
+            model=model,
+            **_anthropic_request(prompt, image_path),
+            **request_params(provider, model)
+        )
+        _set_usage(usage, provider, response.usage)
+        return response.content[0].text
+        
+    elif provider == "gemini":
+        chat_session = _gemini_chat(client, model, prompt, image_path)
+        response = chat_session.send_message(as_prompt(prompt).text)
+        _set_usage(usage, provider, getattr(response, "usage_metadata", None))
+        return response.text
+
+# Providers that report token usage at the end of a stream when asked to
+STREAM_USAGE_PROVIDERS = ("openai", "azure", "deepseek")
+
+def _stream(client, provider: str, model: str, prompt: Union[str, Prompt], image_path: Optional[str],
+            usage: Optional[dict] = None) -> Iterator[str]:
+    """
+    Send one streaming request to ``provider`` and yield text chunks as they arrive. Errors propagate.
+    
+    Token counts reported by the provider are stored in ``usage`` if given.
+    """
+    if provider in OPENAI_COMPATIBLE:
+        extra = {"stream_options": {"include_usage": True}} if provider in STREAM_USAGE_PROVIDERS else {}
+        response = client.chat.completions.create(
+            model=model,
+            messages=_openai_messages(provider, prompt, image_path),
+            stream=True,
+            **extra,
+            **request_params(provider, model)
+        )
+        try:
+            for chunk in response:
+                # Azure sends a first chunk without choices (content filter results)
+                # and include_usage a last one with only the usage
+                if getattr(chunk, "usage", None):
+                    _set_usage(usage, provider, chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            response.close()
+        
+    elif provider == "anthropic":
+        with client.messages.stream(
+            model=model,
+            **_anthropic_request(prompt, image_path),
+            **request_params(provider, model)
+        ) as response:
+            for text in response.text_stream:
+                yield text
+            _set_usage(usage, provider, response.get_final_message().usage)
+        
+    elif provider == "gemini":
+        chat_session = _gemini_chat(client, model, prompt, image_path)
+        for chunk in chat_session.send_message(as_prompt(prompt).text, stream=True):
+            if getattr(chunk, "usage_metadata", None):
+                _set_usage(usage, provider, chunk.usage_metadata)
+            # Chunks carrying only safety ratings or a finish reason have no parts
+            if chunk.parts:
+                yield chunk.text
+    else:
+        raise ValueError(f"Unsupported provider: {provider}")
+
+def _record_call(provider: str, model: str, start: float, first: Optional[float] = None,
+                 usage: Optional[dict] = None, error: Optional[Exception] = None, retries: int = 0,
+                 cached: bool = False, coalesced: bool = False, stream: bool = False,
+                 cancelled: bool = False) -> None:
+    """Report one call to llm_metrics; ``start`` and ``first`` are time.perf_counter() values."""
+    from llm_metrics import CallMetrics, estimate_cost, metrics
+    end = time.perf_counter()
+    usage = usage or {}
+    input_tokens = usage.get("input_tokens", 0)
+    output_tokens = usage.get("output_tokens", 0)
+    cached_tokens = usage.get("cached_tokens", 0)
+    metrics.record(CallMetrics(
+        provider=provider,
+        model=model,
+        latency=end - start,
+        ttfb=(first if first is not None else end) - start,
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        cached_tokens=cached_tokens,
+        retries=retries,
+        cost=0.0 if cached or coalesced else estimate_cost(provider, model, input_tokens, output_tokens,
+                                                           cached_tokens),
+        error=f"{type(error).__name__}: {error}" if error else None,
+        cached=cached,
+        coalesced=coalesced,
+        cancelled=cancelled,
+        stream=stream,
+    ))
+
+# Identical requests in flight at the same time share one provider call
+_inflight = None
+_inflight_lock = threading.Lock()
+
+def inflight_requests():
+    """The process-wide llm_cache.SingleFlight used by query_llm and query_many."""
+    global _inflight
+    with _inflight_lock:
+        if _inflight is None:
+            from llm_cache import SingleFlight
+            _inflight = SingleFlight()
+    return _inflight
+
+def query_llm(prompt: Union[str, Prompt], client=None, model=None, provider="openai", image_path: Optional[str] = None,
+              cache=None, refresh: bool = False, coalesce: bool = True) -> Optional[str]:
     """
     Query an LLM with a prompt and optional image attachment.
     
     Args:
-        prompt (str): The text prompt to send
-        client: The LLM client instance
+        prompt (Union[str, Prompt]): The text prompt to send, or a Prompt
+            whose stable system/prefix parts the provider may cache
+        client: The LLM client instance. Defaults to the shared client of
+            ``provider`` (see get_llm_client)
         model (str, optional): The model to use
         provider (str): The API provider to use
         image_path (str, optional): Path to an image file to attach
+        cache (llm_cache.ResponseCache, optional): Response cache; identical
+            requests (same provider, model, prompt, parameters and image
+            content) are answered from it. Off unless given.
+        refresh (bool): Skip the cache lookup but store the new response
+        coalesce (bool): Share the provider call of an identical request
+            (same key as the cache) already in flight in another thread.
+            Only applies when ``client`` is not given.
         
     Returns:
         Optional[str]: The LLM's response or None if there was an error
     """
+    load_environment()
+    if model is None:
+        model = default_model(provider)
+    coalesce = coalesce and client is None
+    
+    key = None
+    if cache is not None or coalesce:
+        from llm_cache import cache_key
+        key = cache_key(provider, model, _key_prompt(prompt), request_params(provider, model), image_path)
+    if cache is not None:
+        if not refresh:
+            cached = cache.get(key)
+            if cached is not None:
+                _record_call(provider, model, time.perf_counter(), cached=True)
+                return cached
+    
     if client is None:
-        client = create_llm_client(provider)
+        client = get_llm_client(provider)
+    
+    def call():
+        start = time.perf_counter()
+        usage = {}
+        try:
+            response = _complete(client, provider, model, prompt, image_path, usage)
+        except Exception as e:
+            _record_call(provider, model, start, error=e)
+            raise
+        _record_call(provider, model, start, usage=usage)
+        if cache is not None and response is not None:
+            cache.put(key, response, provider, model)
+        return response
     
     try:
-        # Set default model
-        if model is None:
-            if provider == "openai":
-                model = "gpt-4o"
-            elif provider == "azure":
-                model = os.getenv('AZURE_OPENAI_MODEL_DEPLOYMENT', 'gpt-4o-ms')  # Get from env with fallback
-            elif provider == "deepseek":
-                model = "deepseek-chat"
-            elif provider == "siliconflow":
-                model = "deepseek-ai/DeepSeek-R1"
-            elif provider == "anthropic":
-                model = "claude-3-7-sonnet-20250219"
-            elif provider == "gemini":
-                model = "gemini-2.0-flash-exp"
-            elif provider == "local":
-                model = "Qwen/Qwen2.5-32B-Instruct-AWQ"
+        if coalesce:
+            response, shared = inflight_requests().do(key, call)
+            if shared:
+                _record_call(provider, model, time.perf_counter(), coalesced=True)
+        else:
+            response = call()
+    except Exception as e:
+        print(f"Error querying LLM: {e}", file=sys.stderr)
+        return None
+    return response
+
+def stream_llm(prompt: Union[str, Prompt], client=None, model=None, provider="openai", image_path: Optional[str] = None,
+               cache=None, refresh: bool = False) -> Iterator[str]:
+    """
+    Query an LLM like query_llm, yielding the response in chunks as they arrive.
+    
+    Every provider yields plain text chunks whose concatenation is the full
+    response. A cached response is yielded as a single chunk, and a stream
+    that completes is stored in the cache. On error the message is printed to
+    stderr and the iteration ends early, mirroring query_llm returning None.
+    
+    Args:
+        prompt (Union[str, Prompt]): The text prompt to send, or a Prompt
+        client: The LLM client instance (default: shared client of ``provider``)
+        model (str, optional): The model to use
+        provider (str): The API provider to use
+        image_path (str, optional): Path to an image file to attach
+        cache (llm_cache.ResponseCache, optional): Response cache, as for query_llm
+        refresh (bool): Skip the cache lookup but store the new response
         
-        if provider in ["openai", "local", "deepseek", "azure", "siliconflow"]:
-            messages = [{"role": "user", "content": []}]
-            
-            # Add text content
-            messages[0]["content"].append({
-                "type": "text",
-                "text": prompt
-            })
-            
-            # Add image content if provided
-            if image_path:
-                if provider == "openai":
-                    encoded_image, mime_type = encode_image_file(image_path)
-                    messages[0]["content"] = [
-                        {"type": "text", "text": prompt},
-                        {"type": "image_url", "image_url": {"url": f"data:{mime_type};base64,{encoded_image}"}}
-                    ]
-            
-            kwargs = {
-                "model": model,
-                "messages": messages,
-                "temperature": 0.7,
-            }
-            
-            # Add o1-specific parameters
-            if model == "o1":
-                kwargs["response_format"] = {"type": "text"}
-                kwargs["reasoning_effort"] = "low"
-                del kwargs["temperature"]
-            
-            response = client.chat.completions.create(**kwargs)
-            return response.choices[0].message.content
-            
-        elif provider == "anthropic":
-            messages = [{"role": "user", "content": []}]
-            
-            # Add text content
-            messages[0]["content"].append({
-                "type": "text",
-                "text": prompt
-            })
-            
-            # Add image content if provided
-            if image_path:
-                encoded_image, mime_type = encode_image_file(image_path)
-                messages[0]["content"].append({
-                    "type": "image",
-                    "source": {
-                        "type": "base64",
-                        "media_type": mime_type,
-                        "data": encoded_image
-                    }
-                })
-            
-            response = client.messages.create(
-                model=model,
-                max_tokens=1000,
-                messages=messages
-            )
-            return response.content[0].text
-            
-        elif provider == "gemini":
-            model = client.GenerativeModel(model)
-            if image_path:
-                file = genai.upload_file(image_path, mime_type="image/png")
-                chat_session = model.start_chat(
-                    history=[{
-                        "role": "user",
-                        "parts": [file, prompt]
-                    }]
-                )
-            else:
-                chat_session = model.start_chat(
-                    history=[{
-                        "role": "user",
-                        "parts": [prompt]
-                    }]
-                )
-            response = chat_session.send_message(prompt)
-            return response.text
-            
+    Yields:
+        str: Response text chunks
+    """
+    load_environment()
+    if model is None:
+        model = default_model(provider)
+    
+    key = None
+    if cache is not None:
+        from llm_cache import cache_key
+        key = cache_key(provider, model, _key_prompt(prompt), request_params(provider, model), image_path)
+        if not refresh:
+            cached = cache.get(key)
+            if cached is not None:
+                _record_call(provider, model, time.perf_counter(), cached=True, stream=True)
+                yield cached
+                return
+    
+    if client is None:
+        client = get_llm_client(provider)
+    
+    start = time.perf_counter()
+    chunks = []
+    usage = {}
+    first = None
+    try:
+        for chunk in _stream(client, provider, model, prompt, image_path, usage):
+            if first is None:
+                first = time.perf_counter()
+            chunks.append(chunk)
+            yield chunk
     except Exception as e:
+        _record_call(provider, model, start, first, usage, error=e, stream=True)
         print(f"Error querying LLM: {e}", file=sys.stderr)
+        return
+    _record_call(provider, model, start, first, usage, stream=True)
+    
+    if cache is not None and chunks:
+        cache.put(key, "".join(chunks), provider, model)
+
+class ProviderLimits(NamedTuple):
+    """How hard query_many may drive one provider."""
+    concurrency: int = 4                      # Requests in flight
+    requests_per_minute: Optional[int] = 60
+    tokens_per_minute: Optional[int] = None   # Estimated prompt + completion tokens
+
+PROVIDER_LIMITS: Dict[str, ProviderLimits] = {
+    "openai": ProviderLimits(8, 500, 30_000),
+    "azure": ProviderLimits(8, 300, 30_000),
+    "anthropic": ProviderLimits(4, 50, 40_000),
+    "gemini": ProviderLimits(4, 60, None),
+    "deepseek": ProviderLimits(4, 60, None),
+    "siliconflow": ProviderLimits(4, 60, None),
+    "local": ProviderLimits(2, None, None),
+}
+
+# Errors that a retry will not fix
+NON_RETRYABLE_STATUS = (400, 401, 403, 404, 422)
+
+class LLMCallError(RuntimeError):
+    """A query_many request failed; the message is the final error."""
+
+class LLMRequest(NamedTuple):
+    """One prompt for query_many; provider and model default to the call's."""
+    prompt: Union[str, Prompt]
+    image_path: Optional[str] = None
+    provider: Optional[str] = None
+    model: Optional[str] = None
+
+class LLMResult(NamedTuple):
+    """Outcome of an LLMRequest."""
+    request: LLMRequest
+    response: Optional[str]  # None if every attempt failed
+    error: Optional[str]
+    attempts: int
+    elapsed: float
+
+def estimate_tokens(prompt: Union[str, Prompt], provider: str, model: str, image_path: Optional[str] = None) -> int:
+    """Rough token cost of a request for tokens-per-minute budgeting (4 characters per token)."""
+    completion = request_params(provider, model).get("max_tokens", 500)
+    length = sum(len(part) for part in as_prompt(prompt) if part)
+    return length // 4 + completion + (1000 if image_path else 0)
+
+class _MinuteBudget:
+    """Token bucket refilled continuously at ``per_minute`` units per minute."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = per_minute
+        self.available = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    async def take(self, amount: float) -> None:
+        amount = min(amount, self.capacity)
+        while True:
+            now = time.monotonic()
+            self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.available >= amount:
+                self.available -= amount
+                return
+            await asyncio.sleep((amount - self.available) / self.rate)
+
+class _ProviderGate:
+    """Concurrency and per-minute limits of one provider within a query_many call."""
+
+    def __init__(self, limits: ProviderLimits):
+        self.semaphore = asyncio.Semaphore(max(1, limits.concurrency))
+        self.requests = _MinuteBudget(limits.requests_per_minute) if limits.requests_per_minute else None
+        self.tokens = _MinuteBudget(limits.tokens_per_minute) if limits.tokens_per_minute else None
+
+    async def admit(self, tokens: int) -> None:
+        if self.requests is not None:
+            await self.requests.take(1)
+        if self.tokens is not None:
+            await self.tokens.take(tokens)
+
+def _retry_delay(error: Exception, attempt: int) -> Optional[float]:
+    """Seconds to wait before retrying after ``error``, or None if it should not be retried."""
+    status = getattr(error, "status_code", None)
+    if status in NON_RETRYABLE_STATUS or isinstance(error, (ValueError, FileNotFoundError)):
         return None
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    from rate_limiter import parse_retry_after
+    retry_after = parse_retry_after(headers.get("retry-after"))
+    if retry_after is not None:
+        return retry_after
+    # Full jitter: anywhere up to 1s, 2s, 4s ... capped at 30s
+    return random.uniform(0, min(30.0, 2.0 ** attempt))
+
+async def _aiter(items: Union[Iterable, AsyncIterable]) -> AsyncIterator:
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+async def query_many(requests: Union[Iterable, AsyncIterable], provider: str = "openai",
+                     model: Optional[str] = None, limits: Optional[Dict[str, ProviderLimits]] = None,
+                     max_retries: int = 3, cache=None, refresh: bool = False,
+                     max_pending: int = 64) -> AsyncIterator[LLMResult]:
+    """
+    Send many prompts concurrently, yielding results in completion order.
+    
+    Requests are read lazily, so ``requests`` may be an endless (async)
+    iterator; at most ``max_pending`` are started ahead of the results being
+    consumed. Each provider gets its own concurrency, requests-per-minute and
+    estimated tokens-per-minute limits. Failed requests are retried with
+    jittered exponential backoff (or the server's Retry-After) unless the
+    error is one a retry cannot fix. Calls run in worker threads on the shared
+    client of each provider, with the SDK's own retries turned off so that
+    every attempt is paced, counted and visible in the metrics. Identical
+    requests in flight at the same time (including ones from query_llm) share
+    a single call.
+    
+    Args:
+        requests: Prompts (str) or LLMRequest objects
+        provider (str): Provider for requests that do not name one
+        model (str, optional): Model for requests that do not name one
+        limits (Dict[str, ProviderLimits], optional): Overrides of PROVIDER_LIMITS
+        max_retries (int): Attempts per request after the first
+        cache (llm_cache.ResponseCache, optional): Response cache, as for query_llm
+        refresh (bool): Skip the cache lookup but store the new responses
+        max_pending (int): Requests started but not yet yielded
+    
+    Yields:
+        LLMResult: One per request
+    """
+    load_environment()
+    gates: Dict[str, _ProviderGate] = {}
+    # Provider calls and cache access both run here. asyncio.to_thread's default
+    # pool has as few as 5 workers, which would cap every provider's concurrency,
+    # so size a pool for the requests we allow pending
+    from concurrent.futures import ThreadPoolExecutor
+    executor = ThreadPoolExecutor(max_workers=max_pending, thread_name_prefix="llm-many")
+    loop = asyncio.get_running_loop()
+    clients: Dict[str, object] = {}
+
+    def client_for(req_provider: str):
+        """The shared client of ``req_provider`` with SDK retries off; it keeps the same connection pool."""
+        client = clients.get(req_provider)
+        if client is None:
+            client = get_llm_client(req_provider)
+            with_options = getattr(client, "with_options", None)  # Not on the genai module
+            if callable(with_options):
+                client = with_options(max_retries=0)
+            clients[req_provider] = client
+        return client
+
+    async def run(request: LLMRequest) -> LLMResult:
+        start = time.perf_counter()
+        req_provider = request.provider or provider
+        req_model = request.model or model or default_model(req_provider)
+        request = request._replace(provider=req_provider, model=req_model)
+        gate = gates.get(req_provider)
+        if gate is None:
+            gate = gates[req_provider] = _ProviderGate(
+                (limits or {}).get(req_provider) or PROVIDER_LIMITS.get(req_provider, ProviderLimits()))
+
+        from llm_cache import cache_key
+        key = cache_key(req_provider, req_model, _key_prompt(request.prompt),
+                        request_params(req_provider, req_model), request.image_path)
+        if cache is not None and not refresh:
+            cached = await loop.run_in_executor(executor, cache.get, key)
+            if cached is not None:
+                _record_call(req_provider, req_model, start, cached=True)
+                return LLMResult(request, cached, None, 0, time.perf_counter() - start)
+
+        # An identical request already in flight (here or in query_llm) answers this one too
+        flight, leader = inflight_requests().claim(key)
+        if not leader:
+            try:
+                response = await asyncio.wrap_future(flight)
+            except Exception as e:
+                error = str(e) if isinstance(e, LLMCallError) else f"{type(e).__name__}: {e}"
+                return LLMResult(request, None, error, 0, time.perf_counter() - start)
+            _record_call(req_provider, req_model, time.perf_counter(), coalesced=True)
+            return LLMResult(request, response, None, 0, time.perf_counter() - start)
+
+        result = None
+        try:
+            result = await send(request, gate, key, start)
+        finally:
+            if result is not None and result.error is None:
+                inflight_requests().resolve(key, flight, result.response)
+            else:
+                inflight_requests().resolve(key, flight, error=LLMCallError(
+                    result.error if result is not None else "request cancelled"))
+        return result
+
+    async def send(request: LLMRequest, gate: _ProviderGate, key: str, start: float) -> LLMResult:
+        req_provider, req_model = request.provider, request.model
+        attempt = 0
+        while True:
+            attempt += 1
+            sent = time.perf_counter()
+            try:
+                async with gate.semaphore:
+                    await gate.admit(estimate_tokens(request.prompt, req_provider, req_model, request.image_path))
+                    client = client_for(req_provider)
+                    # Metrics time the provider call, not the wait for a slot
+                    sent = time.perf_counter()
+                    usage = {}
+                    response = await loop.run_in_executor(executor, _complete, client, req_provider, req_model,
+                                                          request.prompt, request.image_path, usage)
+                _record_call(req_provider, req_model, sent, usage=usage, retries=attempt - 1)
+                if cache is not None and response is not None:
+                    await loop.run_in_executor(executor, cache.put, key, response, req_provider, req_model)
+                return LLMResult(request, response, None, attempt, time.perf_counter() - start)
+            except Exception as e:
+                delay = _retry_delay(e, attempt - 1)
+                if delay is None or attempt > max_retries:
+                    _record_call(req_provider, req_model, sent, error=e, retries=attempt - 1)
+                    return LLMResult(request, None, f"{type(e).__name__}: {e}", attempt,
+                                     time.perf_counter() - start)
+                print(f"{req_provider} request failed ({e}); retrying in {delay:.1f}s",
+                      file=sys.stderr)
+                await asyncio.sleep(delay)
+
+    pending = set()
+    try:
+        async for item in _aiter(requests):
+            request = item if isinstance(item, LLMRequest) else LLMRequest(item)
+            pending.add(asyncio.create_task(run(request)))
+            if len(pending) >= max_pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+        executor.shutdown(wait=False)
+
+def make_prompt(text: str, system: Optional[str] = None, prefix: Optional[str] = None) -> Union[str, Prompt]:
+    """A Prompt if there are stable parts, else the plain text."""
+    return Prompt(text, system, prefix) if system or prefix else text
+
+def load_requests(path: str, system: Optional[str] = None, prefix: Optional[str] = None) -> Iterable[LLMRequest]:
+    """
+    Read prompts lazily from a file of plain lines or JSON objects with "prompt"
+    and optional "image", "system" and "prefix" (defaulting to the arguments).
+    """
+    import json
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('{'):
+                item = json.loads(line)
+                prompt = make_prompt(item['prompt'], item.get('system', system), item.get('prefix', prefix))
+                yield LLMRequest(prompt, item.get('image'), item.get('provider'), item.get('model'))
+            else:
+                yield LLMRequest(make_prompt(line, system, prefix))
+
+async def print_many(requests: Iterable[LLMRequest], provider: str, model: Optional[str],
+                     limits: Dict[str, ProviderLimits], max_retries: int, cache=None,
+                     refresh: bool = False) -> int:
+    """Print query_many results as they complete and return the number of failures."""
+    failures = 0
+    start = time.perf_counter()
+    count = 0
+    async for result in query_many(requests, provider=provider, model=model, limits=limits,
+                                   max_retries=max_retries, cache=cache, refresh=refresh):
+        count += 1
+        label = result.request.image_path or as_prompt(result.request.prompt).text[:60]
+        print(f"=== {label} ({result.elapsed:.1f}s, {result.attempts} attempt(s)) ===")
+        if result.error:
+            failures += 1
+            print(f"Failed to get response from LLM: {result.error}")
+        else:
+            print(result.response)
+        print()
+    print(f"{count} requests, {failures} failed in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    return failures
 
 def main():
     parser = argparse.ArgumentParser(description='Query an LLM with a prompt')
-    parser.add_argument('--prompt', type=str, help='The prompt to send to the LLM', required=True)
+    parser.add_argument('--prompt', type=str, help='The prompt to send to the LLM')
+    parser.add_argument('--prompts-file', type=str,
+                        help='Send many prompts concurrently: one per line, or JSON lines with "prompt" and optional "image"')
     parser.add_argument('--provider', choices=['openai','anthropic','gemini','local','deepseek','azure','siliconflow'], default='openai', help='The API provider to use')
     parser.add_argument('--model', type=str, help='The model to use (default depends on provider)')
-    parser.add_argument('--image', type=str, help='Path to an image file to attach to the prompt')
+    parser.add_argument('--system', type=str,
+                        help='Stable instructions sent as the system prompt (cacheable by the provider)')
+    parser.add_argument('--prefix-file', type=str,
+                        help='File of stable context sent before every prompt (cacheable by the provider)')
+    parser.add_argument('--image', type=str, nargs='+',
+                        help='Path to an image file to attach to the prompt (several: one request per image)')
+    parser.add_argument('--verbose', action='store_true', help='Report which .env files were loaded')
+    parser.add_argument('--stream', action='store_true', help='Print the response as it is generated')
+    parser.add_argument('--cache', action='store_true',
+                        help='Answer repeated identical requests from the local response cache')
+    parser.add_argument('--refresh', action='store_true',
+                        help='With --cache, bypass cached responses but store the new one')
+    parser.add_argument('--cache-ttl', type=float, default=None,
+                        help='With --cache, seconds a cached response stays valid (default: 7 days)')
+    parser.add_argument('--concurrency', type=int, help='Batch mode: requests in flight (default per provider)')
+    parser.add_argument('--rpm', type=int, help='Batch mode: requests per minute (default per provider)')
+    parser.add_argument('--tpm', type=int, help='Batch mode: estimated tokens per minute (default per provider)')
+    parser.add_argument('--max-retries', type=int, default=3, help='Batch mode: retries per request (default: 3)')
+    parser.add_argument('--metrics', type=Path,
+                        help='Append per-call metrics to this JSONL file (default: $LLM_METRICS_LOG if set)')
+    parser.add_argument('--stats', action='store_true',
+                        help='Print latency, token and cost statistics for the run to stderr')
     args = parser.parse_args()
+    if not args.prompt and not args.prompts_file:
+        parser.error("one of --prompt or --prompts-file is required")
+    if args.stream and (args.prompts_file or (args.image and len(args.image) > 1)):
+        parser.error("--stream takes a single --prompt and at most one --image")
+    load_environment(verbose=args.verbose)
 
     if not args.model:
-        if args.provider == 'openai':
-            args.model = "gpt-4o" 
-        elif args.provider == "deepseek":
-            args.model = "deepseek-chat"
-        elif args.provider == "siliconflow":
-            args.model = "deepseek-ai/DeepSeek-R1"
-        elif args.provider == 'anthropic':
-            args.model = "claude-3-7-sonnet-20250219"
-        elif args.provider == 'gemini':
-            args.model = "gemini-2.0-flash-exp"
-        elif args.provider == 'azure':
-            args.model = os.getenv('AZURE_OPENAI_MODEL_DEPLOYMENT', 'gpt-4o-ms')  # Get from env with fallback
-
-    client = create_llm_client(args.provider)
-    response = query_llm(args.prompt, client, model=args.model, provider=args.provider, image_path=args.image)
+        args.model = default_model(args.provider)
+    prefix = None
+    if args.prefix_file:
+        prefix = Path(args.prefix_file).read_text(encoding='utf-8')
+
+    cache = None
+    if args.cache:
+        from llm_cache import DEFAULT_TTL, ResponseCache
+        cache = ResponseCache(ttl=args.cache_ttl if args.cache_ttl is not None else DEFAULT_TTL)
+    if args.metrics:
+        from llm_metrics import configure_metrics
+        configure_metrics(args.metrics)
+
+    def report():
+        if cache is not None:
+            print(cache.stats.summary(), file=sys.stderr)
+        if inflight_requests().stats.coalesced:
+            print(inflight_requests().stats.summary(), file=sys.stderr)
+        if args.stats:
+            from llm_metrics import metrics
+            print(metrics.aggregator.summary(), file=sys.stderr)
+
+    if args.prompts_file or (args.image and len(args.image) > 1):
+        base = PROVIDER_LIMITS.get(args.provider, ProviderLimits())
+        limits = {args.provider: ProviderLimits(
+            args.concurrency or base.concurrency,
+            args.rpm or base.requests_per_minute,
+            args.tpm or base.tokens_per_minute)}
+        requests = load_requests(args.prompts_file, args.system, prefix) if args.prompts_file else [
+            LLMRequest(make_prompt(args.prompt, args.system, prefix), image) for image in args.image]
+        failures = asyncio.run(print_many(requests, args.provider, args.model, limits,
+                                          args.max_retries, cache, args.refresh))
+        report()
+        sys.exit(1 if failures else 0)
+
+    image = args.image[0] if args.image else None
+    prompt = make_prompt(args.prompt, args.system, prefix)
+    if args.stream:
+        received = False
+        for chunk in stream_llm(prompt, model=args.model, provider=args.provider, image_path=image,
+                                cache=cache, refresh=args.refresh):
+            received = True
+            print(chunk, end="", flush=True)
+        if received:
+            print()
+        else:
+            print("Failed to get response from LLM")
+        report()
+        return
+
+    response = query_llm(prompt, model=args.model, provider=args.provider, image_path=image,
+                         cache=cache, refresh=args.refresh)
     if response:
         print(response)
     else:
         print("Failed to get response from LLM")
+    report()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
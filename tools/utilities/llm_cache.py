@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+
+import argparse
+import hashlib
+import json
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import Future
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+DEFAULT_CACHE_PATH = Path.home() / '.cache' / 'new-steps-tools' / 'llm_responses.sqlite'
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_MAX_BYTES = 100 * 1024 * 1024
+
+def file_digest(path: str) -> str:
+    """SHA-256 of a file's content, so renamed copies of an image share cache entries."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def cache_key(provider: str, model: str, prompt, params: Optional[dict] = None,
+              image_path: Optional[str] = None) -> str:
+    """
+    Key identifying an LLM request: provider, model, prompt, request parameters
+    and the content (not the name) of the attached image.
+
+    ``prompt`` may be a string or any JSON-serializable structure.
+    """
+    request = {
+        'provider': provider,
+        'model': model,
+        'prompt': prompt,
+        'params': params or {},
+        'image': file_digest(image_path) if image_path else None,
+    }
+    return hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+@dataclass
+class CacheStats:
+    """Counters for one run."""
+    hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    evictions: int = 0
+
+    def summary(self) -> str:
+        lookups = self.hits + self.misses
+        rate = self.hits / lookups * 100 if lookups else 0.0
+        return (f"LLM cache: {self.hits} hits, {self.misses} misses ({rate:.0f}% hit rate), "
+                f"{self.stores} stored, {self.evictions} evicted")
+
+class ResponseCache:
+    """
+    Persistent cache of LLM responses keyed by cache_key(), in one SQLite file.
+
+    Entries older than ``ttl`` seconds are ignored and the least recently used
+    entries are evicted once the stored size exceeds ``max_bytes``. Safe to
+    share between threads and processes.
+    """
+
+    def __init__(self, path: Path = DEFAULT_CACHE_PATH, ttl: float = DEFAULT_TTL,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                provider TEXT NOT NULL,
+                model TEXT NOT NULL,
+                response BLOB NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                size INTEGER NOT NULL
+            )""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+        self._db.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for ``key`` if it is younger than the TTL."""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT response, created_at FROM responses WHERE key = ?",
+                                   (key,)).fetchone()
+            if row is None or now - row[1] >= self.ttl:
+                self.stats.misses += 1
+                return None
+            self._db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self.stats.hits += 1
+        return zlib.decompress(row[0]).decode('utf-8')
+
+    def put(self, key: str, response: str, provider: str = '', model: str = '') -> None:
+        """Store a response and evict old entries if the cache grew past ``max_bytes``."""
+        blob = zlib.compress(response.encode('utf-8'))
+        now = time.time()
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             (key, provider, model, blob, now, now, len(blob)))
+            self.stats.stores += 1
+            self._evict()
+            self._db.commit()
+
+    def _evict(self) -> None:
+        self.stats.evictions += self._db.execute(
+            "DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl,)).rowcount
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall():
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self.stats.evictions += 1
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+            self._db.execute("VACUUM")
+
+    def usage(self) -> Dict[str, int]:
+        """Number of entries and stored (compressed) bytes."""
+        with self._lock:
+            count, size = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {'entries': count, 'bytes': size}
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+@dataclass
+class FlightStats:
+    """Counters of a SingleFlight."""
+    calls: int = 0       # Requests that went upstream
+    coalesced: int = 0   # Requests that shared an identical in-flight call instead
+
+    def summary(self) -> str:
+        total = self.calls + self.coalesced
+        rate = self.coalesced / total * 100 if total else 0.0
+        return f"LLM coalescing: {self.coalesced} of {total} calls saved ({rate:.0f}%)"
+
+class SingleFlight:
+    """
+    Lets concurrent identical requests share one upstream call.
+
+    The first caller for a key becomes the leader and makes the call. Callers
+    arriving while it is in flight wait for the leader's result (or error)
+    instead of calling again. Nothing is kept after the call completes; that
+    is what ResponseCache is for. Keys are cache_key() values.
+    """
+
+    def __init__(self):
+        self.stats = FlightStats()
+        self._flights: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def claim(self, key: str) -> Tuple[Future, bool]:
+        """
+        Join or start the flight for ``key``.
+
+        Returns the flight's Future and whether the caller is the leader. A
+        leader must call resolve() exactly once; followers wait on the Future
+        (``future.result()`` or ``await asyncio.wrap_future(future)``).
+        """
+        with self._lock:
+            future = self._flights.get(key)
+            if future is not None:
+                self.stats.coalesced += 1
+                return future, False
+            future = self._flights[key] = Future()
+            self.stats.calls += 1
+            return future, True
+
+    def resolve(self, key: str, future: Future, result=None, error: Optional[BaseException] = None) -> None:
+        """End the leader's flight, handing ``result`` or ``error`` to every follower."""
+        with self._lock:
+            if self._flights.get(key) is future:
+                del self._flights[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key: str, fn: Callable[[], object]) -> Tuple[object, bool]:
+        """Return ``fn()``, or the result of an identical call already in flight, and whether it was shared."""
+        future, leader = self.claim(key)
+        if not leader:
+            return future.result(), True
+        try:
+            result = fn()
+        except BaseException as e:
+            self.resolve(key, future, error=e)
+            raise
+        self.resolve(key, future, result)
+        return result, False
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect or clear the LLM response cache')
+    parser.add_argument('--path', type=Path, default=DEFAULT_CACHE_PATH,
+                        help=f'Cache file (default: {DEFAULT_CACHE_PATH})')
+    parser.add_argument('--clear', action='store_true', help='Remove all cached responses')
+    args = parser.parse_args()
+
+    if not args.path.exists():
+        print(f"No cache at {args.path}", file=sys.stderr)
+        return
+    cache = ResponseCache(args.path)
+    if args.clear:
+        cache.clear()
+        print(f"Cleared {args.path}")
+    usage = cache.usage()
+    print(f"{args.path}: {usage['entries']} responses, {usage['bytes'] / 1024 / 1024:.1f} MB stored")
+    cache.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+OPENAI_PATH = "/v1/chat/completions"
+ANTHROPIC_PATH = "/v1/messages"
+
+ERROR_TYPES = {
+    400: ("invalid_request_error", "Invalid request"),
+    401: ("authentication_error", "Invalid API key"),
+    429: ("rate_limit_error", "Rate limit exceeded"),
+    500: ("api_error", "Internal server error"),
+    503: ("overloaded_error", "Overloaded"),
+}
+
+class Latency:
+    """
+    A delay distribution, parsed from a spec such as:
+
+        0.5                  always 0.5s
+        uniform:0.2,1.0      between 0.2s and 1.0s
+        normal:0.5,0.1       mean 0.5s, standard deviation 0.1s
+        lognormal:0.5,0.6    median 0.5s, sigma 0.6 (long tail, like real providers)
+        exp:0.5              exponential with mean 0.5s
+    """
+
+    def __init__(self, spec: str = "0"):
+        self.spec = spec
+        kind, _, args = spec.partition(":")
+        if not args:
+            kind, args = "fixed", kind
+        try:
+            self.params = [float(a) for a in args.split(",")]
+        except ValueError:
+            raise ValueError(f"Invalid latency spec: {spec!r}")
+        expected = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2, "exp": 1}.get(kind)
+        if expected != len(self.params):
+            raise ValueError(f"Invalid latency spec: {spec!r}")
+        self.kind = kind
+
+    def sample(self, rng: random.Random) -> float:
+        p = self.params
+        if self.kind == "fixed":
+            value = p[0]
+        elif self.kind == "uniform":
+            value = rng.uniform(p[0], p[1])
+        elif self.kind == "normal":
+            value = rng.gauss(p[0], p[1])
+        elif self.kind == "lognormal":
+            value = rng.lognormvariate(math.log(p[0]), p[1]) if p[0] > 0 else 0.0
+        else:
+            value = rng.expovariate(1 / p[0]) if p[0] > 0 else 0.0
+        return max(0.0, value)
+
+class Rule(NamedTuple):
+    """A scripted behaviour, applied to requests it matches (first match wins)."""
+    match: Optional[str] = None        # Regex searched in the last user message
+    path: Optional[str] = None         # OPENAI_PATH or ANTHROPIC_PATH
+    model: Optional[str] = None
+    response: Optional[str] = None     # Reply text instead of the default
+    status: Optional[int] = None       # Fail with this HTTP status
+    latency: Optional[str] = None      # Latency spec overriding the server's
+    probability: float = 1.0           # Chance a matching request is affected
+    times: Optional[int] = None        # Affect at most this many requests
+
+class FakeConfig(NamedTuple):
+    latency: Latency = Latency("0")     # Time to first byte
+    tokens_per_second: float = 0.0      # Generation speed; 0 is instantaneous
+    response_tokens: int = 0            # Filler tokens to reply with; 0 echoes the prompt
+    error_rate: float = 0.0
+    error_statuses: Tuple[int, ...] = (500,)
+    retry_after: float = 1.0            # Retry-After sent with injected 429s
+    rules: Tuple[Rule, ...] = ()
+    seed: Optional[int] = None
+    cache_min_tokens: int = 1024        # Shortest prompt prefix the fake caches, like the real providers
+
+class Usage(NamedTuple):
+    input: int
+    output: int
+    cache_read: int = 0    # Prefix tokens served from the simulated prompt cache
+    cache_write: int = 0   # Prefix tokens stored in it by this request
+
+# Point llm_api at the server through the base URLs the SDKs already read
+EPILOG = """
+example:
+  python llm_fake_server.py --port 8099 --latency lognormal:0.4,0.5 --tokens-per-second 80 &
+  export LOCAL_LLM_BASE_URL=http://127.0.0.1:8099/v1
+  export OPENAI_BASE_URL=http://127.0.0.1:8099/v1 OPENAI_API_KEY=fake
+  export ANTHROPIC_BASE_URL=http://127.0.0.1:8099 ANTHROPIC_API_KEY=fake
+"""
+
+FILLER = ("the page loads quickly and the layout adapts well to small screens while the "
+          "navigation remains clear and every button has a visible label").split()
+
+def load_rules(path: str) -> Tuple[Rule, ...]:
+    """Rules from a JSON list of objects with Rule's fields."""
+    with open(path, encoding="utf-8") as f:
+        return tuple(Rule(**item) for item in json.load(f))
+
+def _message_text(message: dict) -> str:
+    content = message.get("content", "")
+    if isinstance(content, str):
+        return content
+    return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+
+def _prompt_text(body: dict) -> str:
+    users = [m for m in body.get("messages", []) if m.get("role") == "user"]
+    return _message_text(users[-1]) if users else ""
+
+def _cacheable_prefix(path: str, body: dict) -> str:
+    """
+    The part of a request a provider could serve from its prompt cache:
+    everything up to Anthropic's last cache_control marker, or for OpenAI all
+    messages and text parts before the final one.
+    """
+    if path == ANTHROPIC_PATH:
+        system = body.get("system")
+        blocks = list(system) if isinstance(system, list) else []
+        for message in body.get("messages", []):
+            if isinstance(message.get("content"), list):
+                blocks.extend(message["content"])
+        marked = [i for i, block in enumerate(blocks) if isinstance(block, dict) and "cache_control" in block]
+        if not marked:
+            return ""
+        return "\n".join(block.get("text", "") for block in blocks[:marked[-1] + 1])
+    messages = body.get("messages", [])
+    if not messages:
+        return ""
+    parts = [_message_text(m) for m in messages[:-1]]
+    content = messages[-1].get("content")
+    if isinstance(content, list):
+        texts = [part.get("text", "") for part in content if isinstance(part, dict) and part.get("type") == "text"]
+        parts.extend(texts[:-1])
+    return "\n".join(p for p in parts if p)
+
+def _count_tokens(body: dict) -> int:
+    """Whitespace-separated words of every message and system part; close enough for a fake."""
+    parts = [_message_text(m) for m in body.get("messages", [])]
+    system = body.get("system")
+    if isinstance(system, str):
+        parts.append(system)
+    elif isinstance(system, list):
+        parts.extend(block.get("text", "") for block in system if isinstance(block, dict))
+    return sum(len(p.split()) for p in parts)
+
+class FakeLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config: FakeConfig):
+        super().__init__(address, _Handler)
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.lock = threading.Lock()
+        self.rule_uses: Dict[int, int] = {}
+        self.prompt_cache = set()
+        self.stats = {"requests": 0, "streamed": 0, "errors": 0, "output_tokens": 0, "cached_tokens": 0}
+
+    def cache_prefix(self, path: str, body: dict) -> Tuple[int, int]:
+        """Tokens of the request's prefix (read from, written to) the simulated prompt cache."""
+        prefix = _cacheable_prefix(path, body)
+        tokens = len(prefix.split())
+        if tokens < self.config.cache_min_tokens or not prefix:
+            return 0, 0
+        with self.lock:
+            if (path, prefix) in self.prompt_cache:
+                self.stats["cached_tokens"] += tokens
+                return tokens, 0
+            self.prompt_cache.add((path, prefix))
+            return 0, tokens
+
+    def pick(self, path: str, body: dict) -> Tuple[Optional[Rule], float, float]:
+        """Matching rule, latency and a uniform draw, under the server lock."""
+        prompt = _prompt_text(body)
+        with self.lock:
+            self.stats["requests"] += 1
+            chosen = None
+            for i, rule in enumerate(self.config.rules):
+                if rule.path and rule.path != path:
+                    continue
+                if rule.model and rule.model != body.get("model"):
+                    continue
+                if rule.match and not re.search(rule.match, prompt):
+                    continue
+                if rule.times is not None and self.rule_uses.get(i, 0) >= rule.times:
+                    continue
+                if self.rng.random() >= rule.probability:
+                    continue
+                self.rule_uses[i] = self.rule_uses.get(i, 0) + 1
+                chosen = rule
+                break
+            latency = Latency(chosen.latency) if chosen and chosen.latency else self.config.latency
+            return chosen, latency.sample(self.rng), self.rng.random()
+
+class _Handler(BaseHTTPRequestHandler):
+    server: FakeLLMServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict, headers: Optional[dict] = None) -> None:
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self, path: str, status: int) -> None:
+        kind, message = ERROR_TYPES.get(status, ("api_error", f"HTTP {status}"))
+        with self.server.lock:
+            self.server.stats["errors"] += 1
+        if path == ANTHROPIC_PATH:
+            payload = {"type": "error", "error": {"type": kind, "message": message}}
+        else:
+            payload = {"error": {"message": message, "type": kind, "code": status}}
+        headers = {"Retry-After": str(self.server.config.retry_after)} if status == 429 else None
+        self._send_json(status, payload, headers)
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/v1/models":
+            self._send_json(200, {"object": "list", "data": [
+                {"id": "fake-model", "object": "model", "created": 0, "owned_by": "fake"}]})
+        elif self.path == "/stats":
+            with self.server.lock:
+                self._send_json(200, dict(self.server.stats))
+        else:
+            self._send_json(404, {"error": {"message": "Not found"}})
+
+    def do_POST(self):
+        path = self.path.split("?")[0]
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        except ValueError:
+            self._send_error(path, 400)
+            return
+        if path not in (OPENAI_PATH, ANTHROPIC_PATH):
+            self._send_json(404, {"error": {"message": f"Unknown endpoint {path}"}})
+            return
+
+        config = self.server.config
+        rule, delay, draw = self.server.pick(path, body)
+        time.sleep(delay)
+        status = rule.status if rule else None
+        if status is None and draw < config.error_rate:
+            status = self.server.rng.choice(config.error_statuses)
+        if status:
+            self._send_error(path, status)
+            return
+
+        if rule and rule.response is not None:
+            text = rule.response
+        elif config.response_tokens:
+            text = " ".join(FILLER[i % len(FILLER)] for i in range(config.response_tokens))
+        else:
+            text = "echo: " + _prompt_text(body)
+        tokens = [t + " " for t in text.split(" ")]
+        tokens[-1] = tokens[-1][:-1]
+        usage = Usage(_count_tokens(body), len(tokens), *self.server.cache_prefix(path, body))
+        with self.server.lock:
+            self.server.stats["output_tokens"] += usage.output
+            if body.get("stream"):
+                self.server.stats["streamed"] += 1
+
+        if body.get("stream"):
+            self._stream(path, body, tokens, usage)
+        else:
+            if config.tokens_per_second:
+                time.sleep(len(tokens) / config.tokens_per_second)
+            if path == ANTHROPIC_PATH:
+                self._send_json(200, _anthropic_message(body, text, usage))
+            else:
+                self._send_json(200, _openai_completion(body, text, usage))
+
+    def _stream(self, path: str, body: dict, tokens: List[str], usage: Usage) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        interval = 1 / self.server.config.tokens_per_second if self.server.config.tokens_per_second else 0
+
+        def event(payload: dict, name: Optional[str] = None) -> None:
+            prefix = f"event: {name}\n" if name else ""
+            self.wfile.write(f"{prefix}data: {json.dumps(payload)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        try:
+            if path == ANTHROPIC_PATH:
+                message = _anthropic_message(body, "", usage._replace(output=0))
+                event({"type": "message_start", "message": message}, "message_start")
+                event({"type": "content_block_start", "index": 0,
+                       "content_block": {"type": "text", "text": ""}}, "content_block_start")
+                for token in tokens:
+                    time.sleep(interval)
+                    event({"type": "content_block_delta", "index": 0,
+                           "delta": {"type": "text_delta", "text": token}}, "content_block_delta")
+                event({"type": "content_block_stop", "index": 0}, "content_block_stop")
+                event({"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                       "usage": {"output_tokens": usage.output}}, "message_delta")
+                event({"type": "message_stop"}, "message_stop")
+            else:
+                chunk = {"id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "object": "chat.completion.chunk",
+                         "created": int(time.time()), "model": body.get("model", "fake-model")}
+                event({**chunk, "choices": [{"index": 0, "delta": {"role": "assistant", "content": ""},
+                                             "finish_reason": None}]})
+                for token in tokens:
+                    time.sleep(interval)
+                    event({**chunk, "choices": [{"index": 0, "delta": {"content": token},
+                                                 "finish_reason": None}]})
+                event({**chunk, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+                if (body.get("stream_options") or {}).get("include_usage"):
+                    event({**chunk, "choices": [], "usage": _openai_usage(usage)})
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client closed the stream early (e.g. a cancelled hedge)
+            pass
+
+def _openai_usage(usage: Usage) -> dict:
+    return {"prompt_tokens": usage.input, "completion_tokens": usage.output,
+            "total_tokens": usage.input + usage.output,
+            "prompt_tokens_details": {"cached_tokens": usage.cache_read}}
+
+def _openai_completion(body: dict, text: str, usage: Usage) -> dict:
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "fake-model"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                     "finish_reason": "stop"}],
+        "usage": _openai_usage(usage),
+    }
+
+def _anthropic_message(body: dict, text: str, usage: Usage) -> dict:
+    return {
+        "id": f"msg_{uuid.uuid4().hex[:12]}",
+        "type": "message",
+        "role": "assistant",
+        "model": body.get("model", "fake-model"),
+        "content": [{"type": "text", "text": text}] if text else [],
+        "stop_reason": "end_turn" if text else None,
+        "stop_sequence": None,
+        # Anthropic's input_tokens leave out cache reads and writes
+        "usage": {"input_tokens": usage.input - usage.cache_read - usage.cache_write,
+                  "output_tokens": usage.output,
+                  "cache_read_input_tokens": usage.cache_read,
+                  "cache_creation_input_tokens": usage.cache_write},
+    }
+
+def start_fake_server(config: FakeConfig = FakeConfig(), host: str = "127.0.0.1",
+                      port: int = 0) -> FakeLLMServer:
+    """Serve in a daemon thread; ``port=0`` picks a free port (see server.server_port)."""
+    server = FakeLLMServer((host, port), config)
+    threading.Thread(target=server.serve_forever, name="fake-llm", daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake OpenAI/Anthropic-compatible LLM server for offline testing',
+                                     epilog=EPILOG, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1', help='Interface to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8099, help='Port to listen on (default: 8099)')
+    parser.add_argument('--latency', default='0',
+                        help='Time to first byte: SECONDS, uniform:LO,HI, normal:MEAN,SD, lognormal:MEDIAN,SIGMA or exp:MEAN')
+    parser.add_argument('--tokens-per-second', type=float, default=0.0,
+                        help='Generation speed of replies; 0 sends them at once (default: 0)')
+    parser.add_argument('--response-tokens', type=int, default=0,
+                        help='Reply with this many filler tokens instead of echoing the prompt')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests that fail (default: 0)')
+    parser.add_argument('--error-status', default='500',
+                        help='Comma-separated HTTP statuses for injected errors (default: 500)')
+    parser.add_argument('--retry-after', type=float, default=1.0,
+                        help='Retry-After seconds sent with 429 errors (default: 1)')
+    parser.add_argument('--script', help='JSON file of rules: match, path, model, response, status, latency, probability, times')
+    parser.add_argument('--seed', type=int, help='Random seed for reproducible runs')
+    parser.add_argument('--cache-min-tokens', type=int, default=1024,
+                        help='Shortest prompt prefix served from the simulated prompt cache (default: 1024)')
+    args = parser.parse_args()
+
+    try:
+        config = FakeConfig(
+            latency=Latency(args.latency),
+            tokens_per_second=args.tokens_per_second,
+            response_tokens=args.response_tokens,
+            error_rate=args.error_rate,
+            error_statuses=tuple(int(s) for s in args.error_status.split(',')),
+            retry_after=args.retry_after,
+            rules=load_rules(args.script) if args.script else (),
+            seed=args.seed,
+            cache_min_tokens=args.cache_min_tokens,
+        )
+    except (ValueError, TypeError, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    server = FakeLLMServer((args.host, args.port), config)
+    print(f"Fake LLM server on http://{args.host}:{server.server_port} "
+          f"(OpenAI: /v1/chat/completions, Anthropic: /v1/messages)", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+
+import argparse
+import base64
+import io
+import mimetypes
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from llm_cache import file_digest
+
+DEFAULT_UPLOADS_PATH = Path.home() / '.cache' / 'new-steps-tools' / 'gemini_uploads.sqlite'
+
+# Gemini deletes uploaded files after 48 hours; stop reusing them a little earlier
+GEMINI_FILE_LIFETIME = 47 * 3600
+
+class ImageLimits(NamedTuple):
+    """Largest image worth sending to a provider."""
+    max_edge: int         # Longest side in pixels; larger images are scaled down
+    max_bytes: int        # Encoded size budget
+    jpeg_quality: int = 85
+
+# Providers scale large images down on their side anyway, so sending more
+# pixels than this only costs upload time (and tokens, for Anthropic)
+IMAGE_LIMITS: Dict[str, ImageLimits] = {
+    "openai": ImageLimits(2048, 8 * 1024 * 1024),
+    "azure": ImageLimits(2048, 8 * 1024 * 1024),
+    "anthropic": ImageLimits(1568, 5 * 1024 * 1024),
+    "gemini": ImageLimits(3072, 15 * 1024 * 1024),
+}
+DEFAULT_IMAGE_LIMITS = ImageLimits(2048, 8 * 1024 * 1024)
+
+class PreparedImage(NamedTuple):
+    """Image bytes ready to send, plus what it cost before preparation."""
+    data: bytes
+    mime_type: str
+    digest: str           # SHA-256 of the source file
+    width: Optional[int]  # None if the image could not be decoded
+    height: Optional[int]
+    original_bytes: int
+
+    def base64(self) -> str:
+        return base64.b64encode(self.data).decode('ascii')
+
+_MEMO_SIZE = 64
+_memo: 'OrderedDict[Tuple[str, ImageLimits], PreparedImage]' = OrderedDict()
+_digests: Dict[Tuple[str, int, int], str] = {}
+_memo_lock = threading.Lock()
+
+def _digest(path: str) -> str:
+    """file_digest, skipping the read for files unchanged since the last call."""
+    st = os.stat(path)
+    stamp = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+    with _memo_lock:
+        digest = _digests.get(stamp)
+    if digest is None:
+        digest = file_digest(path)
+        with _memo_lock:
+            _digests[stamp] = digest
+    return digest
+
+def _encode(data: bytes, limits: ImageLimits) -> Optional[Tuple[bytes, str, int, int]]:
+    """Downscale and recompress ``data`` to fit ``limits``; None if it already fits or cannot be decoded."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.load()
+    except Exception:
+        return None
+
+    if max(image.size) <= limits.max_edge and len(data) <= limits.max_bytes:
+        return None
+    if max(image.size) > limits.max_edge:
+        image.thumbnail((limits.max_edge, limits.max_edge), Image.LANCZOS)
+
+    has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    out = io.BytesIO()
+    if has_alpha:
+        image.save(out, 'PNG', optimize=True)
+        return out.getvalue(), 'image/png', image.width, image.height
+
+    # Opaque images (screenshots) go as JPEG, lowering quality until they fit
+    image = image.convert('RGB')
+    quality = limits.jpeg_quality
+    while True:
+        out = io.BytesIO()
+        image.save(out, 'JPEG', quality=quality, optimize=True)
+        if out.tell() <= limits.max_bytes or quality <= 40:
+            return out.getvalue(), 'image/jpeg', image.width, image.height
+        quality -= 15
+
+def prepare_image(image_path: str, provider: Optional[str] = None) -> PreparedImage:
+    """
+    Load an image scaled and recompressed to the limits of ``provider``.
+
+    Images within the limits are sent unchanged. Results are memoized by file
+    content, so analysing the same screenshot repeatedly reads and encodes it
+    once. Without Pillow every image is sent unchanged.
+
+    Args:
+        image_path (str): Path to the image file
+        provider (str, optional): LLM provider; None sends the original file
+
+    Returns:
+        PreparedImage: Bytes to send and their MIME type
+    """
+    limits = IMAGE_LIMITS.get(provider, DEFAULT_IMAGE_LIMITS) if provider else None
+    digest = _digest(image_path)
+    memo_key = (digest, limits)
+    with _memo_lock:
+        prepared = _memo.get(memo_key)
+        if prepared is not None:
+            _memo.move_to_end(memo_key)
+            return prepared
+
+    with open(image_path, 'rb') as f:
+        data = f.read()
+    mime_type, _ = mimetypes.guess_type(image_path)
+    if not mime_type:
+        mime_type = 'image/png'  # Default to PNG if type cannot be determined
+    encoded = _encode(data, limits) if limits else None
+    if encoded is None:
+        prepared = PreparedImage(data, mime_type, digest, None, None, len(data))
+    else:
+        prepared = PreparedImage(encoded[0], encoded[1], digest, encoded[2], encoded[3], len(data))
+
+    with _memo_lock:
+        _memo[memo_key] = prepared
+        while len(_memo) > _MEMO_SIZE:
+            _memo.popitem(last=False)
+    return prepared
+
+class GeminiUploads:
+    """
+    Gemini file handles by image content, in one SQLite file, so an image is
+    uploaded once per file lifetime instead of once per request.
+    """
+
+    def __init__(self, path: Path = DEFAULT_UPLOADS_PATH):
+        self.path = Path(path)
+        self.uploads = 0
+        self.reused = 0
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS uploads (
+                digest TEXT PRIMARY KEY,
+                uri TEXT NOT NULL,
+                mime_type TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )""")
+        self._db.commit()
+
+    def file_part(self, genai, image: PreparedImage) -> dict:
+        """Content part referencing ``image`` on Gemini, uploading it if no live handle is known."""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT uri, mime_type FROM uploads WHERE digest = ? AND expires_at > ?",
+                                   (image.digest, now)).fetchone()
+        if row is not None:
+            self.reused += 1
+            return {"file_data": {"file_uri": row[0], "mime_type": row[1]}}
+
+        file = genai.upload_file(io.BytesIO(image.data), mime_type=image.mime_type)
+        self.uploads += 1
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO uploads VALUES (?, ?, ?, ?)",
+                             (image.digest, file.uri, image.mime_type,
+                              now + GEMINI_FILE_LIFETIME))
+            self._db.execute("DELETE FROM uploads WHERE expires_at <= ?", (now,))
+            self._db.commit()
+        return {"file_data": {"file_uri": file.uri, "mime_type": image.mime_type}}
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Show what prepare_image would send for each image')
+    parser.add_argument('images', nargs='+', help='Image files')
+    parser.add_argument('--provider', choices=sorted(IMAGE_LIMITS), default='openai',
+                        help='Provider whose limits apply (default: openai)')
+    args = parser.parse_args()
+
+    total_before = total_after = 0
+    for path in args.images:
+        try:
+            image = prepare_image(path, args.provider)
+        except OSError as e:
+            print(f"{path}: {e}", file=sys.stderr)
+            continue
+        total_before += image.original_bytes
+        total_after += len(image.data)
+        size = f"{image.width}x{image.height} " if image.width else "unchanged "
+        print(f"{path}: {image.original_bytes / 1024:.0f} KB -> {size}{image.mime_type} "
+              f"{len(image.data) / 1024:.0f} KB")
+    if total_before:
+        print(f"Total: {total_before / 1024:.0f} KB -> {total_after / 1024:.0f} KB "
+              f"({(1 - total_after / total_before) * 100:.0f}% smaller)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+UTILITIES_DIR = Path(__file__).resolve().parent
+
+# What importing llm_api used to cost: every provider SDK plus dotenv
+EAGER_IMPORTS = "import google.generativeai, openai, anthropic, dotenv"
+
+SCENARIOS = [
+    ("eager SDK imports (old llm_api)", EAGER_IMPORTS),
+    ("import llm_api", "import llm_api"),
+    ("import llm_api + openai client", "import llm_api; llm_api.create_llm_client('local')"),
+]
+
+def time_snippet(code: str, repeat: int) -> List[float]:
+    """Wall time of fresh interpreters running ``code``, in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", code], cwd=UTILITIES_DIR,
+                                capture_output=True, text=True)
+        times.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else "failed")
+    return times
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the cold-start cost of importing llm_api.')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Fresh interpreters per scenario; the median is reported (default: 5)')
+    args = parser.parse_args()
+
+    baseline = time_snippet("pass", args.repeat)
+    print(f"{'scenario':<36}{'median':>10}{'min':>10}{'over bare python':>18}")
+    print(f"{'bare interpreter':<36}{statistics.median(baseline):>9.3f}s{min(baseline):>9.3f}s{'':>18}")
+    for name, code in SCENARIOS:
+        try:
+            times = time_snippet(code, args.repeat)
+        except RuntimeError as e:
+            print(f"{name:<36}  skipped: {e}")
+            continue
+        overhead = statistics.median(times) - statistics.median(baseline)
+        print(f"{name:<36}{statistics.median(times):>9.3f}s{min(times):>9.3f}s{overhead * 1000:>16.0f}ms")
+
+if __name__ == "__main__":
+    main()
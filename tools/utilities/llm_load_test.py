@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from llm_fake_server import ANTHROPIC_PATH, OPENAI_PATH, FakeConfig, Latency, Rule, start_fake_server
+from llm_metrics import percentile
+
+def _point_providers_at(port: int) -> None:
+    """Send local, openai and anthropic traffic to the fake server."""
+    base = f"http://127.0.0.1:{port}"
+    os.environ.update({
+        "LOCAL_LLM_BASE_URL": f"{base}/v1",
+        "OPENAI_BASE_URL": f"{base}/v1",
+        "OPENAI_API_KEY": "fake",
+        "ANTHROPIC_BASE_URL": base,
+        "ANTHROPIC_API_KEY": "fake",
+    })
+
+def _row(name: str, latencies: List[float], wall: float, **extra) -> dict:
+    latencies = sorted(latencies)
+    return {"scenario": name, "requests": len(latencies), "wall": wall,
+            "throughput": len(latencies) / wall if wall else 0.0,
+            "p50": percentile(latencies, 50), "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99), **extra}
+
+def scenario_batch(llm_api, args) -> dict:
+    """query_many over many prompts with the local provider's concurrency limit."""
+    limits = {"local": llm_api.ProviderLimits(args.concurrency, None, None)}
+
+    async def run():
+        results = []
+        async for result in llm_api.query_many((f"batch prompt {i}" for i in range(args.requests)),
+                                               provider="local", limits=limits):
+            results.append(result)
+        return results
+
+    start = time.perf_counter()
+    results = asyncio.run(run())
+    wall = time.perf_counter() - start
+    return _row("batch", [r.elapsed for r in results], wall,
+                failed=sum(1 for r in results if r.error), retries=sum(r.attempts - 1 for r in results))
+
+def scenario_stream(llm_api, args) -> dict:
+    """Sequential streamed calls; reports time to first chunk next to total latency."""
+    latencies, ttfbs = [], []
+    start = time.perf_counter()
+    for i in range(min(args.requests, 20)):
+        sent = time.perf_counter()
+        first = None
+        for _ in llm_api.stream_llm(f"stream prompt {i}", provider="local"):
+            if first is None:
+                first = time.perf_counter() - sent
+        latencies.append(time.perf_counter() - sent)
+        ttfbs.append(first or 0.0)
+    wall = time.perf_counter() - start
+    return _row("stream", latencies, wall, ttfb_p50=percentile(sorted(ttfbs), 50))
+
+def scenario_cache(llm_api, args) -> dict:
+    """Repeated prompts through a fresh response cache."""
+    from llm_cache import ResponseCache
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ResponseCache(Path(tmp) / "cache.sqlite")
+        latencies = []
+        start = time.perf_counter()
+        for i in range(args.requests):
+            sent = time.perf_counter()
+            llm_api.query_llm(f"cached prompt {i % 10}", provider="local", cache=cache)
+            latencies.append(time.perf_counter() - sent)
+        wall = time.perf_counter() - start
+        hits = cache.stats.hits
+        cache.close()
+    return _row("cache", latencies, wall, hits=hits)
+
+def scenario_routing(llm_api, args) -> dict:
+    """Router over openai then anthropic; the fake makes openai slow-tailed and flaky."""
+    from llm_router import RoutePolicy, Router
+    # Failover is the router's job here, not the SDK's
+    llm_api.configure_client_limits(max_retries=0)
+    router = Router(RoutePolicy(("openai", "anthropic"), min_samples=10, initial_hedge_delay=2.0,
+                                min_hedge_delay=0.05))
+    latencies, failed = [], 0
+    start = time.perf_counter()
+    for i in range(min(args.requests, 50)):
+        result = router.query(f"routed prompt {i}")
+        latencies.append(result.elapsed)
+        failed += result.response is None
+    wall = time.perf_counter() - start
+    router.close()
+    return _row("routing", latencies, wall, failed=failed, hedges=router.hedges,
+                hedge_wins=router.hedge_wins, failovers=router.failovers)
+
+SCENARIOS: Dict[str, Callable] = {
+    "batch": scenario_batch,
+    "stream": scenario_stream,
+    "cache": scenario_cache,
+    "routing": scenario_routing,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-test llm_api against the bundled fake LLM server')
+    parser.add_argument('scenarios', nargs='*',
+                        help=f"Scenarios to run: {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument('--requests', type=int, default=100, help='Requests per scenario (default: 100)')
+    parser.add_argument('--concurrency', type=int, default=8, help='Batch concurrency (default: 8)')
+    parser.add_argument('--latency', default='lognormal:0.05,0.5',
+                        help='Fake time to first byte (default: lognormal:0.05,0.5)')
+    parser.add_argument('--tokens-per-second', type=float, default=500.0,
+                        help='Fake generation speed (default: 500)')
+    parser.add_argument('--error-rate', type=float, default=0.05,
+                        help='Fraction of openai requests failing in the routing scenario (default: 0.05)')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed of the fake server (default: 1)')
+    parser.add_argument('--json', type=Path, help='Append results as JSON lines, for comparing runs')
+    args = parser.parse_args()
+
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario: {', '.join(unknown)}")
+    try:
+        latency = Latency(args.latency)
+    except ValueError as e:
+        parser.error(str(e))
+    rules = (
+        Rule(path=OPENAI_PATH, match="^routed", status=500, probability=args.error_rate),
+        Rule(path=OPENAI_PATH, match="^routed", latency="lognormal:0.3,1.0", probability=0.2),
+        Rule(path=ANTHROPIC_PATH, match="^routed", latency="uniform:0.05,0.15"),
+    )
+    server = start_fake_server(FakeConfig(latency=latency, tokens_per_second=args.tokens_per_second,
+                                          response_tokens=40, rules=rules, seed=args.seed))
+    _point_providers_at(server.server_port)
+    import llm_api
+
+    rows = []
+    print(f"{'scenario':<10}{'requests':>9}{'wall':>9}{'req/s':>8}{'p50':>8}{'p95':>8}{'p99':>8}  details")
+    for name in args.scenarios or list(SCENARIOS):
+        row = SCENARIOS[name](llm_api, args)
+        rows.append(row)
+        details = ", ".join(f"{k}={v:.3f}" if isinstance(v, float) else f"{k}={v}"
+                            for k, v in row.items()
+                            if k not in ("scenario", "requests", "wall", "throughput", "p50", "p95", "p99"))
+        print(f"{name:<10}{row['requests']:>9}{row['wall']:>8.2f}s{row['throughput']:>8.1f}"
+              f"{row['p50']:>7.3f}s{row['p95']:>7.3f}s{row['p99']:>7.3f}s  {details}")
+    server.shutdown()
+
+    if args.json:
+        with open(args.json, 'a', encoding='utf-8') as f:
+            for row in rows:
+                f.write(json.dumps({**row, "timestamp": time.time(), "latency": args.latency}) + "\n")
+        print(f"Results appended to {args.json}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
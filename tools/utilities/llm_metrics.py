@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+# Estimated USD per million (input, output) tokens, matched by longest model
+# name prefix. Deployment names such as "gpt-4o-ms" match their base model.
+PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "o1-mini": (1.10, 4.40),
+    "o1": (15.00, 60.00),
+    "claude-3-7-sonnet": (3.00, 15.00),
+    "claude-3-5-sonnet": (3.00, 15.00),
+    "claude-3-5-haiku": (0.80, 4.00),
+    "claude-3-opus": (15.00, 75.00),
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-1.5-pro": (1.25, 5.00),
+    "deepseek-chat": (0.27, 1.10),
+    "deepseek-reasoner": (0.55, 2.19),
+    "deepseek-ai/deepseek-r1": (0.55, 2.19),
+}
+
+# Share of the input price charged for prompt tokens read from the provider's
+# cache (Anthropic's surcharge for writing the cache is not modelled)
+CACHED_INPUT_FACTOR: Dict[str, float] = {
+    "anthropic": 0.10,
+    "openai": 0.50,
+    "azure": 0.50,
+    "deepseek": 0.26,
+    "gemini": 0.25,
+}
+
+# Providers we host ourselves cost nothing per token
+FREE_PROVIDERS = ("local",)
+
+# Latency samples kept per provider and model for percentiles
+MAX_SAMPLES = 10_000
+
+def estimate_cost(provider: str, model: str, input_tokens: int, output_tokens: int,
+                  cached_tokens: int = 0) -> Optional[float]:
+    """Estimated USD cost of a call, or None for a model without a known price.
+
+    ``cached_tokens`` of the ``input_tokens`` were served from the provider's
+    prompt cache at a discount.
+    """
+    if provider in FREE_PROVIDERS:
+        return 0.0
+    name = (model or "").lower()
+    matches = [prefix for prefix in PRICES if name.startswith(prefix)]
+    if not matches:
+        return None
+    input_price, output_price = PRICES[max(matches, key=len)]
+    cached_tokens = min(cached_tokens, input_tokens)
+    input_cost = ((input_tokens - cached_tokens) * input_price
+                  + cached_tokens * input_price * CACHED_INPUT_FACTOR.get(provider, 1.0))
+    return (input_cost + output_tokens * output_price) / 1_000_000
+
+@dataclass
+class CallMetrics:
+    """What one LLM call cost."""
+    provider: str
+    model: str
+    latency: float                  # Seconds from request to full response
+    ttfb: Optional[float] = None    # Seconds to the first chunk; equals latency for blocking calls
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = 0          # Input tokens served from the provider's prompt cache
+    retries: int = 0
+    cost: Optional[float] = None    # Estimated USD; None if the model's price is unknown
+    error: Optional[str] = None
+    cached: bool = False            # Answered from the response cache, no provider call
+    coalesced: bool = False         # Shared an identical call already in flight, no provider call
+    cancelled: bool = False         # Abandoned because another provider answered first
+    stream: bool = False
+    timestamp: float = field(default_factory=time.time)
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+class _ModelStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.cached = 0
+        self.coalesced = 0
+        self.cancelled = 0
+        self.retries = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cached_tokens = 0
+        self.cost = 0.0
+        self.unpriced = 0
+        self.latencies: Deque[float] = deque(maxlen=MAX_SAMPLES)
+        self.ttfbs: Deque[float] = deque(maxlen=MAX_SAMPLES)
+
+class MetricsAggregator:
+    """In-process totals and latency percentiles per provider and model."""
+
+    def __init__(self):
+        self._stats: Dict[Tuple[str, str], _ModelStats] = {}
+        self._lock = threading.Lock()
+
+    def add(self, m: CallMetrics) -> None:
+        with self._lock:
+            stats = self._stats.get((m.provider, m.model))
+            if stats is None:
+                stats = self._stats[(m.provider, m.model)] = _ModelStats()
+            stats.calls += 1
+            # Cache hits and shared calls say nothing about provider latency
+            if m.cached:
+                stats.cached += 1
+                return
+            if m.coalesced:
+                stats.coalesced += 1
+                return
+            stats.retries += m.retries
+            stats.input_tokens += m.input_tokens
+            stats.output_tokens += m.output_tokens
+            stats.cached_tokens += m.cached_tokens
+            if m.cost is None:
+                stats.unpriced += 1
+            else:
+                stats.cost += m.cost
+            if m.cancelled:
+                # Tokens of a losing hedge are paid for, but it neither failed nor finished
+                stats.cancelled += 1
+                return
+            if m.error:
+                stats.errors += 1
+                return
+            stats.latencies.append(m.latency)
+            if m.ttfb is not None:
+                stats.ttfbs.append(m.ttfb)
+
+    def latency_percentile(self, provider: str, model: str, pct: float) -> Optional[float]:
+        """Latency percentile of successful calls, or None before the first one."""
+        with self._lock:
+            stats = self._stats.get((provider, model))
+            if stats is None or not stats.latencies:
+                return None
+            return percentile(sorted(stats.latencies), pct)
+
+    def rows(self) -> List[dict]:
+        """One summary dict per provider and model."""
+        rows = []
+        with self._lock:
+            for (provider, model), s in sorted(self._stats.items()):
+                latencies = sorted(s.latencies)
+                ttfbs = sorted(s.ttfbs)
+                rows.append({
+                    'provider': provider, 'model': model, 'calls': s.calls, 'errors': s.errors,
+                    'cached': s.cached, 'coalesced': s.coalesced, 'cancelled': s.cancelled,
+                    'retries': s.retries,
+                    'input_tokens': s.input_tokens, 'output_tokens': s.output_tokens,
+                    'cached_tokens': s.cached_tokens,
+                    'cost': s.cost, 'unpriced': s.unpriced,
+                    'p50': percentile(latencies, 50), 'p95': percentile(latencies, 95),
+                    'p99': percentile(latencies, 99), 'ttfb_p50': percentile(ttfbs, 50),
+                })
+        return rows
+
+    def summary(self) -> str:
+        """Table of rows() for printing."""
+        rows = self.rows()
+        if not rows:
+            return "No LLM calls recorded"
+        lines = [f"{'provider/model':<44}{'calls':>6}{'err':>5}{'cache':>6}{'shared':>7}{'retry':>6}"
+                 f"{'p50':>8}{'p95':>8}{'p99':>8}{'ttfb50':>8}{'tokens in/out':>16}{'in cached':>10}{'cost':>10}"]
+        for r in rows:
+            cost = f"${r['cost']:.4f}" + ("+" if r['unpriced'] else "")
+            cached = r['cached_tokens'] / r['input_tokens'] * 100 if r['input_tokens'] else 0.0
+            lines.append(f"{r['provider'] + '/' + r['model']:<44.44}{r['calls']:>6}{r['errors']:>5}"
+                         f"{r['cached']:>6}{r['coalesced']:>7}{r['retries']:>6}"
+                         f"{r['p50']:>7.2f}s{r['p95']:>7.2f}s{r['p99']:>7.2f}s{r['ttfb_p50']:>7.2f}s"
+                         f"{str(r['input_tokens']) + '/' + str(r['output_tokens']):>16}{cached:>9.0f}%{cost:>10}")
+        return "\n".join(lines)
+
+class MetricsRecorder:
+    """
+    Fans CallMetrics out to the in-process aggregator and, if configured, a
+    JSONL file (one object per call, appended).
+    """
+
+    def __init__(self, jsonl_path: Optional[Path] = None):
+        self.aggregator = MetricsAggregator()
+        self.jsonl_path = Path(jsonl_path) if jsonl_path else None
+        self._lock = threading.Lock()
+
+    def record(self, m: CallMetrics) -> None:
+        self.aggregator.add(m)
+        if self.jsonl_path is not None:
+            line = json.dumps(asdict(m)) + "\n"
+            with self._lock:
+                self.jsonl_path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.jsonl_path, 'a', encoding='utf-8') as f:
+                    f.write(line)
+
+# Shared by llm_api; LLM_METRICS_LOG names a JSONL file to append to
+metrics = MetricsRecorder(os.getenv('LLM_METRICS_LOG') or None)
+
+def configure_metrics(jsonl_path: Optional[Path]) -> MetricsRecorder:
+    """Start (or, with None, stop) appending every call to ``jsonl_path``."""
+    metrics.jsonl_path = Path(jsonl_path) if jsonl_path else None
+    return metrics
+
+def read_metrics(paths: Iterable[Path], since: Optional[float] = None) -> Iterable[CallMetrics]:
+    """CallMetrics from JSONL files, skipping lines that do not parse."""
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    m = CallMetrics(**json.loads(line))
+                except (ValueError, TypeError):
+                    continue
+                if since is None or m.timestamp >= since:
+                    yield m
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarize LLM call metrics from JSONL logs')
+    parser.add_argument('logs', nargs='+', type=Path, help='Files written via LLM_METRICS_LOG or llm_api --metrics')
+    parser.add_argument('--hours', type=float, help='Only calls from the last N hours')
+    parser.add_argument('--provider', help='Only calls to this provider')
+    args = parser.parse_args()
+
+    since = time.time() - args.hours * 3600 if args.hours else None
+    aggregator = MetricsAggregator()
+    try:
+        for m in read_metrics(args.logs, since):
+            if args.provider is None or m.provider == args.provider:
+                aggregator.add(m)
+    except OSError as e:
+        print(f"Error reading metrics: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(aggregator.summary())
+    total = sum(r['cost'] for r in aggregator.rows())
+    print(f"Estimated cost: ${total:.4f}")
+
+if __name__ == "__main__":
+    main()
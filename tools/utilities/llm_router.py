@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+
+import argparse
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Deque, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import llm_api
+from llm_metrics import percentile
+
+class RoutePolicy(NamedTuple):
+    """Which providers a routed call may use and when to hedge."""
+    providers: Tuple[str, ...]            # In order of preference
+    models: Optional[Dict[str, str]] = None  # Per provider; default_model() otherwise
+    hedge: bool = True
+    hedge_percentile: float = 95.0        # Hedge once the primary runs longer than this
+    min_samples: int = 20                 # Latencies needed before the percentile is trusted
+    initial_hedge_delay: float = 10.0     # Hedge delay until then, in seconds
+    min_hedge_delay: float = 1.0          # Never hedge sooner than this
+
+class RoutedResult(NamedTuple):
+    """Outcome of a routed call."""
+    response: Optional[str]   # None if every provider failed
+    provider: Optional[str]   # Provider whose response was used
+    model: Optional[str]
+    hedged: bool              # A second request was sent because the first was slow
+    errors: List[str]         # "provider: error" for each failed attempt
+    elapsed: float
+
+class _Cancelled(Exception):
+    pass
+
+class Router:
+    """
+    Sends each request to the first provider of a RoutePolicy and falls back
+    down the list.
+
+    If the running request fails, the next provider is tried (failover). If it
+    is still running when it reaches the provider's rolling latency percentile,
+    one hedged request goes to the next provider and whichever finishes first
+    wins. The loser is cancelled: responses are streamed and its stream is
+    closed at the next chunk, so the provider stops generating. A request
+    that has not yet sent its first chunk cannot be interrupted. It finishes
+    in the background and its response is discarded.
+    """
+
+    def __init__(self, policy: RoutePolicy, window: int = 200, max_workers: int = 16):
+        self.policy = policy
+        self._latencies: Dict[str, Deque[float]] = {p: deque(maxlen=window) for p in policy.providers}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-route")
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+
+    def model(self, provider: str) -> Optional[str]:
+        return (self.policy.models or {}).get(provider) or llm_api.default_model(provider)
+
+    def hedge_delay(self, provider: str) -> float:
+        """Seconds after which a request to ``provider`` is hedged."""
+        with self._lock:
+            samples = sorted(self._latencies[provider])
+        if len(samples) < self.policy.min_samples:
+            return self.policy.initial_hedge_delay
+        return max(self.policy.min_hedge_delay, percentile(samples, self.policy.hedge_percentile))
+
+    def _attempt(self, provider: str, prompt: str, image_path: Optional[str],
+                 cancel: threading.Event) -> str:
+        model = self.model(provider)
+        start = time.perf_counter()
+        first = None
+        usage = {}
+        chunks = []
+        try:
+            stream = llm_api._stream(llm_api.get_llm_client(provider), provider, model, prompt,
+                                     image_path, usage)
+            try:
+                for chunk in stream:
+                    if first is None:
+                        first = time.perf_counter()
+                    if cancel.is_set():
+                        raise _Cancelled("cancelled: another provider answered first")
+                    chunks.append(chunk)
+            finally:
+                # Closing the generator closes the HTTP stream
+                stream.close()
+        except _Cancelled:
+            # Losing a race is not a provider error
+            llm_api._record_call(provider, model, start, first, usage, stream=True, cancelled=True)
+            raise
+        except Exception as e:
+            llm_api._record_call(provider, model, start, first, usage, error=e, stream=True)
+            raise
+        llm_api._record_call(provider, model, start, first, usage, stream=True)
+        with self._lock:
+            self._latencies[provider].append(time.perf_counter() - start)
+        return "".join(chunks)
+
+    def query(self, prompt: str, image_path: Optional[str] = None) -> RoutedResult:
+        """
+        Query the policy's providers for ``prompt``.
+
+        Args:
+            prompt (str): The text prompt to send
+            image_path (str, optional): Path to an image file to attach
+
+        Returns:
+            RoutedResult: The first successful response and how it was obtained
+        """
+        llm_api.load_environment()
+        start = time.perf_counter()
+        remaining = list(self.policy.providers)
+        running: Dict[Future, Tuple[str, threading.Event, float]] = {}
+        errors: List[str] = []
+        hedged = False
+        hedge = None
+
+        def launch():
+            provider = remaining.pop(0)
+            cancel = threading.Event()
+            future = self._pool.submit(self._attempt, provider, prompt, image_path, cancel)
+            running[future] = (provider, cancel, time.perf_counter())
+            return future
+
+        launch()
+        while running:
+            timeout = None
+            if self.policy.hedge and not hedged and remaining and len(running) == 1:
+                provider, _, started = next(iter(running.values()))
+                timeout = max(0.0, started + self.hedge_delay(provider) - time.perf_counter())
+            done, _ = wait(list(running), timeout=timeout, return_when=FIRST_COMPLETED)
+
+            if not done:
+                # The primary is slower than usual: race the next provider against it
+                hedged = True
+                self.hedges += 1
+                hedge = launch()
+                continue
+
+            for future in done:
+                provider, _, _ = running.pop(future)
+                try:
+                    response = future.result()
+                except Exception as e:
+                    errors.append(f"{provider}: {type(e).__name__}: {e}")
+                    continue
+                for _, cancel, _ in running.values():
+                    cancel.set()
+                if future is hedge:
+                    self.hedge_wins += 1
+                return RoutedResult(response, provider, self.model(provider), hedged, errors,
+                                    time.perf_counter() - start)
+
+            if not running and remaining:
+                self.failovers += 1
+                launch()
+
+        return RoutedResult(None, None, None, hedged, errors, time.perf_counter() - start)
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+def query_routed(prompt: str, providers: Sequence[str], image_path: Optional[str] = None,
+                 hedge: bool = True) -> Optional[str]:
+    """
+    One-off routed query, returning the response text like query_llm.
+
+    Long-running callers should keep a Router so that hedge delays are based
+    on the latencies it has seen.
+    """
+    router = Router(RoutePolicy(tuple(providers), hedge=hedge))
+    try:
+        result = router.query(prompt, image_path)
+    finally:
+        router.close()
+    for error in result.errors:
+        print(f"Error querying LLM: {error}", file=sys.stderr)
+    return result.response
+
+def main():
+    parser = argparse.ArgumentParser(description='Query LLM providers in order with hedging and failover')
+    parser.add_argument('--prompt', required=True, help='The prompt to send')
+    parser.add_argument('--providers', default='openai,anthropic,gemini',
+                        help='Comma-separated providers in order of preference (default: openai,anthropic,gemini)')
+    parser.add_argument('--image', help='Path to an image file to attach to the prompt')
+    parser.add_argument('--no-hedge', action='store_true', help='Only fail over on errors, never race providers')
+    parser.add_argument('--hedge-percentile', type=float, default=95.0,
+                        help='Hedge once the primary is slower than this latency percentile (default: 95)')
+    parser.add_argument('--initial-hedge-delay', type=float, default=10.0,
+                        help='Seconds before hedging while latencies are still being learned (default: 10)')
+    parser.add_argument('--repeat', type=int, default=1, help='Send the prompt this many times (default: 1)')
+    args = parser.parse_args()
+
+    policy = RoutePolicy(tuple(p.strip() for p in args.providers.split(',') if p.strip()),
+                         hedge=not args.no_hedge, hedge_percentile=args.hedge_percentile,
+                         initial_hedge_delay=args.initial_hedge_delay)
+    router = Router(policy)
+    failures = 0
+    for _ in range(args.repeat):
+        result = router.query(args.prompt, args.image)
+        for error in result.errors:
+            print(f"Error querying LLM: {error}", file=sys.stderr)
+        if result.response is None:
+            failures += 1
+            print("Failed to get response from LLM")
+            continue
+        print(result.response)
+        print(f"[{result.provider}/{result.model} in {result.elapsed:.2f}s"
+              f"{', hedged' if result.hedged else ''}]", file=sys.stderr)
+    print(f"{args.repeat} requests, {router.hedges} hedged ({router.hedge_wins} won by the hedge), "
+          f"{router.failovers} failovers, {failures} failed", file=sys.stderr)
+    router.close()
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+
+import argparse
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional
+
+DEFAULT_CACHE_PATH = Path.home() / '.cache' / 'new-steps-tools' / 'pages.sqlite'
+DEFAULT_TTL = 600  # Seconds before an entry has to be revalidated
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+
+class CacheEntry(NamedTuple):
+    """A cached page."""
+    url: str
+    body: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    content_type: Optional[str]
+    fetched_at: float
+    fresh: bool
+
+@dataclass
+class CacheStats:
+    """Counters for one run."""
+    hits: int = 0           # Served from disk without a request
+    revalidations: int = 0  # Served from disk after a 304 Not Modified
+    misses: int = 0         # Not cached, expired without validators, or changed
+    stores: int = 0
+    evictions: int = 0
+    bytes_saved: int = 0    # Body bytes not transferred thanks to the cache
+
+    def summary(self) -> str:
+        lookups = self.hits + self.revalidations + self.misses
+        rate = (self.hits + self.revalidations) / lookups * 100 if lookups else 0.0
+        return (f"Cache: {self.hits} hits, {self.revalidations} revalidated (304), "
+                f"{self.misses} misses ({rate:.0f}% served from cache), "
+                f"{self.stores} stored, {self.evictions} evicted, "
+                f"{self.bytes_saved / 1024:.1f} KB not downloaded")
+
+class PageCache:
+    """
+    Persistent page cache keyed by URL, stored in a single SQLite file.
+
+    Entries younger than ``ttl`` seconds are served straight from disk. Older
+    entries that have an ETag or Last-Modified header are revalidated with a
+    conditional request, so unchanged pages cost a 304 instead of a full
+    download. Bodies are stored zlib-compressed and the least recently used
+    entries are evicted once the stored size exceeds ``max_bytes``.
+
+    Pages rendered in a browser are cached under a separate key (``rendered``)
+    with no validators, since their content does not come from a single
+    response. The cache is safe to share between threads.
+    """
+
+    def __init__(self, path: Path = DEFAULT_CACHE_PATH, ttl: float = DEFAULT_TTL,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                key TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                content_type TEXT,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                size INTEGER NOT NULL
+            )""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS pages_accessed ON pages (accessed_at)")
+        self._db.commit()
+
+    @staticmethod
+    def _key(url: str, rendered: bool) -> str:
+        return f"rendered:{url}" if rendered else url
+
+    def lookup(self, url: str, rendered: bool = False) -> Optional[CacheEntry]:
+        """Return the cached entry for ``url`` (fresh or not), or None."""
+        key = self._key(url, rendered)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT body, etag, last_modified, content_type, fetched_at FROM pages WHERE key = ?",
+                (key,)).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE pages SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+        body, etag, last_modified, content_type, fetched_at = row
+        fresh = time.time() - fetched_at < self.ttl
+        return CacheEntry(url, zlib.decompress(body).decode('utf-8'), etag, last_modified,
+                          content_type, fetched_at, fresh)
+
+    def store(self, url: str, body: str, etag: Optional[str] = None,
+              last_modified: Optional[str] = None, content_type: Optional[str] = None,
+              rendered: bool = False) -> None:
+        """Store a page and evict old entries if the cache grew past ``max_bytes``."""
+        blob = zlib.compress(body.encode('utf-8'), 6)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (self._key(url, rendered), blob, etag, last_modified, content_type, now, now, len(blob)))
+            self.stats.stores += 1
+            self._evict()
+            self._db.commit()
+
+    def refresh(self, url: str, rendered: bool = False) -> None:
+        """Mark an entry as fetched now, e.g. after a 304 Not Modified."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("UPDATE pages SET fetched_at = ?, accessed_at = ? WHERE key = ?",
+                             (now, now, self._key(url, rendered)))
+            self._db.commit()
+
+    def _evict(self) -> None:
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._db.execute(
+                "SELECT key, size FROM pages ORDER BY accessed_at").fetchall():
+            self._db.execute("DELETE FROM pages WHERE key = ?", (key,))
+            self.stats.evictions += 1
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            self._db.execute("DELETE FROM pages")
+            self._db.commit()
+            self._db.execute("VACUUM")
+
+    def usage(self) -> Dict[str, int]:
+        """Number of entries and stored (compressed) bytes."""
+        with self._lock:
+            count, size = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM pages").fetchone()
+        return {'entries': count, 'bytes': size}
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+class CachedResponse(NamedTuple):
+    """Result of cached_get."""
+    text: str
+    status_code: int
+    content_type: str
+    source: str  # 'cache', 'revalidated' or 'network'
+
+def cached_get(session, url: str, cache: Optional[PageCache], **kwargs) -> CachedResponse:
+    """
+    GET ``url`` with a requests session, going through ``cache`` when given.
+
+    Fresh entries are returned without a request and stale ones are revalidated
+    with If-None-Match / If-Modified-Since. Only 200 responses are stored.
+    Extra keyword arguments are passed to ``session.get``; request errors
+    propagate as usual.
+    """
+    entry = cache.lookup(url) if cache is not None else None
+    if entry is not None and entry.fresh:
+        cache.stats.hits += 1
+        cache.stats.bytes_saved += len(entry.body.encode('utf-8'))
+        return CachedResponse(entry.body, 200, entry.content_type or '', 'cache')
+
+    headers = dict(kwargs.pop('headers', None) or {})
+    if entry is not None:
+        if entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+
+    response = session.get(url, headers=headers, **kwargs)
+    content_type = response.headers.get('Content-Type', '')
+    if response.status_code == 304 and entry is not None:
+        cache.refresh(url)
+        cache.stats.revalidations += 1
+        cache.stats.bytes_saved += len(entry.body.encode('utf-8'))
+        return CachedResponse(entry.body, 200, entry.content_type or content_type, 'revalidated')
+
+    if cache is not None:
+        cache.stats.misses += 1
+        if response.status_code == 200:
+            cache.store(url, response.text, response.headers.get('ETag'),
+                        response.headers.get('Last-Modified'), content_type)
+    return CachedResponse(response.text, response.status_code, content_type, 'network')
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect or clear the shared page cache')
+    parser.add_argument('--path', type=Path, default=DEFAULT_CACHE_PATH,
+                        help=f'Cache file (default: {DEFAULT_CACHE_PATH})')
+    parser.add_argument('--clear', action='store_true', help='Remove all cached pages')
+    args = parser.parse_args()
+
+    if not args.path.exists():
+        print(f"No cache at {args.path}", file=sys.stderr)
+        return
+    cache = PageCache(args.path)
+    if args.clear:
+        cache.clear()
+        print(f"Cleared {args.path}")
+    usage = cache.usage()
+    print(f"{args.path}: {usage['entries']} pages, {usage['bytes'] / 1024 / 1024:.1f} MB stored")
+    cache.close()
+
+if __name__ == "__main__":
+    main()
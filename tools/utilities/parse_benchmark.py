@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import html5lib
+
+from web_scraper import LXML_MAX_DEPTH, NOISE_PATTERNS, PARSERS, extract_etree, parse_html
+
+DEFAULT_CORPUS_DIR = Path(__file__).parent / '.parse_corpus'
+
+def legacy_extract(document) -> str:
+    """
+    Reference copy of the original recursive extractor.
+
+    Kept only so the benchmark can check that the current extractor produces the
+    same output and measure the speedup against it.
+    """
+    result = []
+    seen_texts = set()
+
+    def should_skip_element(elem) -> bool:
+        if elem.tag in ['{http://www.w3.org/1999/xhtml}script',
+                        '{http://www.w3.org/1999/xhtml}style']:
+            return True
+        if not any(text.strip() for text in elem.itertext()):
+            return True
+        return False
+
+    def process_element(elem, depth=0):
+        if should_skip_element(elem):
+            return
+
+        if hasattr(elem, 'text') and elem.text:
+            text = elem.text.strip()
+            if text and text not in seen_texts:
+                if elem.tag == '{http://www.w3.org/1999/xhtml}a':
+                    href = None
+                    for attr, value in elem.items():
+                        if attr.endswith('href'):
+                            href = value
+                            break
+                    if href and not href.startswith(('#', 'javascript:')):
+                        result.append("  " * depth + f"[{text}]({href})")
+                        seen_texts.add(text)
+                else:
+                    result.append("  " * depth + text)
+                    seen_texts.add(text)
+
+        for child in elem:
+            process_element(child, depth + 1)
+
+        if hasattr(elem, 'tail') and elem.tail:
+            tail = elem.tail.strip()
+            if tail and tail not in seen_texts:
+                result.append("  " * depth + tail)
+                seen_texts.add(tail)
+
+    try:
+        body = document.find('.//{http://www.w3.org/1999/xhtml}body')
+        process_element(body if body is not None else document)
+    except RecursionError:
+        return None
+
+    return '\n'.join(line for line in result
+                     if not any(pattern in line.lower() for pattern in NOISE_PATTERNS))
+
+def _catalog_page(n_items: int, nesting: int) -> str:
+    """A Next.js-style listing: every card wrapped in many layout divs."""
+    cards = []
+    for i in range(n_items):
+        card = (f'<a href="/shoes/{i}">Shoe {i}</a><p>Size {i % 14 + 4}, '
+                f'condition {"good" if i % 3 else "new"}</p><!-- card {i} --><span> </span>')
+        for level in range(nesting):
+            card = f'<div class="layout-{level}">{card}</div>'
+        cards.append(card)
+    return ('<!DOCTYPE html><html><head><title>Catalog</title>'
+            '<script>var x = 1;</script></head><body><div id="__next">'
+            + ''.join(cards) + '</div></body></html>')
+
+def _deep_page(depth: int) -> str:
+    """A single very deep chain of nested sections with text at every level."""
+    opening = ''.join(f'<section><span>Level {i}</span>' for i in range(depth))
+    closing = '</section>' * depth
+    return f'<html><body>{opening}<p>Bottom</p>{closing}</body></html>'
+
+def _wrapped_leaves(n_leaves: int, nesting: int) -> str:
+    """Deep layout wrappers with text only at the leaves, the worst case for subtree scans."""
+    leaf = ''.join(f'<div class="w{level}">' for level in range(nesting))
+    close = '</div>' * nesting
+    body = ''.join(f'{leaf}<span> </span><b>Item {i}</b>{close}' for i in range(n_leaves))
+    return f'<html><body><div id="__next">{body}</div></body></html>'
+
+def _admin_table(n_rows: int) -> str:
+    """A wide admin list with many short cells and repeated values."""
+    rows = ''.join(
+        f'<tr><td>{i}</td><td>Request {i}</td><td><a href="/admin/requests/{i}">View</a></td>'
+        f'<td>{"pending" if i % 2 else "shipped"}</td></tr>'
+        for i in range(n_rows)
+    )
+    return f'<html><body><main><table><tbody>{rows}</tbody></table></main></body></html>'
+
+def _random_page(seed: int, n_nodes: int = 400, well_formed: bool = False) -> str:
+    """
+    Randomly nested markup mixing text, tails, comments, links and scripts.
+
+    With ``well_formed`` only elements that every parser nests the same way are
+    used, so trees from different backends have the same shape.
+    """
+    rng = random.Random(seed)
+    if well_formed:
+        tags = ['div', 'span', 'a', 'section', 'em', 'script', 'style', 'ul']
+    else:
+        tags = ['div', 'span', 'p', 'a', 'section', 'em', 'script', 'style', 'ul', 'li']
+    words = ['shoe', 'donate', 'size', 'Home', 'Home', 'request', ' ', '', 'var y']
+    parts = ['<html><body>']
+    open_tags: List[str] = []
+    for _ in range(n_nodes):
+        choice = rng.random()
+        if choice < 0.35:
+            tag = rng.choice(tags)
+            if well_formed and tag == 'a' and 'a' in open_tags:
+                continue
+            if well_formed and tag in ('script', 'style'):
+                parts.append(f'<{tag}>{rng.choice(words)}</{tag}>')
+                continue
+            href = rng.choice(['/x', '#top', 'javascript:void(0)', None])
+            attr = f' href="{href}"' if tag == 'a' and href else ''
+            parts.append(f'<{tag}{attr}>')
+            open_tags.append(tag)
+        elif choice < 0.6 and open_tags:
+            parts.append(f'</{open_tags.pop()}>')
+        elif choice < 0.65:
+            parts.append(f'<!-- {rng.choice(words)} -->')
+        elif choice < 0.7:
+            parts.append('<br>')
+        else:
+            parts.append(rng.choice(words) + (str(rng.randint(0, 20)) if rng.random() < 0.5 else ''))
+    parts.extend(f'</{tag}>' for tag in reversed(open_tags))
+    parts.append('</body></html>')
+    return ''.join(parts)
+
+def generate_corpus(directory: Path) -> List[Path]:
+    """Write the benchmark corpus to ``directory`` (deterministic, skipped if present)."""
+    pages: Dict[str, Callable[[], str]] = {
+        'catalog_2000x12.html': lambda: _catalog_page(2000, 12),
+        'catalog_300x60.html': lambda: _catalog_page(300, 60),
+        'deep_3000.html': lambda: _deep_page(3000),
+        'wrapped_leaves_40x600.html': lambda: _wrapped_leaves(40, 600),
+        'admin_table_5000.html': lambda: _admin_table(5000),
+    }
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for name, build in pages.items():
+        path = directory / name
+        if not path.exists():
+            path.write_text(build(), encoding='utf-8')
+        paths.append(path)
+    return paths
+
+def _max_depth(document) -> int:
+    deepest = 0
+    stack = [(document, 0)]
+    while stack:
+        elem, depth = stack.pop()
+        deepest = max(deepest, depth)
+        stack.extend((child, depth + 1) for child in elem)
+    return deepest
+
+def _time(func: Callable, arg, repeat: int):
+    best = float('inf')
+    output = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = func(arg)
+        best = min(best, time.perf_counter() - start)
+    return best, output
+
+def check_conformance(n_pages: int = 200) -> int:
+    """Compare both extractors on random markup. Returns the number of mismatches."""
+    mismatches = 0
+    for seed in range(n_pages):
+        document = html5lib.parse(_random_page(seed))
+        if extract_etree(document) != legacy_extract(document):
+            mismatches += 1
+            print(f"MISMATCH: random page seed={seed}", file=sys.stderr)
+    return mismatches
+
+def _available_parsers() -> List[str]:
+    available = []
+    for name in PARSERS:
+        try:
+            parse_html('<p>x</p>', name)
+            available.append(name)
+        except ValueError as e:
+            print(f"Skipping parser {name}: {e}", file=sys.stderr)
+    return available
+
+def check_parser_conformance(parsers: List[str], n_pages: int = 200) -> int:
+    """
+    Compare every backend with html5lib on well-formed markup and the corpus.
+
+    Backends build slightly different trees for malformed markup, which only
+    affects indentation, so lines are compared with indentation stripped.
+    """
+    def text_lines(output: str) -> List[str]:
+        return [line.strip() for line in output.splitlines()]
+
+    mismatches = 0
+    pages = [(f"random seed={seed}", _random_page(seed, well_formed=True)) for seed in range(n_pages)]
+    pages.append(("entities and void tags",
+                  '<html><head><title>T</title><script>var a</script></head><body>'
+                  '<p>Shoes &amp; socks<br>after<img src="x.png"></p><!-- note -->tail'
+                  '<a href="/donate">Donate &gt;</a><a href="#top">Top</a><a>plain</a>'
+                  '<ul><li>one</li><li>two</li></ul></body></html>'))
+    for name, html in pages:
+        expected = text_lines(parse_html(html, 'html5lib'))
+        for parser in parsers:
+            if text_lines(parse_html(html, parser)) != expected:
+                mismatches += 1
+                print(f"MISMATCH: parser={parser} page={name}", file=sys.stderr)
+    return mismatches
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the HTML-to-markdown extractor against the legacy recursive walk.')
+    parser.add_argument('--corpus', type=Path, default=None,
+                        help='Directory of saved .html pages (default: generate a synthetic corpus)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Timing repetitions per page; the best run is reported (default: 3)')
+    parser.add_argument('--skip-legacy', action='store_true',
+                        help='Only time the current extractor')
+    args = parser.parse_args()
+
+    failures = check_conformance()
+    print(f"Conformance on random markup: {'OK' if not failures else f'{failures} mismatches'}")
+
+    parsers = _available_parsers()
+    parser_failures = check_parser_conformance(parsers)
+    failures += parser_failures
+    print(f"Parser conformance ({', '.join(parsers)}): "
+          f"{'OK' if not parser_failures else f'{parser_failures} mismatches'}")
+
+    paths = sorted(args.corpus.glob('*.html')) if args.corpus else generate_corpus(DEFAULT_CORPUS_DIR)
+    if not paths:
+        print("ERROR: No .html files found in corpus", file=sys.stderr)
+        sys.exit(1)
+
+    print("\nExtraction time per page (html5lib tree building excluded):")
+    print(f"{'page':<28}{'size':>10}{'parse':>10}{'current':>10}{'legacy':>10}{'speedup':>10}  output")
+    for path in paths:
+        html = path.read_text(encoding='utf-8', errors='replace')
+        parse_time, document = _time(html5lib.parse, html, 1)
+        current_time, current_out = _time(extract_etree, document, args.repeat)
+        legacy = speedup = status = "-"
+        if not args.skip_legacy:
+            legacy_time, legacy_out = _time(legacy_extract, document, args.repeat)
+            legacy = f"{legacy_time:.3f}s"
+            speedup = f"{legacy_time / max(current_time, 1e-9):.1f}x"
+            if legacy_out is None:
+                status = "legacy hit recursion limit"
+            else:
+                status = "same" if legacy_out == current_out else "DIFFERENT"
+                failures += status != "same"
+        print(f"{path.name:<28}{len(html) / 1024:>8.0f}KB{parse_time:>9.3f}s"
+              f"{current_time:>9.3f}s{legacy:>10}{speedup:>10}  {status}")
+
+    print("\nEnd-to-end parse time per page by backend:")
+    truncated = False
+    print(f"{'page':<28}" + ''.join(f"{name:>12}" for name in parsers))
+    for path in paths:
+        html = path.read_text(encoding='utf-8', errors='replace')
+        too_deep = _max_depth(html5lib.parse(html)) > LXML_MAX_DEPTH
+        expected = None
+        row = f"{path.name:<28}"
+        for name in parsers:
+            elapsed, output = _time(lambda h: parse_html(h, name), html, 1)
+            lines = [line.strip() for line in output.splitlines()]
+            if expected is None:
+                expected = lines
+            elif name == 'lxml' and too_deep:
+                truncated = True
+                row += f"{elapsed:>10.3f}s*"
+                continue
+            elif lines != expected:
+                failures += 1
+                print(f"MISMATCH: parser={name} page={path.name}", file=sys.stderr)
+            row += f"{elapsed:>11.3f}s"
+        print(row)
+    if truncated:
+        print(f"* lxml output truncated: page nests deeper than {LXML_MAX_DEPTH} levels")
+
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+
+import argparse
+import asyncio
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Dict, Iterator, NamedTuple, Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_STATE_PATH = Path.home() / '.cache' / 'new-steps-tools' / 'rate_limits.sqlite'
+
+class HostLimits(NamedTuple):
+    """Request rate bounds for one host, in requests per second."""
+    initial_rate: float
+    max_rate: float
+    min_rate: float
+    burst: float
+
+LOCAL_LIMITS = HostLimits(initial_rate=20.0, max_rate=200.0, min_rate=1.0, burst=20.0)
+# Production runs on a single t3.small (see ecosystem.config.js)
+PRODUCTION_LIMITS = HostLimits(initial_rate=2.0, max_rate=8.0, min_rate=0.2, burst=4.0)
+DEFAULT_LIMITS = HostLimits(initial_rate=2.0, max_rate=10.0, min_rate=0.2, burst=2.0)
+
+HOST_LIMITS: Dict[str, HostLimits] = {
+    'localhost': LOCAL_LIMITS,
+    '127.0.0.1': LOCAL_LIMITS,
+    '::1': LOCAL_LIMITS,
+    'newsteps.fit': PRODUCTION_LIMITS,
+    'www.newsteps.fit': PRODUCTION_LIMITS,
+}
+
+# Additive increase per successful response and multiplicative decrease on trouble
+INCREASE_STEP = 0.5
+DECREASE_FACTOR = 0.5
+# Minimum time between two decreases, so a burst of failures halves the rate once
+DECREASE_COOLDOWN = 1.0
+# A response slower than this multiple of the host's average latency counts as a spike
+LATENCY_SPIKE_FACTOR = 3.0
+LATENCY_ALPHA = 0.2
+LATENCY_MIN_SAMPLES = 5
+MAX_RETRY_AFTER = 120.0
+
+@dataclass
+class HostState:
+    """Token bucket and AIMD state of one host."""
+    rate: float
+    tokens: float
+    updated_at: float
+    blocked_until: float = 0.0
+    last_decrease: float = 0.0
+    latency_avg: float = 0.0
+    latency_samples: int = 0
+
+@dataclass
+class HostStats:
+    """What this process saw for one host."""
+    requests: int = 0
+    waited: float = 0.0
+    throttled: int = 0  # 429 and 5xx responses or request errors
+    spikes: int = 0
+    rate: float = 0.0
+
+def host_of(url: str) -> str:
+    """Host name a URL is limited under."""
+    return (urlparse(url).hostname or url).lower()
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class RateLimiter:
+    """
+    Per-host token bucket whose rate adapts with AIMD.
+
+    Every request first takes a token for its host; when the bucket is empty
+    the caller waits for its reserved slot, so concurrent callers are spread
+    out evenly. After the response, ``record`` raises the host's rate by a
+    constant step on success and halves it on 429/5xx responses, request
+    errors and latency spikes, within the bounds of the host's HostLimits,
+    and drains the bucket so the next request waits. A Retry-After header
+    pauses the host entirely.
+
+    With ``state_path`` the bucket state lives in a SQLite file, so separate
+    scripts hitting the same host share one budget. ``acquire`` blocks and
+    suits requests-based tools; ``acquire_async`` suits Playwright flows.
+    """
+
+    def __init__(self, state_path: Optional[Path] = None,
+                 limits: Optional[Dict[str, HostLimits]] = None,
+                 default_limits: HostLimits = DEFAULT_LIMITS):
+        self.limits = dict(HOST_LIMITS)
+        if limits:
+            self.limits.update(limits)
+        self.default_limits = default_limits
+        self.stats: Dict[str, HostStats] = {}
+        self._lock = threading.Lock()
+        self._states: Dict[str, HostState] = {}
+        self._db = None
+        if state_path is not None:
+            Path(state_path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(state_path), timeout=30, check_same_thread=False,
+                                       isolation_level=None)
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS hosts (
+                    host TEXT PRIMARY KEY,
+                    rate REAL, tokens REAL, updated_at REAL, blocked_until REAL,
+                    last_decrease REAL, latency_avg REAL, latency_samples INTEGER
+                )""")
+
+    def limits_for(self, host: str) -> HostLimits:
+        return self.limits.get(host, self.default_limits)
+
+    @contextmanager
+    def _state(self, host: str) -> Iterator[HostState]:
+        """Load, yield and save the state of ``host`` atomically."""
+        with self._lock:
+            if self._db is None:
+                state = self._states.get(host)
+                if state is None:
+                    limits = self.limits_for(host)
+                    state = self._states[host] = HostState(limits.initial_rate, limits.burst, time.time())
+                yield state
+                return
+
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT rate, tokens, updated_at, blocked_until, last_decrease, latency_avg, "
+                    "latency_samples FROM hosts WHERE host = ?", (host,)).fetchone()
+                if row is None:
+                    limits = self.limits_for(host)
+                    state = HostState(limits.initial_rate, limits.burst, time.time())
+                else:
+                    state = HostState(*row)
+                yield state
+                self._db.execute(
+                    "INSERT OR REPLACE INTO hosts VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (host, state.rate, state.tokens, state.updated_at, state.blocked_until,
+                     state.last_decrease, state.latency_avg, state.latency_samples))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def _host_stats(self, host: str) -> HostStats:
+        return self.stats.setdefault(host, HostStats())
+
+    def reserve(self, url: str) -> float:
+        """Take a token for the URL's host and return how long to wait before sending."""
+        host = host_of(url)
+        limits = self.limits_for(host)
+        with self._state(host) as state:
+            now = time.time()
+            state.tokens = min(limits.burst, state.tokens + (now - state.updated_at) * state.rate)
+            state.updated_at = now
+            state.tokens -= 1
+            wait = -state.tokens / state.rate if state.tokens < 0 else 0.0
+            wait = max(wait, state.blocked_until - now)
+            rate = state.rate
+        stats = self._host_stats(host)
+        stats.requests += 1
+        stats.waited += wait
+        stats.rate = rate
+        return wait
+
+    def acquire(self, url: str) -> None:
+        """Block until a request to the URL's host may be sent."""
+        wait = self.reserve(url)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, url: str) -> None:
+        """Wait, without blocking the event loop, until a request may be sent."""
+        wait = await asyncio.to_thread(self.reserve, url) if self._db is not None else self.reserve(url)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def record(self, url: str, status: Optional[int], latency: Optional[float] = None,
+               retry_after: Optional[str] = None) -> None:
+        """
+        Adapt the host's rate to a response.
+
+        Args:
+            url (str): Requested URL
+            status (int, optional): HTTP status, or None if the request failed
+            latency (float, optional): Seconds until the response arrived
+            retry_after (str, optional): Value of the Retry-After header
+        """
+        host = host_of(url)
+        limits = self.limits_for(host)
+        stats = self._host_stats(host)
+        throttled = status is None or status == 429 or status >= 500
+        with self._state(host) as state:
+            now = time.time()
+            spike = False
+            if latency is not None and not throttled:
+                spike = (state.latency_samples >= LATENCY_MIN_SAMPLES
+                         and latency > LATENCY_SPIKE_FACTOR * state.latency_avg)
+                if state.latency_samples == 0:
+                    state.latency_avg = latency
+                else:
+                    state.latency_avg += LATENCY_ALPHA * (latency - state.latency_avg)
+                state.latency_samples += 1
+
+            if throttled or spike:
+                if now - state.last_decrease >= DECREASE_COOLDOWN:
+                    state.rate = max(limits.min_rate, state.rate * DECREASE_FACTOR)
+                    state.last_decrease = now
+                # Drain the burst so the next request waits a full interval
+                state.tokens = min(state.tokens, 0.0)
+            else:
+                state.rate = min(limits.max_rate, state.rate + INCREASE_STEP)
+
+            delay = parse_retry_after(retry_after)
+            if delay is not None and (status == 429 or status == 503):
+                state.blocked_until = max(state.blocked_until, now + min(delay, MAX_RETRY_AFTER))
+            rate = state.rate
+        stats.throttled += throttled
+        stats.spikes += spike
+        stats.rate = rate
+
+    async def record_async(self, url: str, status: Optional[int], latency: Optional[float] = None,
+                           retry_after: Optional[str] = None) -> None:
+        """``record`` without blocking the event loop on the shared state file."""
+        if self._db is not None:
+            await asyncio.to_thread(self.record, url, status, latency, retry_after)
+        else:
+            self.record(url, status, latency, retry_after)
+
+    def summary(self) -> str:
+        """One line per host seen by this process."""
+        lines = []
+        for host, s in sorted(self.stats.items()):
+            lines.append(f"{host}: {s.requests} requests, waited {s.waited:.1f}s, "
+                         f"{s.throttled} throttled, {s.spikes} latency spikes, rate now {s.rate:.1f}/s")
+        return "\n".join(lines) if lines else "No rate-limited requests"
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+class RateLimitedAdapter(HTTPAdapter):
+    """requests transport adapter that sends every request through a RateLimiter."""
+
+    def __init__(self, limiter: RateLimiter, **kwargs):
+        self.limiter = limiter
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        self.limiter.acquire(request.url)
+        start = time.perf_counter()
+        try:
+            response = super().send(request, **kwargs)
+        except requests.RequestException:
+            self.limiter.record(request.url, None)
+            raise
+        self.limiter.record(request.url, response.status_code, time.perf_counter() - start,
+                            response.headers.get('Retry-After'))
+        return response
+
+def mount_rate_limiter(session: requests.Session, limiter: RateLimiter, pool_maxsize: int = 10) -> requests.Session:
+    """Route all of a session's HTTP(S) traffic through ``limiter``."""
+    adapter = RateLimitedAdapter(limiter, pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+async def apply_rate_limit(context, limiter: RateLimiter) -> None:
+    """
+    Rate-limit every request of a Playwright browser context.
+
+    Register this before other routes (e.g. resource_blocking.apply_profile):
+    Playwright runs the most recently registered route first, so blocked
+    requests are aborted without using up a token. Responses are recorded in
+    tasks, since a shared state file can keep ``record`` waiting for its lock.
+    """
+    async def handle(route):
+        await limiter.acquire_async(route.request.url)
+        await route.fallback()
+
+    async def on_response(response):
+        timing = response.request.timing
+        latency = timing.get('responseStart', -1)
+        await limiter.record_async(response.url, response.status,
+                                   latency / 1000 if latency and latency > 0 else None,
+                                   response.headers.get('retry-after'))
+
+    async def on_failed(request):
+        await limiter.record_async(request.url, None)
+
+    await context.route('**/*', handle)
+    context.on('response', on_response)
+    context.on('requestfailed', on_failed)
+
+_default_limiter: Optional[RateLimiter] = None
+
+def default_limiter() -> RateLimiter:
+    """Process-wide limiter whose state is shared with other tools through DEFAULT_STATE_PATH."""
+    global _default_limiter
+    if _default_limiter is None:
+        _default_limiter = RateLimiter(DEFAULT_STATE_PATH)
+    return _default_limiter
+
+def main():
+    parser = argparse.ArgumentParser(description='Show or reset the shared per-host rate limits')
+    parser.add_argument('--path', type=Path, default=DEFAULT_STATE_PATH,
+                        help=f'State file (default: {DEFAULT_STATE_PATH})')
+    parser.add_argument('--reset', action='store_true', help='Forget learned rates and pauses')
+    args = parser.parse_args()
+
+    if not args.path.exists():
+        print(f"No rate limit state at {args.path}", file=sys.stderr)
+        return
+    db = sqlite3.connect(str(args.path))
+    if args.reset:
+        db.execute("DELETE FROM hosts")
+        db.commit()
+        print(f"Reset {args.path}")
+    now = time.time()
+    for host, rate, blocked_until, latency_avg in db.execute(
+            "SELECT host, rate, blocked_until, latency_avg FROM hosts ORDER BY host"):
+        paused = f", paused for {blocked_until - now:.0f}s" if blocked_until > now else ""
+        print(f"{host}: {rate:.1f} req/s, avg latency {latency_avg * 1000:.0f} ms{paused}")
+    db.close()
+
+if __name__ == "__main__":
+    main()
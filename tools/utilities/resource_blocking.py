@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, NamedTuple
+from urllib.parse import urlparse
+
+# Hosts (and their subdomains) serving analytics, tag managers and ad beacons
+ANALYTICS_HOSTS = (
+    'google-analytics.com', 'googletagmanager.com', 'doubleclick.net',
+    'googlesyndication.com', 'facebook.net', 'connect.facebook.com',
+    'hotjar.com', 'segment.io', 'segment.com', 'mixpanel.com',
+    'clarity.ms', 'plausible.io', 'sentry.io', 'vercel-insights.com',
+)
+
+# Analytics endpoints served from the site's own origin
+ANALYTICS_PATHS = ('/_vercel/insights', '/_vercel/speed-insights')
+
+# Public CDNs serving libraries and site bundles rather than tracking. Pages
+# rendered client-side often load their framework or content scripts from them
+CDN_HOSTS = (
+    'cdnjs.cloudflare.com', 'cdn.jsdelivr.net', 'unpkg.com', 'ajax.googleapis.com',
+    'code.jquery.com', 'esm.sh', 'cdn.skypack.dev', 'cloudfront.net', 'azureedge.net',
+    'akamaized.net',
+)
+
+# Typical transfer sizes used to estimate the bytes a blocked request would have
+# cost, since blocked responses are never downloaded
+TYPICAL_BYTES = {
+    'image': 45_000,
+    'media': 500_000,
+    'font': 35_000,
+    'stylesheet': 15_000,
+    'script': 30_000,
+}
+DEFAULT_TYPICAL_BYTES = 5_000
+
+class BlockingProfile(NamedTuple):
+    """Which requests to abort."""
+    name: str
+    resource_types: FrozenSet[str]  # Playwright resource types to block
+    block_analytics: bool
+    block_third_party: bool
+    cdn_scripts: bool = False  # Let scripts from CDN_HOSTS through despite block_third_party
+
+PROFILES: Dict[str, BlockingProfile] = {
+    # Everything loads; use when pixels or network behaviour are being measured
+    'full': BlockingProfile('full', frozenset(), False, False),
+    # Layout and scripts load, heavy assets do not
+    'no-media': BlockingProfile('no-media', frozenset({'image', 'media', 'font'}), True, False),
+    # Only the site's own origin(s) load
+    'no-third-party': BlockingProfile('no-third-party', frozenset(), True, True),
+    # Enough to render the DOM for text extraction: first-party and CDN scripts
+    # still run. Text injected by scripts from any other third-party host is
+    # lost; use 'no-media' for such pages
+    'text-only': BlockingProfile('text-only', frozenset({'image', 'media', 'font', 'stylesheet'}),
+                                 True, True, cdn_scripts=True),
+}
+
+@dataclass
+class BlockingStats:
+    """Requests seen by the contexts a profile was applied to."""
+    allowed_requests: int = 0
+    allowed_bytes: int = 0  # From Content-Length, when the server sends it
+    blocked_requests: int = 0
+    blocked_bytes_estimate: int = 0
+    blocked_by_type: Dict[str, int] = field(default_factory=dict)
+
+    def summary(self) -> str:
+        by_type = ", ".join(f"{kind}={n}" for kind, n in sorted(self.blocked_by_type.items()))
+        return (f"Blocked {self.blocked_requests} requests (~{self.blocked_bytes_estimate / 1024:.0f} KB "
+                f"estimated{': ' + by_type if by_type else ''}); allowed {self.allowed_requests} "
+                f"requests ({self.allowed_bytes / 1024:.0f} KB reported)")
+
+def _site(host: str) -> str:
+    """Rough registrable domain: the last two labels of the host name."""
+    return '.'.join(host.split('.')[-2:]) if host.count('.') >= 1 else host
+
+def _matches_host(host: str, suffixes) -> bool:
+    return any(host == suffix or host.endswith('.' + suffix) for suffix in suffixes)
+
+def should_block(profile: BlockingProfile, resource_type: str, url: str, page_url: str) -> bool:
+    """Decide whether a subresource request is blocked under ``profile``."""
+    if resource_type in profile.resource_types:
+        return True
+    parsed = urlparse(url)
+    if parsed.scheme not in ('http', 'https'):
+        return False
+    host = parsed.hostname or ''
+    if profile.block_analytics and (_matches_host(host, ANALYTICS_HOSTS)
+                                    or parsed.path.startswith(ANALYTICS_PATHS)):
+        return True
+    if profile.block_third_party:
+        page_host = urlparse(page_url).hostname or ''
+        if page_host and _site(host) != _site(page_host):
+            return not (profile.cdn_scripts and resource_type == 'script'
+                        and _matches_host(host, CDN_HOSTS))
+    return False
+
+async def apply_profile(context, profile_name: str, stats: BlockingStats) -> None:
+    """
+    Install a request-interception profile on a Playwright browser context.
+
+    Navigation requests are never blocked. Blocked requests are aborted before
+    they hit the network and counted in ``stats``; the 'full' profile installs
+    no route at all, so Playwright keeps the HTTP cache enabled.
+
+    Args:
+        context: Playwright BrowserContext
+        profile_name (str): Key of PROFILES
+        stats (BlockingStats): Counters updated by every page of the context
+    """
+    if profile_name not in PROFILES:
+        raise ValueError(f"Unsupported blocking profile: {profile_name}")
+    profile = PROFILES[profile_name]
+
+    def on_response(response):
+        stats.allowed_requests += 1
+        length = response.headers.get('content-length')
+        if length and length.isdigit():
+            stats.allowed_bytes += int(length)
+
+    context.on('response', on_response)
+    if profile_name == 'full':
+        return
+
+    async def handle(route):
+        request = route.request
+        if not request.is_navigation_request():
+            try:
+                page_url = request.frame.page.url
+            except Exception:
+                page_url = ''
+            if should_block(profile, request.resource_type, request.url, page_url):
+                stats.blocked_requests += 1
+                stats.blocked_by_type[request.resource_type] = stats.blocked_by_type.get(request.resource_type, 0) + 1
+                stats.blocked_bytes_estimate += TYPICAL_BYTES.get(request.resource_type, DEFAULT_TYPICAL_BYTES)
+                await route.abort('blockedbyclient')
+                return
+        # Let other routes (e.g. rate_limiter.apply_rate_limit) see the request
+        await route.fallback()
+
+    await context.route('**/*', handle)
@@ -1,56 +1,393 @@
 #!/usr/bin/env python3
 
+import argparse
 import asyncio
 from playwright.async_api import async_playwright
+import json
 import os
+import re
+import struct
+import sys
 import tempfile
+import time
+import zlib
 from pathlib import Path
+from typing import AsyncIterator, Iterable, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlsplit
 
-async def take_screenshot(url: str, output_path: str = None, width: int = 1280, height: int = 720) -> str:
+from resource_blocking import PROFILES, BlockingStats, apply_profile
+
+class ScreenshotJob(NamedTuple):
+    """One screenshot to take."""
+    url: str
+    output_path: Optional[str] = None  # Temporary file if None
+    width: int = 1280
+    height: int = 720
+    full_page: bool = True
+    selector: Optional[str] = None  # Capture only the first element matching this CSS selector
+    tiled: bool = False             # Capture the full page as viewport-high strips, see capture_tiles
+    stitch: bool = True             # With tiled, also join the strips into output_path
+
+class ScreenshotResult(NamedTuple):
+    """Outcome of a ScreenshotJob."""
+    job: ScreenshotJob
+    path: Optional[str]  # None if the screenshot failed
+    error: Optional[str]
+    elapsed: float
+
+class ScreenshotService:
+    """
+    Takes many screenshots with a single headless Chromium.
+
+    Browser contexts are pooled per viewport and reused across jobs, so the
+    cost of launching the browser is paid once per batch instead of once per
+    screenshot. Use as an async context manager.
+    """
+
+    def __init__(self, max_concurrent: int = 4, block_profile: str = 'full',
+                 stats: Optional[BlockingStats] = None):
+        if block_profile not in PROFILES:
+            raise ValueError(f"Unsupported blocking profile: {block_profile}")
+        self.max_concurrent = max(1, max_concurrent)
+        self.block_profile = block_profile
+        self.stats = stats if stats is not None else BlockingStats()
+        self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        self._playwright = None
+        self._browser = None
+        self._idle: List[Tuple[Tuple[int, int], object]] = []  # (viewport, context), oldest first
+
+    async def start(self) -> None:
+        if self._browser is None:
+            self._playwright = await async_playwright().start()
+            self._browser = await self._playwright.chromium.launch(headless=True)
+
+    async def close(self) -> None:
+        for _, context in self._idle:
+            await context.close()
+        self._idle.clear()
+        if self._browser is not None:
+            await self._browser.close()
+            self._browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _acquire_context(self, viewport: Tuple[int, int]):
+        for i, (size, context) in enumerate(self._idle):
+            if size == viewport:
+                del self._idle[i]
+                return context
+        context = await self._browser.new_context(viewport={'width': viewport[0], 'height': viewport[1]})
+        await apply_profile(context, self.block_profile, self.stats)
+        return context
+
+    async def _release_context(self, viewport: Tuple[int, int], context) -> None:
+        self._idle.append((viewport, context))
+        # Keep at most one idle context per concurrent slot
+        while len(self._idle) > self.max_concurrent:
+            _, oldest = self._idle.pop(0)
+            await oldest.close()
+
+    async def capture(self, job: ScreenshotJob) -> str:
+        """
+        Take one screenshot.
+
+        Args:
+            job (ScreenshotJob): What to capture and where to save it
+
+        Returns:
+            str: Path to the saved screenshot, or to the directory of strips for
+                a tiled job that is not stitched
+        """
+        output_path = job.output_path
+        if output_path is None:
+            # Create a temporary file with .png extension
+            temp_file = tempfile.NamedTemporaryFile(suffix='.png', delete=False)
+            output_path = temp_file.name
+            temp_file.close()
+
+        await self.start()
+        viewport = (job.width, job.height)
+        async with self._semaphore:
+            context = await self._acquire_context(viewport)
+            page = await context.new_page()
+            try:
+                await page.goto(job.url, wait_until='networkidle')
+                if job.selector:
+                    await page.locator(job.selector).first.screenshot(path=output_path)
+                elif job.tiled:
+                    tile_dir = tile_directory(output_path)
+                    tile_paths = [path async for path in capture_tiles(page, tile_dir)]
+                    if not job.stitch:
+                        return str(tile_dir)
+                    stitch_tiles(tile_paths, output_path)
+                else:
+                    await page.screenshot(path=output_path, full_page=job.full_page)
+            finally:
+                await page.close()
+                await self._release_context(viewport, context)
+        return output_path
+
+    async def run(self, jobs: Iterable[ScreenshotJob]) -> AsyncIterator[ScreenshotResult]:
+        """
+        Take screenshots concurrently, yielding each result as it completes.
+
+        Failed jobs are yielded with an error instead of stopping the batch.
+        """
+        async def run_job(job):
+            start = time.perf_counter()
+            try:
+                path = await self.capture(job)
+                return ScreenshotResult(job, path, None, time.perf_counter() - start)
+            except Exception as e:
+                return ScreenshotResult(job, None, str(e), time.perf_counter() - start)
+
+        tasks = [asyncio.create_task(run_job(job)) for job in jobs]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+def tile_directory(output_path: str) -> Path:
+    """Where the strips of a tiled screenshot go, e.g. ``shoes_tiles/`` for ``shoes.png``."""
+    path = Path(output_path)
+    return path.with_name(f"{path.stem}_tiles")
+
+async def capture_tiles(page, output_dir: Path, tile_height: Optional[int] = None) -> AsyncIterator[str]:
+    """
+    Capture the full page as horizontal strips, one PNG per strip.
+
+    Each strip is clipped from the page separately, so neither the browser nor
+    this process holds a bitmap of the whole page. Strips are written as
+    ``tile_000.png``, ``tile_001.png``, ... and yielded as they are saved.
+
+    Args:
+        page: Playwright Page, already loaded
+        output_dir (Path): Directory for the strips; created if missing
+        tile_height (int, optional): Strip height in CSS pixels. Defaults to the viewport height.
+
+    Yields:
+        str: Path of each strip, top to bottom
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for old in output_dir.glob('tile_*.png'):
+        old.unlink()
+    viewport = page.viewport_size or {'width': 1280, 'height': 720}
+    tile_height = tile_height or viewport['height']
+    width, height = await page.evaluate(
+        "() => [document.documentElement.clientWidth,"
+        " Math.max(document.documentElement.scrollHeight, document.body ? document.body.scrollHeight : 0)]")
+    height = max(height, 1)
+    for i, top in enumerate(range(0, height, tile_height)):
+        path = output_dir / f"tile_{i:03d}.png"
+        await page.screenshot(path=str(path), full_page=True,
+                              clip={'x': 0, 'y': top, 'width': width, 'height': min(tile_height, height - top)})
+        yield str(path)
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+def stitch_tiles(tile_paths: List[str], output_path: str) -> str:
+    """
+    Join strips top to bottom into one PNG, holding one strip in memory at a time.
+
+    The PNG is written incrementally: rows of each strip are compressed into
+    the output stream as the strip is read. Strips narrower or wider than the
+    first are padded with white or cropped.
+
+    Returns:
+        str: ``output_path``
+    """
+    from PIL import Image
+
+    sizes = []
+    for path in tile_paths:
+        with Image.open(path) as tile:  # Reads the header only
+            sizes.append(tile.size)
+    if not sizes:
+        raise ValueError("No tiles to stitch")
+    width = sizes[0][0]
+    height = sum(h for _, h in sizes)
+
+    compressor = zlib.compressobj(6)
+    with open(output_path, 'wb') as out:
+        out.write(b'\x89PNG\r\n\x1a\n')
+        out.write(_png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)))
+        for path in tile_paths:
+            with Image.open(path) as tile:
+                tile = tile.convert('RGB')
+                if tile.width != width:
+                    padded = Image.new('RGB', (width, tile.height), 'white')
+                    padded.paste(tile, (0, 0))
+                    tile = padded
+                raw = tile.tobytes()
+            stride = width * 3
+            # Filter type 0 (None) before every row
+            rows = b''.join(b'\x00' + raw[y * stride:(y + 1) * stride] for y in range(len(raw) // stride))
+            data = compressor.compress(rows)
+            if data:
+                out.write(_png_chunk(b'IDAT', data))
+        out.write(_png_chunk(b'IDAT', compressor.flush()))
+        out.write(_png_chunk(b'IEND', b''))
+    return output_path
+
+async def take_screenshot(url: str, output_path: str = None, width: int = 1280, height: int = 720,
+                          block_profile: str = 'full', stats: Optional[BlockingStats] = None,
+                          selector: Optional[str] = None, tiled: bool = False) -> str:
     """
     Take a screenshot of a webpage using Playwright.
     
+    Launches a browser for this screenshot only; use ScreenshotService or
+    take_screenshots to take several.
+    
     Args:
         url (str): The URL to take a screenshot of
         output_path (str, optional): Path to save the screenshot. If None, saves to a temporary file.
         width (int, optional): Viewport width. Defaults to 1280.
         height (int, optional): Viewport height. Defaults to 720.
+        block_profile (str, optional): Request-interception profile from
+            resource_blocking.PROFILES. Defaults to 'full' (nothing blocked), since
+            blocking images or fonts changes what the page looks like.
+        stats (BlockingStats, optional): Updated with the requests allowed and avoided
+        selector (str, optional): Capture only the first element matching this CSS selector
+        tiled (bool, optional): Capture the page in viewport-high strips and stitch
+            them with bounded memory instead of as one full-page bitmap
     
     Returns:
         str: Path to the saved screenshot
     """
-    if output_path is None:
-        # Create a temporary file with .png extension
-        temp_file = tempfile.NamedTemporaryFile(suffix='.png', delete=False)
-        output_path = temp_file.name
-        temp_file.close()
-
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        page = await browser.new_page(viewport={'width': width, 'height': height})
-        
-        try:
-            await page.goto(url, wait_until='networkidle')
-            await page.screenshot(path=output_path, full_page=True)
-        finally:
-            await browser.close()
-    
-    return output_path
+    async with ScreenshotService(1, block_profile, stats) as service:
+        return await service.capture(ScreenshotJob(url, output_path, width, height,
+                                                   selector=selector, tiled=tiled))
 
-def take_screenshot_sync(url: str, output_path: str = None, width: int = 1280, height: int = 720) -> str:
+def take_screenshot_sync(url: str, output_path: str = None, width: int = 1280, height: int = 720,
+                         block_profile: str = 'full', stats: Optional[BlockingStats] = None,
+                         selector: Optional[str] = None, tiled: bool = False) -> str:
     """
     Synchronous wrapper for take_screenshot.
     """
-    return asyncio.run(take_screenshot(url, output_path, width, height))
+    return asyncio.run(take_screenshot(url, output_path, width, height, block_profile, stats, selector, tiled))
+
+async def take_screenshots(jobs: Iterable[ScreenshotJob], max_concurrent: int = 4, block_profile: str = 'full',
+                           stats: Optional[BlockingStats] = None) -> AsyncIterator[ScreenshotResult]:
+    """
+    Take many screenshots with one browser, yielding results in completion order.
+
+    Args:
+        jobs (Iterable[ScreenshotJob]): Screenshots to take
+        max_concurrent (int, optional): Maximum number of pages loading at once. Defaults to 4.
+        block_profile (str, optional): Request-interception profile, see take_screenshot
+        stats (BlockingStats, optional): Updated with the requests allowed and avoided
+    """
+    async with ScreenshotService(max_concurrent, block_profile, stats) as service:
+        async for result in service.run(jobs):
+            yield result
+
+def take_screenshots_sync(jobs: Iterable[ScreenshotJob], max_concurrent: int = 4, block_profile: str = 'full',
+                          stats: Optional[BlockingStats] = None) -> List[ScreenshotResult]:
+    """
+    Synchronous wrapper for take_screenshots; returns results in completion order.
+    """
+    async def collect():
+        return [result async for result in take_screenshots(jobs, max_concurrent, block_profile, stats)]
+    return asyncio.run(collect())
+
+def default_output_path(output_dir: Path, url: str, width: int, height: int) -> str:
+    """File name for a batch screenshot, e.g. ``localhost_3000_admin_orders_375x812.png``."""
+    parts = urlsplit(url)
+    slug = re.sub(r'[^A-Za-z0-9]+', '_', f"{parts.netloc}{parts.path}").strip('_') or 'page'
+    return str(Path(output_dir) / f"{slug}_{width}x{height}.png")
+
+def load_jobs(path: Path, output_dir: Path, full_page: bool = True) -> List[ScreenshotJob]:
+    """
+    Read jobs from a JSON list of objects with ``url`` and optional ``output``,
+    ``width``, ``height``, ``full_page``, ``selector``, ``tiled`` and ``stitch`` keys.
+    """
+    jobs = []
+    for item in json.loads(Path(path).read_text()):
+        width = item.get('width', 1280)
+        height = item.get('height', 720)
+        jobs.append(ScreenshotJob(item['url'],
+                                  item.get('output') or default_output_path(output_dir, item['url'], width, height),
+                                  width, height, item.get('full_page', full_page), item.get('selector'),
+                                  item.get('tiled', False), item.get('stitch', True)))
+    return jobs
+
+def parse_viewport(value: str) -> Tuple[int, int]:
+    """Parse a WIDTHxHEIGHT command-line value."""
+    match = re.fullmatch(r'(\d+)x(\d+)', value)
+    if not match:
+        raise argparse.ArgumentTypeError(f"Expected WIDTHxHEIGHT, got {value!r}")
+    return int(match.group(1)), int(match.group(2))
+
+async def print_batch(jobs: List[ScreenshotJob], max_concurrent: int, block_profile: str,
+                      stats: BlockingStats) -> int:
+    """Print each screenshot path as it is saved. Returns the number of failed jobs."""
+    failed = 0
+    async for result in take_screenshots(jobs, max_concurrent, block_profile, stats):
+        if result.error:
+            failed += 1
+            print(f"FAILED {result.job.url} ({result.job.width}x{result.job.height}): {result.error}",
+                  file=sys.stderr)
+        else:
+            print(f"Screenshot saved to: {result.path} ({result.elapsed:.1f}s)", flush=True)
+    return failed
 
 if __name__ == "__main__":
-    import argparse
-    parser = argparse.ArgumentParser(description='Take a screenshot of a webpage')
-    parser.add_argument('url', help='URL to take screenshot of')
-    parser.add_argument('--output', '-o', help='Output path for screenshot')
+    parser = argparse.ArgumentParser(description='Take screenshots of webpages')
+    parser.add_argument('urls', nargs='*', metavar='url', help='URL(s) to take screenshots of')
+    parser.add_argument('--output', '-o', help='Output path for screenshot (single URL and viewport only)')
     parser.add_argument('--width', '-w', type=int, default=1280, help='Viewport width')
     parser.add_argument('--height', '-H', type=int, default=720, help='Viewport height')
+    parser.add_argument('--viewport', action='append', type=parse_viewport, default=[], metavar='WxH',
+                        help='Capture every URL at this viewport, e.g. 375x812 (repeatable; '
+                             'overrides --width/--height)')
+    parser.add_argument('--jobs', type=Path, metavar='FILE',
+                        help='JSON list of {"url", "output", "width", "height", "full_page"} jobs')
+    parser.add_argument('--output-dir', type=Path, default=Path('screenshots'),
+                        help='Directory for batch screenshots (default: screenshots)')
+    parser.add_argument('--viewport-only', action='store_true',
+                        help='Capture only the visible viewport instead of the full page')
+    parser.add_argument('--selector', help='Capture only the first element matching this CSS selector')
+    parser.add_argument('--tiled', action='store_true',
+                        help='Capture long pages as viewport-high strips (in <output>_tiles/) and stitch '
+                             'them with bounded memory')
+    parser.add_argument('--no-stitch', action='store_true', help='With --tiled, keep only the strips')
+    parser.add_argument('--max-concurrent', type=int, default=4,
+                        help='Pages loaded at once in batch mode (default: 4)')
+    parser.add_argument('--block', choices=list(PROFILES), default='full',
+                        help='Requests to skip while loading the page (default: full, nothing blocked)')
     
     args = parser.parse_args()
-    output_path = take_screenshot_sync(args.url, args.output, args.width, args.height)
-    print(f"Screenshot saved to: {output_path}") 
\ No newline at end of file
+    viewports = args.viewport or [(args.width, args.height)]
+    stats = BlockingStats()
+    if (not args.jobs and len(args.urls) == 1 and len(viewports) == 1 and not args.viewport_only
+            and not args.no_stitch):
+        output_path = take_screenshot_sync(args.urls[0], args.output, viewports[0][0], viewports[0][1],
+                                           args.block, stats, args.selector, args.tiled)
+        print(f"Screenshot saved to: {output_path}")
+    else:
+        full_page = not args.viewport_only
+        jobs = load_jobs(args.jobs, args.output_dir, full_page) if args.jobs else []
+        jobs += [ScreenshotJob(url, default_output_path(args.output_dir, url, width, height), width, height,
+                               full_page, args.selector, args.tiled, not args.no_stitch)
+                 for url in args.urls for width, height in viewports]
+        if not jobs:
+            parser.error('no URL or --jobs file given')
+        for job in jobs:
+            Path(job.output_path).parent.mkdir(parents=True, exist_ok=True)
+
+        start = time.perf_counter()
+        failed = asyncio.run(print_batch(jobs, args.max_concurrent, args.block, stats))
+        print(f"{len(jobs) - failed}/{len(jobs)} screenshots in {time.perf_counter() - start:.1f}s")
+    print(f"Requests ({args.block}): {stats.summary()}")
@@ -1,43 +1,276 @@
 #!/usr/bin/env python3
 
 import argparse
+import asyncio
+import json
+import random
+import sqlite3
 import sys
+import threading
 import time
-from duckduckgo_search import DDGS
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 
-def search_with_retry(query, max_results=10, max_retries=3):
+from rate_limiter import default_limiter
+from site_index import DEFAULT_INDEX_PATH, SiteIndex
+
+# Requests to DuckDuckGo are paced under this URL's host
+DDG_URL = "https://duckduckgo.com/"
+
+DEFAULT_CACHE_PATH = Path.home() / '.cache' / 'new-steps-tools' / 'search.sqlite'
+DEFAULT_CACHE_TTL = 24 * 3600
+
+# Jittered exponential backoff between retries: a random delay of up to
+# BACKOFF_BASE * 2 ** attempt seconds, capped at BACKOFF_CAP
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 30.0
+
+class DDGSBackend:
+    """
+    DuckDuckGo text search.
+
+    Keeps one DDGS session per thread instead of opening a new one for every
+    attempt.
+    """
+    name = 'ddgs'
+    url = DDG_URL  # Requests are paced by the rate limiter under this URL's host
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def __call__(self, query: str, max_results: int) -> List[dict]:
+        ddgs = getattr(self._local, 'ddgs', None)
+        if ddgs is None:
+            from duckduckgo_search import DDGS
+            ddgs = self._local.ddgs = DDGS()
+        return list(ddgs.text(query, max_results=max_results))
+
+class FixtureBackend:
+    """
+    Offline stand-in that answers from a JSON file mapping queries to results.
+
+    Unknown queries return no results, so tests and demos run without network.
+    """
+    name = 'fixture'
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path) as f:
+            self.results: Dict[str, List[dict]] = json.load(f)
+
+    def __call__(self, query: str, max_results: int) -> List[dict]:
+        return list(self.results.get(query, []))[:max_results]
+
+class SiteIndexBackend:
+    """
+    Answers from the local BM25 index of crawled pages (see site_index.py).
+
+    Works offline and is not subject to DuckDuckGo rate limits.
+    """
+    name = 'site'
+
+    def __init__(self, path: Path = DEFAULT_INDEX_PATH):
+        self.index = SiteIndex(path)
+
+    def __call__(self, query: str, max_results: int) -> List[dict]:
+        return [{'href': hit.url, 'title': hit.title, 'body': hit.snippet}
+                for hit in self.index.search(query, max_results)]
+
+class SearchCache:
+    """
+    SQLite cache of search results keyed by backend, query and result count.
+
+    Entries older than ``ttl`` seconds are ignored and replaced on the next
+    search. Safe to share between threads.
+    """
+
+    def __init__(self, path: Path = DEFAULT_CACHE_PATH, ttl: float = DEFAULT_CACHE_TTL):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS searches (
+                backend TEXT, query TEXT, max_results INTEGER,
+                results TEXT NOT NULL, created_at REAL NOT NULL,
+                PRIMARY KEY (backend, query, max_results)
+            )""")
+        self._db.commit()
+
+    @staticmethod
+    def _normalize(query: str) -> str:
+        return ' '.join(query.split()).lower()
+
+    def get(self, backend: str, query: str, max_results: int) -> Optional[List[dict]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT results, created_at FROM searches WHERE backend = ? AND query = ? AND max_results = ?",
+                (backend, self._normalize(query), max_results)).fetchone()
+        if row is None or time.time() - row[1] >= self.ttl:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, backend: str, query: str, max_results: int, results: List[dict]) -> None:
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO searches VALUES (?, ?, ?, ?, ?)",
+                             (backend, self._normalize(query), max_results, json.dumps(results), time.time()))
+            self._db.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+_default_backend = None
+
+def default_backend():
+    global _default_backend
+    if _default_backend is None:
+        _default_backend = DDGSBackend()
+    return _default_backend
+
+def backend_name(backend) -> str:
+    """Key under which a backend's results are cached: its ``name``, else its qualified name."""
+    return getattr(backend, 'name', None) or getattr(backend, '__qualname__', None) or type(backend).__qualname__
+
+def backoff_delay(attempt: int) -> float:
+    """Random delay before retry number ``attempt + 1`` (full jitter)."""
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+def search_with_retry(query, max_results=10, max_retries=3, limiter=None, backend=None, cache=None):
     """
     Search using DuckDuckGo and return results with URLs and text snippets.
-    
+
     Args:
         query (str): Search query
         max_results (int): Maximum number of results to return
         max_retries (int): Maximum number of retry attempts
+        limiter (RateLimiter, optional): Per-host rate limiter. Defaults to the
+            limiter shared by all tools.
+        backend (callable, optional): Search backend, called as
+            ``backend(query, max_results)``; requests are rate limited when it
+            has a ``url`` attribute and results are cached under its ``name``
+            attribute if it has one (see backend_name). Defaults to DDGSBackend.
+        cache (SearchCache, optional): Result cache consulted before searching
     """
+    if limiter is None:
+        limiter = default_limiter()
+    if backend is None:
+        backend = default_backend()
+    url = getattr(backend, 'url', None)
+    if cache is not None:
+        cached = cache.get(backend_name(backend), query, max_results)
+        if cached is not None:
+            print(f"DEBUG: Cache hit for query: {query}", file=sys.stderr)
+            return cached
+
     for attempt in range(max_retries):
         try:
-            print(f"DEBUG: Searching for query: {query} (attempt {attempt + 1}/{max_retries})", 
+            print(f"DEBUG: Searching for query: {query} (attempt {attempt + 1}/{max_retries})",
                   file=sys.stderr)
-            
-            with DDGS() as ddgs:
-                results = list(ddgs.text(query, max_results=max_results))
-                
+
+            if url:
+                limiter.acquire(url)
+            start = time.perf_counter()
+            results = backend(query, max_results)
+            if url:
+                limiter.record(url, 200, time.perf_counter() - start)
+            if cache is not None:
+                cache.put(backend_name(backend), query, max_results, results)
+
             if not results:
                 print("DEBUG: No results found", file=sys.stderr)
                 return []
-            
+
             print(f"DEBUG: Found {len(results)} results", file=sys.stderr)
             return results
-                
+
         except Exception as e:
             print(f"ERROR: Attempt {attempt + 1}/{max_retries} failed: {str(e)}", file=sys.stderr)
+            if url:
+                limiter.record(url, None)
             if attempt < max_retries - 1:  # If not the last attempt
-                print(f"DEBUG: Waiting 1 second before retry...", file=sys.stderr)
-                time.sleep(1)  # Wait 1 second before retry
+                delay = backoff_delay(attempt)
+                print(f"DEBUG: Waiting {delay:.1f} seconds before retry...", file=sys.stderr)
+                time.sleep(delay)
             else:
                 print(f"ERROR: All {max_retries} attempts failed", file=sys.stderr)
                 raise
 
+async def search_async(query, max_results=10, max_retries=3, limiter=None, backend=None, cache=None):
+    """
+    Asynchronous version of search_with_retry.
+
+    The blocking backend call, cache access and rate-limit bookkeeping run in
+    worker threads and retries wait with asyncio.sleep, so many searches can
+    run concurrently on one event loop.
+    """
+    if limiter is None:
+        limiter = default_limiter()
+    if backend is None:
+        backend = default_backend()
+    url = getattr(backend, 'url', None)
+    if cache is not None:
+        cached = await asyncio.to_thread(cache.get, backend_name(backend), query, max_results)
+        if cached is not None:
+            return cached
+
+    for attempt in range(max_retries):
+        try:
+            if url:
+                await limiter.acquire_async(url)
+            start = time.perf_counter()
+            results = await asyncio.to_thread(backend, query, max_results)
+            if url:
+                await limiter.record_async(url, 200, time.perf_counter() - start)
+            if cache is not None:
+                await asyncio.to_thread(cache.put, backend_name(backend), query, max_results, results)
+            return results
+        except Exception as e:
+            print(f"ERROR: {query!r}: attempt {attempt + 1}/{max_retries} failed: {str(e)}", file=sys.stderr)
+            if url:
+                await limiter.record_async(url, None)
+            if attempt == max_retries - 1:
+                raise
+            await asyncio.sleep(backoff_delay(attempt))
+
+async def search_many(queries: List[str], max_results=10, max_retries=3, concurrency=4,
+                      limiter=None, backend=None,
+                      cache=None) -> AsyncIterator[Tuple[str, Optional[List[dict]], Optional[Exception]]]:
+    """
+    Run many searches concurrently, yielding each as it completes.
+
+    Args:
+        queries (List[str]): Search queries; duplicates are searched once
+        max_results (int): Maximum number of results per query
+        max_retries (int): Maximum number of attempts per query
+        concurrency (int): Maximum number of searches in flight
+        limiter, backend, cache: As for search_with_retry
+
+    Yields:
+        Tuple[str, Optional[List[dict]], Optional[Exception]]: (query, results, error)
+        in completion order; results is None when every attempt failed
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(query):
+        async with semaphore:
+            try:
+                return query, await search_async(query, max_results, max_retries, limiter, backend, cache), None
+            except Exception as e:
+                return query, None, e
+
+    tasks = [asyncio.create_task(run(query)) for query in dict.fromkeys(queries)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
 def format_results(results):
     """Format and print search results."""
     for i, r in enumerate(results, 1):
@@ -46,34 +279,85 @@ def format_results(results):
         print(f"Title: {r.get('title', 'N/A')}")
         print(f"Snippet: {r.get('body', 'N/A')}")
 
-def search(query, max_results=10, max_retries=3):
+def search(query, max_results=10, max_retries=3, backend=None, cache=None):
     """
     Main search function that handles search with retry mechanism.
-    
+
     Args:
         query (str): Search query
         max_results (int): Maximum number of results to return
         max_retries (int): Maximum number of retry attempts
+        backend (callable, optional): Search backend (see search_with_retry)
+        cache (SearchCache, optional): Result cache
     """
     try:
-        results = search_with_retry(query, max_results, max_retries)
+        results = search_with_retry(query, max_results, max_retries, backend=backend, cache=cache)
         if results:
             format_results(results)
-            
+
     except Exception as e:
         print(f"ERROR: Search failed: {str(e)}", file=sys.stderr)
         sys.exit(1)
 
+async def search_batch(queries, max_results=10, max_retries=3, concurrency=4, backend=None, cache=None) -> int:
+    """Print results for many queries as they complete. Returns the number of failed queries."""
+    failed = 0
+    async for query, results, error in search_many(queries, max_results, max_retries, concurrency,
+                                                   backend=backend, cache=cache):
+        print(f"\n##### Query: {query}")
+        if error is not None:
+            failed += 1
+            print(f"ERROR: Search failed: {str(error)}")
+        elif results:
+            format_results(results)
+        else:
+            print("No results found")
+    return failed
+
 def main():
     parser = argparse.ArgumentParser(description="Search using DuckDuckGo API")
-    parser.add_argument("query", help="Search query")
+    parser.add_argument("query", nargs="*", help="Search query (several queries run as a batch)")
+    parser.add_argument("--queries-file", type=Path,
+                      help="File with one query per line to run as a batch")
     parser.add_argument("--max-results", type=int, default=10,
                       help="Maximum number of results (default: 10)")
     parser.add_argument("--max-retries", type=int, default=3,
                       help="Maximum number of retry attempts (default: 3)")
-    
+    parser.add_argument("--concurrency", type=int, default=4,
+                      help="Maximum number of searches in flight in batch mode (default: 4)")
+    parser.add_argument("--no-cache", action="store_true",
+                      help="Do not read or write the local result cache")
+    parser.add_argument("--cache-ttl", type=float, default=DEFAULT_CACHE_TTL,
+                      help=f"Seconds cached results stay valid (default: {DEFAULT_CACHE_TTL})")
+    parser.add_argument("--fixture", type=Path,
+                      help="Answer from a JSON file of {query: [results]} instead of DuckDuckGo")
+    parser.add_argument("--site", type=Path, nargs="?", const=DEFAULT_INDEX_PATH, metavar="DIR",
+                      help="Search the local index of crawled pages instead of DuckDuckGo "
+                           f"(build it with web_scraper.py --index; default DIR: {DEFAULT_INDEX_PATH})")
+
     args = parser.parse_args()
-    search(args.query, args.max_results, args.max_retries)
+    queries = list(args.query)
+    if args.queries_file:
+        queries += [line.strip() for line in args.queries_file.read_text().splitlines() if line.strip()]
+    if not queries:
+        parser.error("no query given")
+
+    backend = None
+    if args.site:
+        backend = SiteIndexBackend(args.site)
+    elif args.fixture:
+        backend = FixtureBackend(args.fixture)
+    # The local index answers faster than the cache and is always current
+    cache = None if args.no_cache or args.site else SearchCache(ttl=args.cache_ttl)
+    if len(queries) == 1:
+        search(queries[0], args.max_results, args.max_retries, backend, cache)
+    else:
+        failed = asyncio.run(search_batch(queries, args.max_results, args.max_retries,
+                                          args.concurrency, backend, cache))
+        if cache is not None:
+            print(f"DEBUG: Cache: {cache.hits} hits, {cache.misses} misses", file=sys.stderr)
+        if failed:
+            sys.exit(1)
 
 if __name__ == "__main__":
     main()
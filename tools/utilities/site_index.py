@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+
+import argparse
+import hashlib
+import math
+import mmap
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from array import array
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows refuses to delete mapped files, which is all the locks ensure
+    fcntl = None
+
+DEFAULT_INDEX_PATH = Path.home() / '.cache' / 'new-steps-tools' / 'site_index'
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Postings added since the last compaction live in SQLite; past this many rows
+# they are merged into a new memory-mapped postings file
+COMPACT_THRESHOLD = 200_000
+
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have in is it its of on or that the
+this to was were will with you your we our us i
+""".split())
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+# Link targets in the extracted markdown, e.g. the "(https://...)" of "[text](https://...)"
+_LINK_TARGET_RE = re.compile(r"\]\([^)]*\)")
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase terms of ``text``, without link targets and stopwords."""
+    text = _LINK_TARGET_RE.sub("]", text).lower()
+    return [t for t in _TOKEN_RE.findall(text) if t not in STOPWORDS]
+
+class SearchHit(NamedTuple):
+    """One ranked page."""
+    url: str
+    title: str
+    score: float
+    snippet: str
+
+class SiteIndex:
+    """
+    BM25 inverted index over extracted page text, keyed by URL.
+
+    The index is a directory holding ``index.sqlite`` (documents, lexicon and
+    recent postings) and ``postings-<generation>.bin``, an array of
+    (doc_id, term frequency) uint32 pairs grouped by term that is memory-mapped
+    for queries. Adding a page whose text changed replaces the old version;
+    old versions and deleted pages are dropped from the postings file by
+    compact(), which runs automatically once enough postings accumulate.
+
+    Writers in several processes are serialized by SQLite. A search runs in
+    one read transaction, so the generation, the lexicon offsets and the
+    postings file it maps all belong to the same snapshot even if another
+    process compacts meanwhile. Every mapped postings file is held with a
+    shared lock, and compaction only deletes older files nobody holds; the
+    rest are removed by a later compact() or close().
+    """
+
+    def __init__(self, path: Path = DEFAULT_INDEX_PATH, compact_threshold: int = COMPACT_THRESHOLD):
+        self.path = Path(path)
+        self.compact_threshold = compact_threshold
+        self._lock = threading.RLock()
+        self._mmap: Optional[mmap.mmap] = None
+        self._postings: Optional[memoryview] = None
+        self._postings_file = None
+        self._generation = None
+        self._docs_version = None
+        self._doc_lengths: Dict[int, int] = {}
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        # Held shared while a reader maps a generation, exclusively while old files are deleted
+        self._gate_file = open(self.path / 'readers.lock', 'a+b')
+        self._db = sqlite3.connect(str(self.path / 'index.sqlite'), check_same_thread=False,
+                                   isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS docs (
+                doc_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                url TEXT NOT NULL,
+                title TEXT NOT NULL,
+                length INTEGER NOT NULL,
+                digest TEXT NOT NULL,
+                text BLOB NOT NULL,
+                live INTEGER NOT NULL DEFAULT 1,
+                indexed_at REAL NOT NULL
+            );
+            CREATE UNIQUE INDEX IF NOT EXISTS docs_live_url ON docs (url) WHERE live = 1;
+            CREATE TABLE IF NOT EXISTS terms (
+                term TEXT PRIMARY KEY,
+                offset INTEGER NOT NULL,
+                count INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS delta (
+                term TEXT NOT NULL,
+                doc_id INTEGER NOT NULL,
+                tf INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS delta_term ON delta (term);
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO meta VALUES ('generation', 0), ('docs_version', 0);
+        """)
+
+    def _meta(self, key: str) -> int:
+        return self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()[0]
+
+    def _bump(self, key: str) -> None:
+        self._db.execute("UPDATE meta SET value = value + 1 WHERE key = ?", (key,))
+
+    def _postings_path(self, generation: int) -> Path:
+        return self.path / f'postings-{generation}.bin'
+
+    @contextmanager
+    def _gate(self, exclusive: bool) -> Iterator[None]:
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(self._gate_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._gate_file, fcntl.LOCK_UN)
+
+    def _refresh(self) -> None:
+        """
+        Map the postings file of the current generation and reload document
+        lengths if they changed.
+
+        Call inside a transaction: its first read fixes the snapshot, and the
+        lexicon must be read from the same one as the generation.
+        """
+        with self._gate(exclusive=False):
+            generation = self._meta('generation')
+            if generation != self._generation:
+                self._unmap()
+                path = self._postings_path(generation)
+                if path.exists() and path.stat().st_size:
+                    self._postings_file = open(path, 'rb')
+                    if fcntl is not None:
+                        fcntl.flock(self._postings_file, fcntl.LOCK_SH)
+                    self._mmap = mmap.mmap(self._postings_file.fileno(), 0, access=mmap.ACCESS_READ)
+                    self._postings = memoryview(self._mmap).cast('I')
+                self._generation = generation
+        version = self._meta('docs_version')
+        if version != self._docs_version:
+            self._doc_lengths = dict(self._db.execute("SELECT doc_id, length FROM docs WHERE live = 1"))
+            self._docs_version = version
+
+    def _unmap(self) -> None:
+        if self._postings is not None:
+            self._postings.release()
+            self._postings = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._postings_file is not None:
+            self._postings_file.close()  # Releases its lock
+            self._postings_file = None
+        self._generation = None
+
+    def _remove_old_postings(self) -> None:
+        """Delete postings files of past generations that no reader has mapped."""
+        with self._gate(exclusive=True):
+            current = self._meta('generation')
+            for path in self.path.glob('postings-*.bin'):
+                try:
+                    generation = int(path.stem.split('-', 1)[1])
+                except ValueError:
+                    continue
+                # Newer files may belong to a compaction that has not committed yet
+                if generation >= current:
+                    continue
+                try:
+                    with open(path, 'rb') as f:
+                        if fcntl is not None:
+                            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        path.unlink()
+                except OSError:
+                    continue  # Still mapped by a reader, or already gone
+
+    def _base_postings(self, term: str) -> Iterable[Tuple[int, int]]:
+        row = self._db.execute("SELECT offset, count FROM terms WHERE term = ?", (term,)).fetchone()
+        if row is None or self._postings is None:
+            return ()
+        offset, count = row
+        pairs = self._postings[2 * offset:2 * (offset + count)]
+        return zip(pairs[::2], pairs[1::2])
+
+    def _delta_postings(self, term: str) -> Iterable[Tuple[int, int]]:
+        return self._db.execute("SELECT doc_id, tf FROM delta WHERE term = ?", (term,))
+
+    def add(self, url: str, text: str, title: Optional[str] = None) -> bool:
+        """
+        Index ``text`` as the content of ``url``, replacing any previous version.
+
+        Args:
+            url (str): Page URL, used as the document key
+            text (str): Extracted page text (markdown from web_scraper)
+            title (str, optional): Display title; defaults to the first line of text
+
+        Returns:
+            bool: False if the page was already indexed with the same text
+        """
+        digest = hashlib.sha1(text.encode('utf-8')).hexdigest()
+        if title is None:
+            title = next((line.strip() for line in text.splitlines() if line.strip()), url)[:120]
+        terms = Counter(tokenize(text))
+
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute("SELECT doc_id, digest FROM docs WHERE url = ? AND live = 1",
+                                       (url,)).fetchone()
+                if row is not None and row[1] == digest:
+                    self._db.execute("ROLLBACK")
+                    return False
+                if row is not None:
+                    self._db.execute("UPDATE docs SET live = 0 WHERE doc_id = ?", (row[0],))
+                doc_id = self._db.execute(
+                    "INSERT INTO docs (url, title, length, digest, text, indexed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (url, title, sum(terms.values()), digest, zlib.compress(text.encode('utf-8')),
+                     time.time())).lastrowid
+                self._db.executemany("INSERT INTO delta VALUES (?, ?, ?)",
+                                     ((term, doc_id, tf) for term, tf in terms.items()))
+                self._bump('docs_version')
+                pending = self._db.execute("SELECT COUNT(*) FROM delta").fetchone()[0]
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            if pending > self.compact_threshold:
+                self.compact()
+        return True
+
+    def delete(self, url: str) -> bool:
+        """Remove ``url`` from the results. Returns False if it was not indexed."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            cursor = self._db.execute("UPDATE docs SET live = 0 WHERE url = ? AND live = 1", (url,))
+            if cursor.rowcount:
+                self._bump('docs_version')
+            self._db.execute("COMMIT")
+        return bool(cursor.rowcount)
+
+    def urls(self) -> List[str]:
+        """URLs of all indexed pages."""
+        return [url for (url,) in self._db.execute("SELECT url FROM docs WHERE live = 1 ORDER BY url")]
+
+    def compact(self) -> None:
+        """
+        Merge recent postings into a new postings file and drop replaced or
+        deleted pages for good.
+        """
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._refresh()
+                live = self._doc_lengths
+                merged: Dict[str, List[Tuple[int, int]]] = {}
+                for term, in self._db.execute("SELECT term FROM terms").fetchall():
+                    merged[term] = [p for p in self._base_postings(term) if p[0] in live]
+                for term, doc_id, tf in self._db.execute("SELECT term, doc_id, tf FROM delta").fetchall():
+                    if doc_id in live:
+                        merged.setdefault(term, []).append((doc_id, tf))
+
+                generation = self._generation + 1
+                lexicon = []
+                offset = 0
+                with open(self._postings_path(generation), 'wb') as f:
+                    for term in sorted(merged):
+                        postings = sorted(merged[term])
+                        if not postings:
+                            continue
+                        flat = array('I')
+                        for doc_id, tf in postings:
+                            flat.append(doc_id)
+                            flat.append(tf)
+                        flat.tofile(f)
+                        lexicon.append((term, offset, len(postings)))
+                        offset += len(postings)
+                    f.flush()
+                    os.fsync(f.fileno())
+
+                self._db.execute("DELETE FROM terms")
+                self._db.executemany("INSERT INTO terms VALUES (?, ?, ?)", lexicon)
+                self._db.execute("DELETE FROM delta")
+                self._db.execute("DELETE FROM docs WHERE live = 0")
+                self._bump('generation')
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+            self._db.execute("BEGIN")
+            try:
+                self._refresh()
+            finally:
+                self._db.execute("COMMIT")
+            self._remove_old_postings()
+            self._db.execute("VACUUM")
+
+    def search(self, query: str, limit: int = 10) -> List[SearchHit]:
+        """
+        Rank indexed pages against ``query`` with BM25.
+
+        Args:
+            query (str): Free-text query; every term contributes, none is required
+            limit (int): Maximum number of hits
+
+        Returns:
+            List[SearchHit]: Best matches first
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        with self._lock:
+            # One snapshot for the generation, lexicon, recent postings and documents
+            self._db.execute("BEGIN")
+            try:
+                return self._search(terms, limit)
+            finally:
+                self._db.execute("COMMIT")
+
+    def _search(self, terms: List[str], limit: int) -> List[SearchHit]:
+        self._refresh()
+        lengths = self._doc_lengths
+        if not terms or not lengths:
+            return []
+        n_docs = len(lengths)
+        avg_length = sum(lengths.values()) / n_docs
+
+        scores: Dict[int, float] = {}
+        for term in terms:
+            postings = [(doc_id, tf) for source in (self._base_postings(term), self._delta_postings(term))
+                        for doc_id, tf in source if doc_id in lengths]
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings:
+                norm = K1 * (1 - B + B * lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+
+        best = sorted(scores.items(), key=lambda item: -item[1])[:limit]
+        hits = []
+        for doc_id, score in best:
+            url, title, blob = self._db.execute(
+                "SELECT url, title, text FROM docs WHERE doc_id = ?", (doc_id,)).fetchone()
+            text = zlib.decompress(blob).decode('utf-8')
+            hits.append(SearchHit(url, title, round(score, 4), _snippet(text, terms)))
+        return hits
+
+    def stats(self) -> Dict[str, int]:
+        """Page, term and posting counts plus the size on disk."""
+        with self._lock:
+            docs, replaced = self._db.execute(
+                "SELECT COALESCE(SUM(live), 0), COALESCE(SUM(1 - live), 0) FROM docs").fetchone()
+            terms = self._db.execute("SELECT COUNT(*) FROM terms").fetchone()[0]
+            delta = self._db.execute("SELECT COUNT(*) FROM delta").fetchone()[0]
+        size = sum(f.stat().st_size for f in self.path.iterdir() if f.is_file())
+        return {'pages': docs, 'stale_pages': replaced, 'compacted_terms': terms,
+                'pending_postings': delta, 'bytes': size}
+
+    def close(self) -> None:
+        with self._lock:
+            self._unmap()
+            self._remove_old_postings()
+            self._db.close()
+            self._gate_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def _snippet(text: str, terms: List[str], width: int = 200) -> str:
+    """The first line of ``text`` mentioning a query term, trimmed around the match."""
+    wanted = set(terms)
+    for line in text.splitlines():
+        tokens = tokenize(line)
+        if wanted.intersection(tokens):
+            line = line.strip()
+            if len(line) <= width:
+                return line
+            match = next(m for m in _TOKEN_RE.finditer(line.lower()) if m.group() in wanted)
+            start = max(0, match.start() - width // 3)
+            return ('...' if start else '') + line[start:start + width].strip() + '...'
+    return text.strip()[:width]
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Query or maintain the local full-text index of crawled pages '
+                    '(build it with web_scraper.py --crawl --index)')
+    parser.add_argument('query', nargs='?', help='Terms to search for')
+    parser.add_argument('--index', type=Path, default=DEFAULT_INDEX_PATH,
+                        help=f'Index directory (default: {DEFAULT_INDEX_PATH})')
+    parser.add_argument('--limit', type=int, default=10, help='Maximum number of results (default: 10)')
+    parser.add_argument('--delete', action='append', default=[], metavar='URL',
+                        help='Remove a page from the index (repeatable)')
+    parser.add_argument('--compact', action='store_true',
+                        help='Merge pending postings and drop replaced pages')
+    parser.add_argument('--stats', action='store_true', help='Print index statistics')
+    args = parser.parse_args()
+
+    with SiteIndex(args.index) as index:
+        for url in args.delete:
+            if not index.delete(url):
+                print(f"Not indexed: {url}", file=sys.stderr)
+        if args.compact:
+            index.compact()
+        if args.query:
+            start = time.perf_counter()
+            hits = index.search(args.query, args.limit)
+            elapsed = time.perf_counter() - start
+            for i, hit in enumerate(hits, 1):
+                print(f"\n=== Result {i} (score {hit.score:.2f}) ===")
+                print(f"URL: {hit.url}")
+                print(f"Title: {hit.title}")
+                print(f"Snippet: {hit.snippet}")
+            print(f"\n{len(hits)} results in {elapsed * 1000:.1f} ms", file=sys.stderr)
+        if args.stats:
+            for key, value in index.stats().items():
+                print(f"{key}: {value}")
+
+if __name__ == "__main__":
+    main()
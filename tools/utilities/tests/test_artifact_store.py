@@ -0,0 +1,31 @@
+import asyncio
+import io
+
+from PIL import Image
+
+from artifact_store import ArtifactStore
+
+def png(color, size=(64, 48)):
+    out = io.BytesIO()
+    Image.new('RGB', size, color).save(out, 'PNG')
+    return out.getvalue()
+
+def test_screenshots_saved_from_worker_threads(tmp_path):
+    store = ArtifactStore(tmp_path / 'store')
+    run = store.start_run('audit')
+    shots = [png('red'), png('blue'), png('red')]
+
+    async def save_all():
+        await asyncio.gather(*(
+            asyncio.to_thread(store.save_screenshot, run, f"page{i}.png", data, tmp_path / 'out' / f"page{i}.png")
+            for i, data in enumerate(shots)))
+
+    asyncio.run(save_all())
+    assert store.stats.stored == 3
+    # Identical renders share a blob
+    assert len({a.blob for a in store.artifacts(run)}) == 2
+    for i in range(3):
+        with Image.open(tmp_path / 'out' / f"page{i}.png") as image:
+            assert image.getpixel((0, 0)) == ((255, 0, 0) if i != 1 else (0, 0, 255))
+    assert {a.name for a in store.artifacts(run)} == {"page0.png", "page1.png", "page2.png"}
+    store.close()
@@ -0,0 +1,94 @@
+import pytest
+
+import llm_api
+
+API_KEYS = {
+    "OPENAI_API_KEY": "test",
+    "AZURE_OPENAI_API_KEY": "test",
+    "DEEPSEEK_API_KEY": "test",
+    "SILICONFLOW_API_KEY": "test",
+    "ANTHROPIC_API_KEY": "test",
+    "GOOGLE_API_KEY": "test",
+}
+
+@pytest.fixture
+def api_keys(monkeypatch):
+    for name, value in API_KEYS.items():
+        monkeypatch.setenv(name, value)
+    monkeypatch.setattr(llm_api, "load_environment", lambda *args, **kwargs: None)
+
+@pytest.mark.parametrize("provider", ["openai", "azure", "deepseek", "siliconflow", "local", "anthropic"])
+def test_create_llm_client_builds_pooled_sdk_clients(api_keys, provider):
+    limits = llm_api.ClientLimits(max_connections=7, timeout=12.0, max_retries=1)
+    client = llm_api.create_llm_client(provider, limits)
+    try:
+        assert client.max_retries == 1
+        assert client.timeout == 12.0
+        assert client._client is not None
+    finally:
+        client.close()
+
+def test_create_llm_client_gemini(api_keys):
+    pytest.importorskip("google.generativeai")
+    assert llm_api.create_llm_client("gemini").__name__ == "google.generativeai"
+
+def test_create_llm_client_rejects_unknown_provider(api_keys):
+    with pytest.raises(ValueError):
+        llm_api.create_llm_client("nope")
+
+@pytest.fixture
+def fake_server(monkeypatch):
+    from llm_fake_server import FakeConfig, Rule, start_fake_server
+
+    def start(*rules):
+        server = start_fake_server(FakeConfig(rules=tuple(rules), retry_after=0.01, seed=1))
+        monkeypatch.setenv("LOCAL_LLM_BASE_URL", f"http://127.0.0.1:{server.server_port}/v1")
+        llm_api.close_llm_clients()
+        servers.append(server)
+        return server
+
+    servers = []
+    yield start, Rule
+    llm_api.close_llm_clients()
+    for server in servers:
+        server.shutdown()
+
+def run_many(prompts, **kwargs):
+    async def collect():
+        return [result async for result in llm_api.query_many(prompts, provider="local", **kwargs)]
+    import asyncio
+    return asyncio.run(collect())
+
+def test_query_many_counts_every_http_attempt(fake_server):
+    start, Rule = fake_server
+    server = start(Rule(match="^flaky", status=429, times=2))
+    [result] = run_many(["flaky prompt"], max_retries=3)
+    assert result.error is None
+    assert result.attempts == 3
+    # The SDK does not retry underneath query_many
+    assert server.stats["requests"] == 3
+
+def test_query_many_gives_up_after_max_retries(fake_server):
+    start, Rule = fake_server
+    server = start(Rule(match="^down", status=429))
+    [result] = run_many(["down prompt"], max_retries=1)
+    assert result.response is None
+    assert result.attempts == 2
+    assert server.stats["requests"] == 2
+
+def test_query_many_refresh_bypasses_cache_but_stores(fake_server, tmp_path):
+    from llm_cache import ResponseCache
+    start, _ = fake_server
+    server = start()
+    cache = ResponseCache(tmp_path / "cache.sqlite")
+    try:
+        run_many(["hello"], cache=cache)
+        run_many(["hello"], cache=cache)
+        assert server.stats["requests"] == 1
+        [result] = run_many(["hello"], cache=cache, refresh=True)
+        assert result.response == "echo: hello"
+        assert server.stats["requests"] == 2
+        run_many(["hello"], cache=cache)
+        assert server.stats["requests"] == 2
+    finally:
+        cache.close()
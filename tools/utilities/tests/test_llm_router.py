@@ -0,0 +1,91 @@
+import time
+
+import pytest
+
+import llm_api
+import llm_metrics
+from llm_fake_server import ANTHROPIC_PATH, OPENAI_PATH, FakeConfig, Rule, start_fake_server
+from llm_router import RoutePolicy, Router
+
+@pytest.fixture
+def recorder(monkeypatch):
+    recorder = llm_metrics.MetricsRecorder()
+    monkeypatch.setattr(llm_metrics, "metrics", recorder)
+    return recorder
+
+@pytest.fixture
+def fake_providers(monkeypatch, recorder):
+    """Point openai, anthropic and local at one fake server scripted by ``rules``."""
+    servers = []
+    max_retries = llm_api.DEFAULT_CLIENT_LIMITS.max_retries
+
+    def start(*rules):
+        server = start_fake_server(FakeConfig(rules=tuple(rules), seed=1))
+        base = f"http://127.0.0.1:{server.server_port}"
+        for name, value in {"OPENAI_BASE_URL": f"{base}/v1", "OPENAI_API_KEY": "fake",
+                            "ANTHROPIC_BASE_URL": base, "ANTHROPIC_API_KEY": "fake",
+                            "LOCAL_LLM_BASE_URL": f"{base}/v1"}.items():
+            monkeypatch.setenv(name, value)
+        monkeypatch.setattr(llm_api, "load_environment", lambda *args, **kwargs: None)
+        # Failover is the router's job, not the SDK's
+        llm_api.configure_client_limits(max_retries=0)
+        # Build the clients up front so SDK imports do not decide who wins a race
+        for provider in ("openai", "anthropic", "local"):
+            llm_api.get_llm_client(provider)
+        servers.append(server)
+        return server
+
+    yield start
+    llm_api.configure_client_limits(max_retries=max_retries)
+    for server in servers:
+        server.shutdown()
+
+def rows_by_provider(recorder):
+    return {row["provider"]: row for row in recorder.aggregator.rows()}
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+def test_hedge_wins_over_slow_primary_without_counting_an_error(fake_providers, recorder):
+    fake_providers(Rule(path=OPENAI_PATH, match="^slow", latency="0.8"))
+    router = Router(RoutePolicy(("openai", "anthropic"), initial_hedge_delay=0.1))
+    try:
+        result = router.query("slow prompt")
+        assert (result.provider, result.hedged, result.errors) == ("anthropic", True, [])
+        assert (router.hedges, router.hedge_wins, router.failovers) == (1, 1, 0)
+        # The primary is cancelled at its first chunk, after the hedge answered
+        wait_for(lambda: rows_by_provider(recorder).get("openai", {}).get("cancelled") == 1)
+        assert rows_by_provider(recorder)["openai"]["errors"] == 0
+    finally:
+        router.close()
+
+def test_failover_after_server_error(fake_providers, recorder):
+    fake_providers(Rule(path=OPENAI_PATH, match="^down", status=500))
+    router = Router(RoutePolicy(("openai", "anthropic"), initial_hedge_delay=5.0))
+    try:
+        result = router.query("down prompt")
+        assert result.provider == "anthropic"
+        assert result.response
+        assert not result.hedged
+        assert len(result.errors) == 1 and result.errors[0].startswith("openai: ")
+        assert (router.hedges, router.hedge_wins, router.failovers) == (0, 0, 1)
+        rows = rows_by_provider(recorder)
+        assert rows["openai"]["errors"] == 1
+        assert rows["anthropic"]["errors"] == 0
+    finally:
+        router.close()
+
+def test_failover_that_beats_its_hedge_is_not_a_hedge_win(fake_providers):
+    fake_providers(Rule(path=OPENAI_PATH, match="^mixed", model="gpt-4o", status=500),
+                   Rule(path=ANTHROPIC_PATH, match="^mixed", latency="0.4"),
+                   Rule(path=OPENAI_PATH, match="^mixed", latency="2.0"))
+    router = Router(RoutePolicy(("openai", "anthropic", "local"), initial_hedge_delay=0.1))
+    try:
+        result = router.query("mixed prompt")
+        assert (result.provider, result.hedged) == ("anthropic", True)
+        assert (router.hedges, router.hedge_wins, router.failovers) == (1, 0, 1)
+    finally:
+        router.close()
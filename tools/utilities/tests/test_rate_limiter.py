@@ -0,0 +1,55 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import rate_limiter
+from rate_limiter import RateLimiter, apply_rate_limit
+
+class FakeContext:
+    """Collects the route and event handlers apply_rate_limit installs."""
+
+    def __init__(self):
+        self.handlers = {}
+
+    async def route(self, pattern, handler):
+        self.handlers['route'] = handler
+
+    def on(self, event, handler):
+        self.handlers[event] = handler
+
+def fake_response(url, status):
+    request = SimpleNamespace(timing={'responseStart': 120.0})
+    return SimpleNamespace(url=url, status=status, request=request, headers={})
+
+def test_browser_responses_are_recorded_off_the_event_loop(tmp_path, monkeypatch):
+    limiter = RateLimiter(tmp_path / 'limits.sqlite')
+    threads = []
+    record = RateLimiter.record
+
+    def spy(self, *args, **kwargs):
+        threads.append(threading.current_thread())
+        return record(self, *args, **kwargs)
+
+    monkeypatch.setattr(RateLimiter, 'record', spy)
+
+    async def run():
+        context = FakeContext()
+        await apply_rate_limit(context, limiter)
+        pending = context.handlers['response'](fake_response("https://example.com/a", 503))
+        # Nothing is recorded until the handler runs as a task
+        assert threads == []
+        await pending
+        await context.handlers['requestfailed'](SimpleNamespace(url="https://example.com/b"))
+        return threading.current_thread()
+
+    loop_thread = asyncio.run(run())
+    assert len(threads) == 2
+    assert loop_thread not in threads
+    assert limiter.stats['example.com'].throttled == 2
+    limiter.close()
+
+def test_record_async_without_state_file_records_inline():
+    limiter = RateLimiter()
+    asyncio.run(limiter.record_async("https://example.com/", 200, 0.1))
+    state = limiter._states['example.com']
+    assert state.rate > rate_limiter.DEFAULT_LIMITS.initial_rate
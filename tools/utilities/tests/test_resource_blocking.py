@@ -0,0 +1,20 @@
+from resource_blocking import PROFILES, should_block
+
+PAGE = "https://www.newsteps.org/shoes"
+TEXT_ONLY = PROFILES['text-only']
+
+def test_text_only_runs_first_party_and_cdn_scripts():
+    assert not should_block(TEXT_ONLY, 'script', "https://www.newsteps.org/_next/app.js", PAGE)
+    assert not should_block(TEXT_ONLY, 'script', "https://cdn.jsdelivr.net/npm/vue@3/dist/vue.js", PAGE)
+    assert not should_block(TEXT_ONLY, 'script', "https://d111.cloudfront.net/bundle.js", PAGE)
+
+def test_text_only_blocks_other_third_party_and_analytics():
+    assert should_block(TEXT_ONLY, 'script', "https://widgets.example.com/embed.js", PAGE)
+    assert should_block(TEXT_ONLY, 'script', "https://www.googletagmanager.com/gtm.js", PAGE)
+    assert should_block(TEXT_ONLY, 'xhr', "https://cdn.jsdelivr.net/data.json", PAGE)
+    assert should_block(TEXT_ONLY, 'stylesheet', "https://www.newsteps.org/site.css", PAGE)
+
+def test_no_third_party_stays_strict():
+    profile = PROFILES['no-third-party']
+    assert should_block(profile, 'script', "https://cdn.jsdelivr.net/npm/vue@3/dist/vue.js", PAGE)
+    assert not should_block(profile, 'script', "https://static.newsteps.org/app.js", PAGE)
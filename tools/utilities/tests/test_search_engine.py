@@ -0,0 +1,102 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+import search_engine
+from rate_limiter import RateLimiter
+from search_engine import FixtureBackend, SearchCache, search_async, search_many
+
+RESULTS = {
+    "python": [{"href": "https://python.org", "title": "Python", "body": "Language"}],
+    "rust": [{"href": "https://rust-lang.org", "title": "Rust", "body": "Language"}],
+    "broken": [{"href": "https://example.com", "title": "Never", "body": "Seen"}],
+}
+
+class CountingBackend(FixtureBackend):
+    """Fixture backend that counts calls, fails for "broken" and is paced under ``url``."""
+    url = "https://search.example.com/"
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.calls = []
+
+    def __call__(self, query, max_results):
+        self.calls.append(query)
+        if query == "broken":
+            raise RuntimeError("backend unavailable")
+        return super().__call__(query, max_results)
+
+@pytest.fixture
+def backend(tmp_path):
+    path = tmp_path / 'fixture.json'
+    path.write_text(json.dumps(RESULTS))
+    return CountingBackend(path)
+
+@pytest.fixture
+def limiter(tmp_path, monkeypatch):
+    monkeypatch.setattr(search_engine, 'backoff_delay', lambda attempt: 0)
+    return RateLimiter(tmp_path / 'limits.sqlite')
+
+def run_many(queries, **kwargs):
+    async def collect():
+        return [item async for item in search_many(queries, **kwargs)]
+    return asyncio.run(collect())
+
+def test_search_many_fans_out_and_searches_duplicates_once(backend, limiter):
+    results = run_many(["python", "rust", "python", "unknown"], backend=backend, limiter=limiter)
+    assert sorted(query for query, _, _ in results) == ["python", "rust", "unknown"]
+    by_query = {query: found for query, found, _ in results}
+    assert by_query["python"] == RESULTS["python"]
+    assert by_query["unknown"] == []
+    assert sorted(backend.calls) == ["python", "rust", "unknown"]
+
+def test_one_failing_query_does_not_stop_the_others(backend, limiter):
+    results = {query: (found, error)
+               for query, found, error in run_many(["python", "broken", "rust"], max_retries=2,
+                                                   backend=backend, limiter=limiter)}
+    assert results["python"] == (RESULTS["python"], None)
+    assert results["rust"] == (RESULTS["rust"], None)
+    found, error = results["broken"]
+    assert found is None and isinstance(error, RuntimeError)
+    assert backend.calls.count("broken") == 2
+
+def test_cached_results_skip_the_backend(backend, limiter, tmp_path):
+    cache = SearchCache(tmp_path / 'search.sqlite')
+    try:
+        first = asyncio.run(search_async("python", backend=backend, limiter=limiter, cache=cache))
+        second = asyncio.run(search_async("  Python ", backend=backend, limiter=limiter, cache=cache))
+        assert first == second == RESULTS["python"]
+        assert backend.calls == ["python"]
+        assert (cache.hits, cache.misses) == (1, 1)
+    finally:
+        cache.close()
+
+def test_plain_function_backends_are_cached_by_name(limiter, tmp_path):
+    calls = []
+
+    def lookup(query, max_results):
+        calls.append(query)
+        return [{"href": f"https://example.com/{query}"}]
+
+    cache = SearchCache(tmp_path / 'search.sqlite')
+    try:
+        for _ in range(2):
+            asyncio.run(search_async("docs", backend=lookup, limiter=limiter, cache=cache))
+        assert calls == ["docs"]
+    finally:
+        cache.close()
+
+def test_rate_limit_records_happen_off_the_event_loop(backend, limiter, monkeypatch):
+    threads = []
+    record = RateLimiter.record
+
+    def spy(self, *args, **kwargs):
+        threads.append(threading.current_thread())
+        return record(self, *args, **kwargs)
+
+    monkeypatch.setattr(RateLimiter, 'record', spy)
+    run_many(["python", "broken"], max_retries=1, backend=backend, limiter=limiter)
+    assert len(threads) == 2
+    assert threading.main_thread() not in threads
@@ -0,0 +1,73 @@
+from site_index import SiteIndex
+
+PAGES = {
+    "https://example.com/donate": "Donate shoes\nDrop off running shoes at any partner store.",
+    "https://example.com/request": "Request shoes\nFamilies can request school shoes online.",
+    "https://example.com/about": "About us\nVolunteers sort and ship donated shoes.",
+}
+
+def build(path, **kwargs):
+    index = SiteIndex(path, **kwargs)
+    for url, text in PAGES.items():
+        index.add(url, text)
+    return index
+
+def test_search_ranks_after_compaction(tmp_path):
+    with build(tmp_path) as index:
+        before = index.search("request school shoes")
+        index.compact()
+        assert index.search("request school shoes") == before
+        assert before[0].url == "https://example.com/request"
+
+def test_search_uses_one_snapshot_when_another_process_compacts(tmp_path, monkeypatch):
+    reader = build(tmp_path)
+    reader.compact()
+    expected = reader.search("partner store volunteers")
+    writer = SiteIndex(tmp_path)
+
+    # Between mapping the postings file and reading the lexicon, another
+    # writer replaces every page and compacts into a new generation
+    base_postings = reader._base_postings
+    fired = []
+
+    def interleaved(term):
+        if not fired:
+            fired.append(True)
+            writer.add("https://example.com/blog", "Blog\n" + "partner news " * 50)
+            for url, text in PAGES.items():
+                writer.add(url, text + "\nUpdated.")
+            writer.compact()
+        return base_postings(term)
+
+    monkeypatch.setattr(reader, "_base_postings", interleaved)
+    assert reader.search("partner store volunteers") == expected
+    monkeypatch.undo()
+
+    # The next search sees the new generation
+    fresh = SiteIndex(tmp_path)
+    assert reader.search("partner") == fresh.search("partner")
+    assert reader.search("partner")[0].url == "https://example.com/blog"
+    for index in (reader, writer, fresh):
+        index.close()
+
+def test_mapped_postings_file_outlives_compaction_by_another_process(tmp_path):
+    reader = build(tmp_path)
+    reader.compact()
+    reader.search("shoes")
+    mapped = reader._postings_path(reader._generation)
+
+    writer = SiteIndex(tmp_path)
+    writer.add("https://example.com/new", "New page about laces")
+    writer.compact()
+    assert mapped.exists()
+
+    assert reader.search("laces")[0].url == "https://example.com/new"
+    reader.close()
+    writer.close()
+    assert not mapped.exists()
+    assert len(list(tmp_path.glob("postings-*.bin"))) == 1
+
+def test_add_compacts_past_threshold(tmp_path):
+    with build(tmp_path, compact_threshold=5) as index:
+        assert index.stats()["pending_postings"] == 0
+        assert index.stats()["compacted_terms"] > 0
@@ -0,0 +1,63 @@
+import numpy as np
+from PIL import Image
+
+from visual_diff import BaselineStore, Mask
+
+def save(path, pixels):
+    Image.fromarray(pixels).save(path)
+    return path
+
+def page(height=800, width=400):
+    """A page with a gradient, so its perceptual hash is well defined."""
+    row = np.linspace(0, 255, width, dtype=np.uint8)
+    return np.repeat(np.repeat(row[None, :, None], height, axis=0), 3, axis=2).copy()
+
+def banner_changed(pixels):
+    changed = pixels.copy()
+    changed[:600, :400] = 255 - changed[:600, :400]
+    return changed
+
+def test_change_inside_mask_passes_with_or_without_diff_image(tmp_path):
+    baseline = save(tmp_path / 'base.png', page())
+    current = save(tmp_path / 'current.png', banner_changed(page()))
+    store = BaselineStore(tmp_path / 'baselines')
+    store.approve('home', baseline, [Mask(0, 0, 400, 600)])
+
+    default = store.compare('home', current)
+    with_diff = store.compare('home', current, diff_dir=tmp_path / 'diffs')
+    always_diff = store.compare('home', current, max_hash_distance=None)
+    assert default.hash_distance > 10
+    assert default.status == with_diff.status == always_diff.status == 'identical'
+
+def test_extra_masks_apply_like_stored_masks(tmp_path):
+    baseline = save(tmp_path / 'base.png', page())
+    current = save(tmp_path / 'current.png', banner_changed(page()))
+    store = BaselineStore(tmp_path / 'baselines')
+    store.approve('home', baseline)
+    assert store.compare('home', current).status == 'fail'
+    assert store.compare('home', current, extra_masks=[Mask(0, 0, 400, 600)]).status == 'identical'
+
+def test_far_page_stops_diffing_once_it_fails(tmp_path):
+    baseline = save(tmp_path / 'base.png', page())
+    current = save(tmp_path / 'current.png', banner_changed(page()))
+    store = BaselineStore(tmp_path / 'baselines')
+    store.approve('home', baseline)
+    default = store.compare('home', current)
+    full = store.compare('home', current, max_hash_distance=None)
+    assert default.status == full.status == 'fail'
+    assert 0 < default.tiles_compared < full.tiles_compared
+
+def test_low_contrast_global_shift_is_diffed_not_failed_by_hash(tmp_path):
+    # A near-white page brightened by 3/255: every pixel is within threshold,
+    # but clipping at white flattens the thumbnail and moves the hash far
+    background = np.random.default_rng(0).integers(246, 256, (800, 400, 3))
+    baseline = save(tmp_path / 'base.png', background.astype(np.uint8))
+    current = save(tmp_path / 'current.png', np.minimum(background + 3, 255).astype(np.uint8))
+    store = BaselineStore(tmp_path / 'baselines')
+    store.approve('home', baseline)
+
+    default = store.compare('home', current)
+    with_diff = store.compare('home', current, diff_dir=tmp_path / 'diffs')
+    assert default.hash_distance > 10
+    assert default.status == with_diff.status == 'identical'
+    assert default.tiles_compared == default.tiles_total
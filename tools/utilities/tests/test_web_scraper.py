@@ -0,0 +1,189 @@
+import asyncio
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import web_scraper
+
+class FailingFetcher:
+    """Fetcher whose cache blows up for some URLs."""
+
+    mode = 'auto'
+
+    def __init__(self, broken, links=()):
+        self.broken = broken
+        self.links = links
+
+    async def fetch(self, url):
+        html, _ = await self.fetch_with_record(url)
+        return html
+
+    async def fetch_with_record(self, url):
+        if url in self.broken:
+            raise sqlite3.OperationalError("database is locked")
+        anchors = "".join(f'<a href="{link}">{link}</a>' for link in self.links)
+        return (f"<html><body><p>Page {url}</p>{anchors}</body></html>",
+                web_scraper.FetchRecord(url, 'http'))
+
+def collect(urls, fetcher, max_concurrent=2):
+    async def run():
+        with ThreadPoolExecutor(2) as executor:
+            return [item async for item in web_scraper.stream_urls(
+                urls, max_concurrent, executor=executor, fetcher=fetcher)]
+    return asyncio.run(asyncio.wait_for(run(), timeout=10))
+
+def test_stream_urls_yields_every_url_when_fetch_raises():
+    urls = [f"https://example.com/{i}" for i in range(5)]
+    results = dict(collect(urls, FailingFetcher({urls[1], urls[3]})))
+    assert set(results) == set(urls)
+    assert results[urls[1]] == ""
+    assert results[urls[3]] == ""
+    assert "Page https://example.com/0" in results[urls[0]]
+
+def test_stream_urls_survives_every_fetch_failing():
+    urls = [f"https://example.com/{i}" for i in range(4)]
+    results = collect(urls, FailingFetcher(set(urls)), max_concurrent=1)
+    assert sorted(url for url, _ in results) == sorted(urls)
+
+def test_stream_urls_reuses_the_shared_parse_pool(monkeypatch):
+    pool = ThreadPoolExecutor(2)
+    monkeypatch.setattr(web_scraper, '_parse_executor', pool)
+    urls = [f"https://example.com/{i}" for i in range(3)]
+
+    async def run():
+        return [item async for item in web_scraper.stream_urls(urls, 2, fetcher=FailingFetcher(set()))]
+
+    try:
+        for _ in range(2):
+            assert len(asyncio.run(run())) == 3
+        assert web_scraper.parse_executor() is pool
+        assert pool.submit(len, "still open").result() == 10
+    finally:
+        pool.shutdown()
+
+def test_parse_workers_bounds_pages_parsed_at_once(monkeypatch):
+    active, peak = [0], [0]
+    lock = threading.Lock()
+    parse_html = web_scraper.parse_html
+
+    def tracked(html, parser):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+        return parse_html(html, parser)
+
+    monkeypatch.setattr(web_scraper, 'parse_html', tracked)
+    urls = [f"https://example.com/{i}" for i in range(6)]
+
+    async def run():
+        with ThreadPoolExecutor(4) as executor:
+            return [item async for item in web_scraper.stream_urls(
+                urls, 4, executor=executor, fetcher=FailingFetcher(set()), parse_workers=1)]
+
+    assert len(asyncio.run(run())) == 6
+    assert peak[0] == 1
+
+def crawl_pages(base_url, fetcher, max_concurrent=2):
+    async def run():
+        with ThreadPoolExecutor(2) as executor:
+            return [page async for page, _ in web_scraper.crawl(
+                base_url, max_depth=1, max_concurrent=max_concurrent, fetcher=fetcher, executor=executor)]
+    return asyncio.run(asyncio.wait_for(run(), timeout=10))
+
+def test_crawl_records_pages_whose_fetch_raises():
+    links = [f"/{i}" for i in range(4)]
+    fetcher = FailingFetcher({"https://example.com/1", "https://example.com/3"}, links)
+    pages = {page.path: page for page in crawl_pages("https://example.com/", fetcher)}
+    assert set(pages) == {"/", "/0", "/1", "/2", "/3"}
+    assert pages["/0"].ok and not pages["/1"].ok and not pages["/3"].ok
+
+def test_crawl_survives_every_fetch_failing():
+    fetcher = FailingFetcher({"https://example.com/"})
+    pages = crawl_pages("https://example.com/", fetcher, max_concurrent=1)
+    assert [(page.url, page.ok) for page in pages] == [("https://example.com/", False)]
+
+def run_cli(monkeypatch, *argv):
+    """Run web_scraper's main() on ``argv`` and return the PageFetcher keyword arguments."""
+    created = {}
+
+    class RecordingFetcher(FailingFetcher):
+        def __init__(self, *args, cache=None, limiter=None, **kwargs):
+            super().__init__(set())
+            created.update(cache=cache, limiter=limiter)
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc_info):
+            pass
+
+        def summary(self):
+            return ""
+
+    monkeypatch.setattr(web_scraper, 'PageFetcher', RecordingFetcher)
+    monkeypatch.setattr(web_scraper, 'parse_executor', lambda: ThreadPoolExecutor(1))
+    monkeypatch.setattr(sys, 'argv', ['web_scraper.py', *argv])
+    web_scraper.main()
+    return created
+
+def test_cli_uses_no_page_cache_or_shared_limiter_by_default(monkeypatch, tmp_path):
+    monkeypatch.setattr(web_scraper, 'default_limiter', lambda: pytest.fail("limiter used"))
+    assert run_cli(monkeypatch, "https://example.com/") == {'cache': None, 'limiter': None}
+
+def test_cli_cache_and_rate_limit_are_opt_in(monkeypatch, tmp_path):
+    limiter = object()
+    monkeypatch.setattr(web_scraper, 'default_limiter', lambda: limiter)
+    created = run_cli(monkeypatch, "https://example.com/", "--cache", "--rate-limit",
+                      "--cache-path", str(tmp_path / 'pages.sqlite'))
+    assert isinstance(created['cache'], web_scraper.PageCache)
+    assert created['limiter'] is limiter
+
+def test_extract_etree_matches_legacy_walk():
+    from parse_benchmark import check_conformance
+    assert check_conformance(100) == 0
+
+SHOP_PAGE = ('<html><head><title>Shop</title><style>p{}</style></head><body>'
+             '<h1>Shoes &amp; socks</h1><p>New <a href="/sale">sale items</a> today</p>'
+             '<ul><li>Boots</li><li>Sandals</li></ul><script>var a = 1</script></body></html>')
+
+def require_parser(parser):
+    if parser in ('lxml', 'selectolax'):
+        pytest.importorskip(parser)
+
+@pytest.mark.parametrize("parser", list(web_scraper.PARSERS))
+def test_backends_extract_the_same_fixture_page(parser):
+    require_parser(parser)
+    assert web_scraper.parse_html(SHOP_PAGE, parser).splitlines() == [
+        "  Shoes & socks", "  New", "    [sale items](/sale)", "    today", "    Boots", "    Sandals"]
+
+@pytest.mark.parametrize("parser", [name for name in web_scraper.PARSERS if name != 'html5lib'])
+def test_backends_agree_with_html5lib(parser):
+    require_parser(parser)
+    from parse_benchmark import check_parser_conformance
+    assert check_parser_conformance([parser], 100) == 0
+
+def test_stream_parser_output_does_not_depend_on_chunk_boundaries():
+    expected = web_scraper.parse_html(SHOP_PAGE, 'stream')
+    for size in (1, 7, 64):
+        chunks = [SHOP_PAGE[i:i + size] for i in range(0, len(SHOP_PAGE), size)]
+        assert web_scraper.parse_html_stream(chunks) == expected
+
+def test_extract_etree_handles_pages_deeper_than_recursion_limit():
+    from parse_benchmark import _deep_page
+    lines = web_scraper.parse_html(_deep_page(3000)).splitlines()
+    assert len(lines) == 3001
+    assert lines[0].strip() == "Level 0"
+    assert lines[-1].strip() == "Bottom"
+
+def test_noise_lines_are_dropped_whatever_their_case():
+    html = ('<html><body><p>Keep me</p><p>VAR x = 1</p><p>see app.JS</p>'
+            '<a href="/main.js">Bundle</a><a href="#top">Top</a></body></html>')
+    for parser in ('html5lib', 'stream'):
+        assert web_scraper.parse_html(html, parser).split() == ["Keep", "me"]
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+
+import argparse
+import hashlib
+import json
+import shutil
+import sys
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+DEFAULT_BASELINE_DIR = Path('visual_baselines')
+TILE_SIZE = 256
+DEFAULT_THRESHOLD = 16         # Per-channel difference (0-255) below which pixels count as equal
+DEFAULT_MAX_DIFF_RATIO = 0.001  # Fraction of changed pixels a page may have and still pass
+HASH_SIZE = 8                  # dHash is HASH_SIZE * HASH_SIZE bits
+# Pages whose dHash is further than this from the baseline are likely to fail, so
+# without a diff image their tiles are diffed in order and stop once they do
+DEFAULT_MAX_HASH_DISTANCE = 10
+
+class Mask(NamedTuple):
+    """Rectangle ignored when comparing, e.g. a clock or a rotating banner."""
+    x: int
+    y: int
+    width: int
+    height: int
+
+@dataclass
+class BaselineEntry:
+    """What the baseline store knows about one approved screenshot."""
+    file: str
+    digest: str                  # SHA-256 of the PNG file
+    dhash: str                   # Perceptual difference hash, hex
+    width: int
+    height: int
+    tile_size: int
+    tile_digests: List[str]      # Pixel digest per tile, row-major
+    approved_at: str
+    masks: List[Mask] = field(default_factory=list)
+
+@dataclass
+class DiffResult:
+    """Outcome of comparing one screenshot with its baseline."""
+    name: str
+    status: str                  # 'identical', 'pass', 'fail', 'resized' or 'new'
+    hash_distance: Optional[int] = None
+    changed_pixels: int = 0      # At least this many when a far page stopped diffing at 'fail'
+    diff_ratio: float = 0.0
+    tiles_compared: int = 0      # Tiles whose pixels differed and were diffed
+    tiles_total: int = 0
+    diff_image: Optional[str] = None
+    elapsed: float = 0.0
+
+def file_digest(path: Path) -> str:
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+def load_pixels(path: Path) -> np.ndarray:
+    """Decode a screenshot to an RGB uint8 array of shape (height, width, 3)."""
+    with Image.open(path) as image:
+        return np.asarray(image.convert('RGB'))
+
+def dhash(pixels: np.ndarray, size: int = HASH_SIZE) -> str:
+    """
+    Perceptual difference hash: whether each cell of a (size+1) x size grayscale
+    thumbnail is brighter than its right neighbour. Near-identical renders hash
+    to nearby values.
+    """
+    thumbnail = Image.fromarray(pixels).convert('L').resize((size + 1, size), Image.BILINEAR)
+    cells = np.asarray(thumbnail, dtype=np.int16)
+    bits = (cells[:, 1:] > cells[:, :-1]).flatten()
+    return f"{int(''.join('1' if b else '0' for b in bits), 2):0{size * size // 4}x}"
+
+def hash_distance(a: str, b: str) -> int:
+    """Number of differing bits between two hex hashes."""
+    return bin(int(a, 16) ^ int(b, 16)).count('1')
+
+def tiles(height: int, width: int, tile_size: int) -> List[Tuple[slice, slice]]:
+    """Row-major (rows, columns) slices covering an image."""
+    return [(slice(y, min(y + tile_size, height)), slice(x, min(x + tile_size, width)))
+            for y in range(0, height, tile_size) for x in range(0, width, tile_size)]
+
+def tile_digests(pixels: np.ndarray, tile_size: int = TILE_SIZE) -> List[str]:
+    return [hashlib.blake2b(np.ascontiguousarray(pixels[rows, cols]).tobytes(), digest_size=16).hexdigest()
+            for rows, cols in tiles(pixels.shape[0], pixels.shape[1], tile_size)]
+
+def mask_array(height: int, width: int, masks: List[Mask]) -> Optional[np.ndarray]:
+    """Boolean array that is True where pixels are ignored, or None without masks."""
+    if not masks:
+        return None
+    ignored = np.zeros((height, width), dtype=bool)
+    for m in masks:
+        ignored[max(0, m.y):max(0, m.y + m.height), max(0, m.x):max(0, m.x + m.width)] = True
+    return ignored
+
+def diff_tile(baseline: np.ndarray, current: np.ndarray, ignored: Optional[np.ndarray],
+              threshold: int) -> np.ndarray:
+    """Boolean array of the pixels of a tile differing by more than ``threshold`` in any channel."""
+    delta = np.abs(baseline.astype(np.int16) - current.astype(np.int16)).max(axis=2)
+    changed = delta > threshold
+    if ignored is not None:
+        changed &= ~ignored
+    return changed
+
+def render_diff(baseline: np.ndarray, changed: np.ndarray, path: Path) -> None:
+    """Write the baseline faded to grey with changed pixels in red."""
+    gray = baseline.mean(axis=2, keepdims=True).astype(np.uint8) // 3 + 170
+    image = np.repeat(gray, 3, axis=2)
+    image[changed] = (255, 0, 0)
+    Image.fromarray(image).save(path, optimize=False, compress_level=1)
+
+class BaselineStore:
+    """
+    Approved screenshots plus an ``index.json`` of their hashes.
+
+    The index lets a comparison skip decoding the baseline when the new
+    screenshot is byte-identical or perceptually far from it, and skip every
+    tile whose pixels hash the same as in the baseline.
+    """
+
+    def __init__(self, path: Path = DEFAULT_BASELINE_DIR, tile_size: int = TILE_SIZE):
+        self.path = Path(path)
+        self.tile_size = tile_size
+        self.index_path = self.path / 'index.json'
+        self.entries: Dict[str, BaselineEntry] = {}
+        if self.index_path.exists():
+            for name, entry in json.loads(self.index_path.read_text()).items():
+                entry['masks'] = [Mask(*m) for m in entry.get('masks', [])]
+                self.entries[name] = BaselineEntry(**entry)
+
+    def save(self) -> None:
+        self.path.mkdir(parents=True, exist_ok=True)
+        data = {name: asdict(entry) for name, entry in sorted(self.entries.items())}
+        self.index_path.write_text(json.dumps(data, indent=2) + '\n')
+
+    def approve(self, name: str, screenshot: Path, masks: Optional[List[Mask]] = None) -> BaselineEntry:
+        """Make ``screenshot`` the baseline for ``name``, keeping its masks unless new ones are given."""
+        self.path.mkdir(parents=True, exist_ok=True)
+        pixels = load_pixels(screenshot)
+        file = f"{name}.png"
+        target = self.path / file
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(screenshot, target)
+        previous = self.entries.get(name)
+        if masks is None:
+            masks = previous.masks if previous else []
+        entry = BaselineEntry(file, file_digest(target), dhash(pixels), pixels.shape[1], pixels.shape[0],
+                              self.tile_size, tile_digests(pixels, self.tile_size),
+                              time.strftime('%Y-%m-%dT%H:%M:%S'), list(masks))
+        self.entries[name] = entry
+        return entry
+
+    def compare(self, name: str, screenshot: Path, diff_dir: Optional[Path] = None,
+                threshold: int = DEFAULT_THRESHOLD, max_diff_ratio: float = DEFAULT_MAX_DIFF_RATIO,
+                extra_masks: Optional[List[Mask]] = None, executor: Optional[Executor] = None,
+                max_hash_distance: Optional[int] = DEFAULT_MAX_HASH_DISTANCE) -> DiffResult:
+        """
+        Compare ``screenshot`` with the baseline for ``name``.
+
+        Args:
+            name (str): Baseline name
+            screenshot (Path): New screenshot (PNG)
+            diff_dir (Path, optional): Where to write ``<name>.diff.png`` for changed pages
+            threshold (int): Per-channel difference tolerated per pixel
+            max_diff_ratio (float): Fraction of changed pixels that still passes
+            extra_masks (List[Mask], optional): Regions ignored on top of the stored masks
+            executor (Executor, optional): Runs tile comparisons in parallel
+            max_hash_distance (int, optional): Pages this perceptually far
+                from the baseline are diffed tile by tile, stopping as soon as
+                enough pixels changed to fail, when no diff image is wanted;
+                None diffs every changed tile. The verdict is the same either way.
+
+        Returns:
+            DiffResult: Status and scores
+        """
+        start = time.perf_counter()
+        entry = self.entries.get(name)
+        if entry is None:
+            return DiffResult(name, 'new', elapsed=time.perf_counter() - start)
+        if file_digest(screenshot) == entry.digest:
+            n_tiles = len(entry.tile_digests)
+            return DiffResult(name, 'identical', 0, tiles_total=n_tiles, elapsed=time.perf_counter() - start)
+
+        current = load_pixels(screenshot)
+        distance = hash_distance(dhash(current), entry.dhash)
+        height, width = current.shape[:2]
+        if (width, height) != (entry.width, entry.height):
+            # Content moved or grew; compare the overlapping area so the diff
+            # image still shows where, but never pass
+            baseline = load_pixels(self.path / entry.file)
+            height, width = min(height, entry.height), min(width, entry.width)
+            current, baseline = current[:height, :width], baseline[:height, :width]
+            regions = tiles(height, width, entry.tile_size)
+            todo = list(range(len(regions)))
+        else:
+            regions = tiles(height, width, entry.tile_size)
+            digests = tile_digests(current, entry.tile_size)
+            todo = [i for i, digest in enumerate(digests) if digest != entry.tile_digests[i]]
+            if not todo:
+                return DiffResult(name, 'identical', distance, tiles_total=len(regions),
+                                  elapsed=time.perf_counter() - start)
+            baseline = load_pixels(self.path / entry.file)
+
+        ignored = mask_array(height, width, entry.masks + list(extra_masks or []))
+
+        def compare_tile(i):
+            rows, cols = regions[i]
+            return i, diff_tile(baseline[rows, cols], current[rows, cols],
+                                None if ignored is None else ignored[rows, cols], threshold)
+
+        # A low-contrast change can move the hash far while every pixel stays
+        # within threshold, so a far hash only changes how tiles are diffed
+        early_fail = (diff_dir is None and max_hash_distance is not None
+                      and distance > max_hash_distance and (width, height) == (entry.width, entry.height))
+        if executor is not None and not early_fail:
+            results = executor.map(compare_tile, todo)
+        else:
+            results = map(compare_tile, todo)
+        allowed = max_diff_ratio * height * width
+        changed = np.zeros((height, width), dtype=bool)
+        changed_pixels = compared = 0
+        for i, tile_changed in results:
+            rows, cols = regions[i]
+            changed[rows, cols] = tile_changed
+            changed_pixels += int(tile_changed.sum())
+            compared += 1
+            if early_fail and changed_pixels > allowed:
+                break
+        ratio = changed_pixels / (height * width) if height * width else 0.0
+
+        if (width, height) != (entry.width, entry.height):
+            status = 'resized'
+        elif changed_pixels == 0:
+            status = 'identical'
+        else:
+            status = 'pass' if ratio <= max_diff_ratio else 'fail'
+
+        diff_image = None
+        if diff_dir is not None and changed_pixels:
+            diff_path = Path(diff_dir) / f"{name}.diff.png"
+            diff_path.parent.mkdir(parents=True, exist_ok=True)
+            render_diff(baseline, changed, diff_path)
+            diff_image = str(diff_path)
+        return DiffResult(name, status, distance, changed_pixels, round(ratio, 6), compared, len(regions),
+                          diff_image, time.perf_counter() - start)
+
+def collect_screenshots(paths: List[Path]) -> Dict[str, Path]:
+    """Map baseline names to PNG files; directories contribute every PNG below them."""
+    found = {}
+    for path in paths:
+        if path.is_dir():
+            for png in sorted(path.rglob('*.png')):
+                if not png.name.endswith('.diff.png'):
+                    found[png.relative_to(path).with_suffix('').as_posix()] = png
+        else:
+            found[path.stem] = path
+    return found
+
+def parse_mask(value: str) -> Tuple[Optional[str], Mask]:
+    """Parse ``[NAME:]X,Y,WIDTH,HEIGHT``; without NAME the mask applies to every page."""
+    name, _, rect = value.rpartition(':')
+    try:
+        return name or None, Mask(*(int(v) for v in rect.split(',')))
+    except (TypeError, ValueError):
+        raise argparse.ArgumentTypeError(f"Expected [NAME:]X,Y,WIDTH,HEIGHT, got {value!r}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare screenshots against approved baselines')
+    parser.add_argument('screenshots', nargs='+', type=Path,
+                        help='PNG files or directories of PNGs (named by path relative to the directory)')
+    parser.add_argument('--baseline-dir', type=Path, default=DEFAULT_BASELINE_DIR,
+                        help=f'Baseline store (default: {DEFAULT_BASELINE_DIR})')
+    parser.add_argument('--approve', action='store_true',
+                        help='Store the screenshots as the new baselines instead of comparing')
+    parser.add_argument('--diff-dir', type=Path, help='Write a diff image for every changed page here')
+    parser.add_argument('--threshold', type=int, default=DEFAULT_THRESHOLD,
+                        help=f'Per-channel difference tolerated per pixel, 0-255 (default: {DEFAULT_THRESHOLD})')
+    parser.add_argument('--max-diff-ratio', type=float, default=DEFAULT_MAX_DIFF_RATIO,
+                        help=f'Fraction of changed pixels that still passes (default: {DEFAULT_MAX_DIFF_RATIO})')
+    parser.add_argument('--mask', action='append', type=parse_mask, default=[], metavar='[NAME:]X,Y,W,H',
+                        help='Ignore a region; stored with the baseline when used with --approve (repeatable)')
+    parser.add_argument('--max-hash-distance', type=int, default=DEFAULT_MAX_HASH_DISTANCE,
+                        help='Without --diff-dir, diff pages whose perceptual hash differs in more bits than '
+                             'this only until they fail; -1 diffs every changed tile '
+                             f'(default: {DEFAULT_MAX_HASH_DISTANCE})')
+    parser.add_argument('--tile-size', type=int, default=TILE_SIZE,
+                        help=f'Tile edge in pixels for new baselines (default: {TILE_SIZE})')
+    parser.add_argument('--workers', type=int, default=None, help='Threads comparing tiles (default: CPU count)')
+    parser.add_argument('--report', type=Path, help='Write the results as JSON')
+    args = parser.parse_args()
+
+    store = BaselineStore(args.baseline_dir, args.tile_size)
+    screenshots = collect_screenshots(args.screenshots)
+    if not screenshots:
+        print("ERROR: No screenshots found", file=sys.stderr)
+        sys.exit(1)
+
+    def masks_for(name):
+        return [mask for target, mask in args.mask if target in (None, name)]
+
+    if args.approve:
+        for name, path in screenshots.items():
+            store.approve(name, path, masks_for(name) if args.mask else None)
+            print(f"Approved {name}")
+        store.save()
+        return
+
+    start = time.perf_counter()
+    results = []
+    with ThreadPoolExecutor(args.workers) as executor:
+        for name, path in screenshots.items():
+            result = store.compare(name, path, args.diff_dir, args.threshold, args.max_diff_ratio,
+                                   masks_for(name), executor,
+                                   None if args.max_hash_distance < 0 else args.max_hash_distance)
+            results.append(result)
+            detail = ''
+            if result.status not in ('new', 'identical') or result.changed_pixels:
+                detail = (f" {result.diff_ratio:.4%} changed, hash distance {result.hash_distance}, "
+                          f"{result.tiles_compared}/{result.tiles_total} tiles diffed")
+            print(f"{result.status.upper():9} {name}{detail}"
+                  f"{' -> ' + result.diff_image if result.diff_image else ''}")
+
+    counts = {}
+    for result in results:
+        counts[result.status] = counts.get(result.status, 0) + 1
+    print(f"\n{len(results)} screenshots in {time.perf_counter() - start:.2f}s: "
+          + ", ".join(f"{n} {status}" for status, n in sorted(counts.items())))
+    if args.report:
+        args.report.write_text(json.dumps([asdict(r) for r in results], indent=2) + '\n')
+    if any(r.status in ('fail', 'resized', 'new') for r in results):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -4,13 +4,24 @@ import asyncio
 import argparse
 import sys
 import os
-from typing import List, Optional
+from typing import AsyncIterator, Iterable, List, Optional, Tuple
 from playwright.async_api import async_playwright
 import html5lib
-from multiprocessing import Pool
+from html.parser import HTMLParser
+from concurrent.futures import Executor, ProcessPoolExecutor
 import time
-from urllib.parse import urlparse
+from urllib.parse import parse_qsl, urlencode, urljoin, urlparse, urlsplit, urlunsplit
 import logging
+import re
+from dataclasses import asdict, dataclass
+import json
+import requests
+from pathlib import Path
+
+from page_cache import DEFAULT_CACHE_PATH, DEFAULT_MAX_BYTES, DEFAULT_TTL, PageCache, cached_get
+from rate_limiter import RateLimiter, apply_rate_limit, default_limiter, mount_rate_limiter
+from resource_blocking import PROFILES, BlockingStats, apply_profile
+from site_index import DEFAULT_INDEX_PATH, SiteIndex
 
 # Configure logging
 logging.basicConfig(
@@ -36,123 +47,979 @@ async def fetch_page(url: str, context) -> Optional[str]:
     finally:
         await page.close()
 
-def parse_html(html_content: Optional[str]) -> str:
-    """Parse HTML content and extract text with hyperlinks in markdown format."""
+XHTML_NAMESPACE = '{http://www.w3.org/1999/xhtml}'
+
+# Elements whose content is never extracted
+SKIP_TAGS = ('script', 'style')
+
+# Lines containing any of these (case-insensitive) are likely to be noise
+NOISE_PATTERNS = [
+    'var ',
+    'function()',
+    '.js',
+    '.css',
+    'google-analytics',
+    'disqus',
+    '{',
+    '}'
+]
+_NOISE_RE = re.compile('|'.join(re.escape(pattern) for pattern in NOISE_PATTERNS))
+
+class _Frame:
+    """State of an open element while extracting."""
+    __slots__ = ('tag', 'href', 'depth', 'skipped', 'has_text')
+
+    def __init__(self, tag: str, href: Optional[str], depth: int, skipped: bool):
+        self.tag = tag
+        self.href = href
+        self.depth = depth
+        self.skipped = skipped
+        self.has_text = False
+
+class MarkdownExtractor:
+    """
+    Single-pass extractor that turns parse events into text with markdown links.
+
+    Events follow document order: ``start`` when an element opens, ``text`` for
+    character data, ``end`` when it closes and ``comment`` for comments. Text right
+    after a start tag is the element's own text; text after an end tag or comment is
+    the tail of that node. Each line is indented by its element's depth and emitted
+    at most once.
+
+    Script and style elements are skipped, as are elements containing no text at
+    all; since a text-free element emits nothing of its own, the only effect of the
+    latter is that its tail is dropped, which is known as soon as it closes. This
+    keeps extraction linear in the size of the document.
+    """
+
+    def __init__(self):
+        self.lines: List[str] = []
+        self.seen_texts = set()
+        self._stack: List[_Frame] = []
+        self._buffer: List[str] = []
+        # (depth, emit) for the node whose tail the next text belongs to, or None
+        # if the next text belongs to the innermost open element
+        self._tail_of: Optional[Tuple[int, bool]] = None
+
+    def start(self, tag: str, attrs) -> None:
+        """Open an element. ``attrs`` is an iterable of (name, value) pairs."""
+        if self._buffer:
+            self._flush()
+        href = None
+        if tag == 'a':
+            for attr, value in attrs:
+                if attr.endswith('href'):
+                    href = value
+                    break
+        parent = self._stack[-1] if self._stack else None
+        skipped = tag in SKIP_TAGS or (parent is not None and parent.skipped)
+        self._stack.append(_Frame(tag, href, len(self._stack), skipped))
+        self._tail_of = None
+
+    def end(self) -> None:
+        """Close the innermost open element."""
+        if self._buffer:
+            self._flush()
+        frame = self._stack.pop()
+        if frame.has_text and self._stack:
+            self._stack[-1].has_text = True
+        self._tail_of = (frame.depth, frame.has_text and not frame.skipped)
+
+    def comment(self, data: str) -> None:
+        """Add a comment. Like the tree walk, its text is extracted as a child node."""
+        self.start('#comment', ())
+        self.text(data)
+        self.end()
+
+    def text(self, data: str) -> None:
+        """Add character data. Consecutive calls are joined into one text node."""
+        self._buffer.append(data)
+
+    def close(self) -> str:
+        """Finish extraction and return the extracted text."""
+        if self._buffer:
+            self._flush()
+        return '\n'.join(self.lines)
+
+    def _flush(self) -> None:
+        text = ''.join(self._buffer).strip()
+        self._buffer.clear()
+        if not text:
+            return
+        if self._stack:
+            self._stack[-1].has_text = True
+
+        if self._tail_of is not None:
+            depth, emit = self._tail_of
+            if emit:
+                self._emit(depth, text, text)
+            return
+
+        if not self._stack:
+            return
+        frame = self._stack[-1]
+        if frame.skipped:
+            return
+        if frame.tag == 'a':
+            href = frame.href
+            if href and not href.startswith(('#', 'javascript:')):
+                self._emit(frame.depth, text, f"[{text}]({href})")
+        else:
+            self._emit(frame.depth, text, text)
+
+    def _emit(self, depth: int, text: str, line: str) -> None:
+        if text in self.seen_texts:
+            return
+        self.seen_texts.add(text)
+        # Indentation cannot be part of a noise pattern, so only the content is scanned
+        if not _NOISE_RE.search(line.lower()):
+            self.lines.append("  " * depth + line)
+
+# Marks the point in the walk stack where the element below it closes
+_END = object()
+
+# Tag names as html5lib (namespaced) and lxml (plain) spell them
+_SKIP_TAG_NAMES = frozenset(SKIP_TAGS) | {XHTML_NAMESPACE + tag for tag in SKIP_TAGS}
+_ANCHOR_TAG_NAMES = frozenset(('a', XHTML_NAMESPACE + 'a'))
+
+def extract_tree(root) -> str:
+    """
+    Extract markdown text from an ElementTree-style (html5lib or lxml) subtree.
+
+    Produces the same output as feeding the tree's events to MarkdownExtractor,
+    but walks the tree directly: a tree already holds each node's text and tail
+    as one string, so there is nothing to buffer, and leaf elements are
+    finished in place instead of being pushed and popped. This keeps shallow
+    pages, where most elements are leaves, as fast as the old recursive walk.
+    """
+    lines: List[str] = []
+    seen = set()
+    has_text: List[bool] = []  # Per open element: whether its subtree has text so far
+    skipped: List[bool] = []   # Per open element: inside a script or style element
+    stack = [root]
+    pop, push, extend = stack.pop, stack.append, stack.extend
+    noise = _NOISE_RE.search
+    while stack:
+        elem = pop()
+        if elem is _END:
+            elem = pop()
+            text_below = has_text.pop()
+            skip = skipped.pop()
+            depth = len(has_text)
+            if text_below and depth:
+                has_text[-1] = True
+        else:
+            depth = len(has_text)
+            skip = skipped[-1] if depth else False
+            tag = elem.tag
+            anchor = False
+            # Comments and processing instructions (non-string tags) contribute their text like elements
+            if isinstance(tag, str):
+                skip = skip or tag in _SKIP_TAG_NAMES
+                anchor = tag in _ANCHOR_TAG_NAMES
+
+            text_below = False
+            text = elem.text
+            if text:
+                text = text.strip()
+                if text:
+                    text_below = True
+                    if not skip and text not in seen:
+                        line = None
+                        if anchor:
+                            for attr, value in elem.items():
+                                if attr.endswith('href'):
+                                    if value and not value.startswith(('#', 'javascript:')):
+                                        line = f"[{text}]({value})"
+                                    break
+                        else:
+                            line = text
+                        if line is not None:
+                            seen.add(text)
+                            if not noise(line.lower()):
+                                lines.append("  " * depth + line)
+
+            if len(elem):
+                has_text.append(text_below)
+                skipped.append(skip)
+                push(elem)
+                push(_END)
+                extend(reversed(elem))
+                continue
+            if text_below and depth:
+                has_text[-1] = True
+
+        # A node's tail is dropped if its subtree has no text at all
+        tail = elem.tail
+        if tail:
+            tail = tail.strip()
+            if tail:
+                if depth:
+                    has_text[-1] = True
+                if text_below and not skip and tail not in seen:
+                    seen.add(tail)
+                    if not noise(tail.lower()):
+                        lines.append("  " * depth + tail)
+    return '\n'.join(lines)
+
+def extract_etree(document) -> str:
+    """Extract markdown text from a parsed html5lib (ElementTree) document."""
+    # Start processing from the body tag, falling back to the entire document
+    body = document.find(f'.//{XHTML_NAMESPACE}body')
+    return extract_tree(body if body is not None else document)
+
+# libxml2 stops building the tree below this nesting depth, even with huge_tree
+LXML_MAX_DEPTH = 2048
+
+def _extract_lxml(html_content: str) -> str:
+    from lxml import html as lxml_html
+
+    # huge_tree lifts libxml2's nesting limit, which otherwise truncates deep pages
+    document = lxml_html.document_fromstring(html_content, parser=lxml_html.HTMLParser(huge_tree=True))
+    body = document.find('body')
+    return extract_tree(body if body is not None else document)
+
+def _extract_selectolax(html_content: str) -> str:
+    from selectolax.lexbor import LexborHTMLParser
+
+    tree = LexborHTMLParser(html_content)
+    root = tree.body if tree.body is not None else tree.root
+    extractor = MarkdownExtractor()
+    if root is not None:
+        walk_lexbor(root, extractor)
+    return extractor.close()
+
+def walk_lexbor(root, handler: MarkdownExtractor) -> None:
+    """Feed a selectolax (lexbor) subtree to ``handler`` by following node links."""
+    handler.start(root.tag, root.attributes.items())
+    node = root.child
+    depth = 0  # Levels below root
+    while node is not None:
+        tag = node.tag
+        if tag == '-text':
+            handler.text(node.text_content or '')
+        elif tag == '-comment':
+            handler.comment(node.comment_content or '')
+        elif not tag.startswith('-'):
+            handler.start(tag, node.attributes.items())
+            if node.child is not None:
+                node = node.child
+                depth += 1
+                continue
+            handler.end()
+        while node.next is None and depth > 0:
+            node = node.parent
+            depth -= 1
+            handler.end()
+        node = node.next
+    handler.end()
+
+# Elements that never have content or an end tag
+VOID_TAGS = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link',
+    'meta', 'param', 'source', 'track', 'wbr'
+}
+
+# Elements that only appear before <body>; anything else opens the body implicitly
+HEAD_TAGS = {
+    'html', 'head', 'title', 'base', 'link', 'meta', 'style', 'script',
+    'noscript', 'template'
+}
+
+# Open elements implicitly closed when the given element starts
+IMPLIED_END_TAGS = {
+    'li': {'li'},
+    'dt': {'dt', 'dd'},
+    'dd': {'dt', 'dd'},
+    'tr': {'tr', 'td', 'th'},
+    'td': {'td', 'th'},
+    'th': {'td', 'th'},
+    'option': {'option'},
+}
+
+class StreamingHTMLParser(HTMLParser):
+    """
+    Tokenizer that feeds ``MarkdownExtractor`` directly without building a tree.
+
+    Memory is bounded by the nesting depth and the extracted output rather than
+    the size of the page. Only the tree-construction rules that matter for text
+    extraction are applied (void elements, a few implied end tags, mismatched end
+    tags, an implicit <body>), so indentation may differ from html5lib on
+    malformed markup while the extracted text and links stay the same.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.extractor = MarkdownExtractor()
+        self._open: List[str] = []
+        self._in_body = False
+        # Open head elements (title, script, ...) seen before <body>
+        self._head_open: List[str] = []
+
+    def _ensure_body(self) -> None:
+        if not self._in_body:
+            self._in_body = True
+            self._open.append('body')
+            self.extractor.start('body', ())
+
+    def _close_to(self, index: int) -> None:
+        while len(self._open) > index:
+            self._open.pop()
+            self.extractor.end()
+
+    def handle_starttag(self, tag, attrs):
+        if not self._in_body:
+            if tag == 'body':
+                self._in_body = True
+                self._open.append('body')
+                self.extractor.start('body', attrs)
+                return
+            if tag in HEAD_TAGS:
+                if tag not in VOID_TAGS and tag not in ('html', 'head'):
+                    self._head_open.append(tag)
+                return
+            self._ensure_body()
+        elif tag in ('html', 'body'):
+            return
+
+        implied = IMPLIED_END_TAGS.get(tag)
+        if implied and self._open and self._open[-1] in implied:
+            self._close_to(len(self._open) - 1)
+        self.extractor.start(tag, attrs)
+        if tag in VOID_TAGS:
+            self.extractor.end()
+        else:
+            self._open.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS and self._open and self._open[-1] == tag:
+            self._close_to(len(self._open) - 1)
+
+    def handle_endtag(self, tag):
+        if not self._in_body:
+            if tag in self._head_open:
+                del self._head_open[self._head_open.index(tag):]
+            return
+        if tag in ('html', 'body') or tag in VOID_TAGS:
+            return
+        for index in range(len(self._open) - 1, 0, -1):
+            if self._open[index] == tag:
+                self._close_to(index)
+                return
+
+    def handle_data(self, data):
+        if not self._in_body:
+            if self._head_open or not data.strip():
+                return
+            self._ensure_body()
+        self.extractor.text(data)
+
+    def handle_comment(self, data):
+        if self._in_body:
+            self.extractor.comment(data)
+
+    def finish(self) -> str:
+        """Flush pending input, close open elements and return the extracted text."""
+        self.close()
+        self._close_to(0)
+        return self.extractor.close()
+
+def parse_html_stream(chunks: Iterable[str]) -> str:
+    """
+    Extract text with markdown links from HTML arriving in chunks.
+
+    Args:
+        chunks (Iterable[str]): Pieces of an HTML document, e.g. a file opened in text mode
+
+    Returns:
+        str: Extracted text, one line per text node
+    """
+    parser = StreamingHTMLParser()
+    for chunk in chunks:
+        parser.feed(chunk)
+    return parser.finish()
+
+def _extract_stream(html_content: str, chunk_size: int = 64 * 1024) -> str:
+    return parse_html_stream(html_content[i:i + chunk_size]
+                             for i in range(0, len(html_content), chunk_size))
+
+# Available HTML parser backends. All of them produce the same text and links.
+PARSERS = {
+    'html5lib': lambda html_content: extract_etree(html5lib.parse(html_content)),
+    'lxml': _extract_lxml,
+    'selectolax': _extract_selectolax,
+    'stream': _extract_stream,
+}
+
+def parse_html(html_content: Optional[str], parser: str = 'html5lib') -> str:
+    """
+    Parse HTML content and extract text with hyperlinks in markdown format.
+
+    Args:
+        html_content (str, optional): HTML to parse
+        parser (str): Backend to use, one of PARSERS. 'lxml' and 'selectolax'
+            require those packages, and 'lxml' drops content nested deeper than
+            LXML_MAX_DEPTH; 'stream' tokenizes without building a tree.
+    """
+    if parser not in PARSERS:
+        raise ValueError(f"Unsupported parser: {parser}")
     if not html_content:
         return ""
     
     try:
-        document = html5lib.parse(html_content)
-        result = []
-        seen_texts = set()  # To avoid duplicates
-        
-        def should_skip_element(elem) -> bool:
-            """Check if the element should be skipped."""
-            # Skip script and style tags
-            if elem.tag in ['{http://www.w3.org/1999/xhtml}script', 
-                          '{http://www.w3.org/1999/xhtml}style']:
-                return True
-            # Skip empty elements or elements with only whitespace
-            if not any(text.strip() for text in elem.itertext()):
-                return True
-            return False
-        
-        def process_element(elem, depth=0):
-            """Process an element and its children recursively."""
-            if should_skip_element(elem):
-                return
-            
-            # Handle text content
-            if hasattr(elem, 'text') and elem.text:
-                text = elem.text.strip()
-                if text and text not in seen_texts:
-                    # Check if this is an anchor tag
-                    if elem.tag == '{http://www.w3.org/1999/xhtml}a':
-                        href = None
-                        for attr, value in elem.items():
-                            if attr.endswith('href'):
-                                href = value
-                                break
-                        if href and not href.startswith(('#', 'javascript:')):
-                            # Format as markdown link
-                            link_text = f"[{text}]({href})"
-                            result.append("  " * depth + link_text)
-                            seen_texts.add(text)
-                    else:
-                        result.append("  " * depth + text)
-                        seen_texts.add(text)
-            
-            # Process children
-            for child in elem:
-                process_element(child, depth + 1)
-            
-            # Handle tail text
-            if hasattr(elem, 'tail') and elem.tail:
-                tail = elem.tail.strip()
-                if tail and tail not in seen_texts:
-                    result.append("  " * depth + tail)
-                    seen_texts.add(tail)
-        
-        # Start processing from the body tag
-        body = document.find('.//{http://www.w3.org/1999/xhtml}body')
-        if body is not None:
-            process_element(body)
-        else:
-            # Fallback to processing the entire document
-            process_element(document)
-        
-        # Filter out common unwanted patterns
-        filtered_result = []
-        for line in result:
-            # Skip lines that are likely to be noise
-            if any(pattern in line.lower() for pattern in [
-                'var ', 
-                'function()', 
-                '.js',
-                '.css',
-                'google-analytics',
-                'disqus',
-                '{',
-                '}'
-            ]):
-                continue
-            filtered_result.append(line)
-        
-        return '\n'.join(filtered_result)
+        return PARSERS[parser](html_content)
+    except ImportError as e:
+        raise ValueError(f"Parser '{parser}' is not available: {e}") from e
     except Exception as e:
         logger.error(f"Error parsing HTML: {str(e)}")
         return ""
 
-async def process_urls(urls: List[str], max_concurrent: int = 5) -> List[str]:
-    """Process multiple URLs concurrently."""
-    async with async_playwright() as p:
-        browser = await p.chromium.launch()
+FETCH_MODES = ('auto', 'http', 'browser')
+
+# Signs that a server response is only a shell that JavaScript fills in
+DEFAULT_JS_MARKERS = [
+    r'BAILOUT_TO_CLIENT_SIDE_RENDERING',
+    r'<div id="(?:__next|root|app)"[^>]*>\s*</div>',
+    r'<noscript>[^<]*(?:enable|requires?) javascript',
+]
+
+HTTP_HEADERS = {
+    'User-Agent': ('Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 '
+                   '(KHTML, like Gecko) Chrome/120.0 Safari/537.36'),
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+}
+
+def needs_js_rendering(html: Optional[str], min_text_chars: int = 200,
+                       markers: Optional[List[str]] = None) -> Optional[str]:
+    """
+    Decide whether a plain HTTP response must be rendered in a browser.
+
+    Args:
+        html (str, optional): Response body
+        min_text_chars (int): Minimum amount of extracted text (excluding
+            whitespace) for a page to count as server-rendered
+        markers (List[str], optional): Regexes that mark a client-rendered shell.
+            Defaults to DEFAULT_JS_MARKERS.
+
+    Returns:
+        Optional[str]: Why the page needs a browser, or None if the response can be used as is
+    """
+    if not html or not html.strip():
+        return "empty body"
+    for pattern in markers if markers is not None else DEFAULT_JS_MARKERS:
+        if re.search(pattern, html, re.IGNORECASE):
+            return f"matched {pattern!r}"
+    text_chars = sum(not c.isspace() for c in parse_html(html, 'stream'))
+    if text_chars < min_text_chars:
+        return f"only {text_chars} characters of text"
+    return None
+
+@dataclass
+class FetchRecord:
+    """How a single URL was fetched."""
+    url: str
+    method: str  # 'http', 'browser' or 'http+browser' when escalated
+    http_time: float = 0.0
+    browser_time: float = 0.0
+    reason: str = ''  # Why the HTTP response was not used as is
+    cache: str = ''  # 'cache' or 'revalidated' when served from the page cache
+    ok: bool = True
+
+    @property
+    def total_time(self) -> float:
+        return self.http_time + self.browser_time
+
+class PageFetcher:
+    """
+    Fetch pages over a pooled HTTP session, escalating to Chromium only when needed.
+
+    In 'auto' mode every URL is first requested over HTTP. The response is used
+    as is unless the request fails, returns an error status or looks like a
+    client-rendered shell (see needs_js_rendering), in which case the page is
+    loaded in the browser. The browser is launched on first use only and its
+    contexts are reused across pages. 'http' and 'browser' force one path.
+
+    With a PageCache, fresh pages are served from disk, stale HTTP responses
+    are revalidated with conditional requests and browser-rendered pages are
+    cached separately by TTL.
+
+    Browser contexts get the ``block_profile`` request-interception profile
+    (see resource_blocking.PROFILES); 'text-only' skips images, media, fonts,
+    stylesheets, analytics and third-party requests other than scripts from
+    well-known CDNs. Pages whose text comes from other third-party scripts need
+    'no-media'. Counts of avoided requests are kept in ``blocking``.
+
+    With a RateLimiter, HTTP requests and every browser request are paced per
+    host and back off when the server struggles.
+
+    Every fetch is recorded in ``records``; use as an async context manager or
+    call ``close()`` when done.
+    """
+
+    def __init__(self, mode: str = 'auto', max_concurrent: int = 5,
+                 min_text_chars: int = 200, js_markers: Optional[List[str]] = None,
+                 timeout: float = 30.0, cache: Optional[PageCache] = None,
+                 block_profile: str = 'text-only', limiter: Optional[RateLimiter] = None):
+        if mode not in FETCH_MODES:
+            raise ValueError(f"Unsupported fetch mode: {mode}")
+        if block_profile not in PROFILES:
+            raise ValueError(f"Unsupported blocking profile: {block_profile}")
+        self.mode = mode
+        self.max_concurrent = max(1, max_concurrent)
+        self.min_text_chars = min_text_chars
+        self.js_markers = js_markers
+        self.timeout = timeout
+        self.cache = cache
+        self.block_profile = block_profile
+        self.blocking = BlockingStats()
+        self.limiter = limiter
+        self.records: List[FetchRecord] = []
+
+        self._session = requests.Session()
+        self._session.headers.update(HTTP_HEADERS)
+        if limiter is not None:
+            mount_rate_limiter(self._session, limiter, self.max_concurrent)
+        else:
+            adapter = requests.adapters.HTTPAdapter(pool_connections=self.max_concurrent,
+                                                    pool_maxsize=self.max_concurrent)
+            self._session.mount('http://', adapter)
+            self._session.mount('https://', adapter)
+
+        self._playwright = None
+        self._browser = None
+        self._browser_lock = asyncio.Lock()
+        self._contexts: asyncio.Queue = asyncio.Queue()
+        self._all_contexts = []
+
+    async def __aenter__(self) -> 'PageFetcher':
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def fetch(self, url: str) -> Optional[str]:
+        """Fetch a page, returning its HTML or None on failure."""
+        html, _ = await self.fetch_with_record(url)
+        return html
+
+    async def fetch_with_record(self, url: str) -> Tuple[Optional[str], FetchRecord]:
+        """Fetch a page, returning its HTML (None on failure) and how it was fetched."""
+        record = FetchRecord(url, self.mode)
+        html = None
+
+        if self.cache is not None and self.mode != 'http':
+            entry = await asyncio.to_thread(self.cache.lookup, url, True)
+            if entry is not None and entry.fresh:
+                self.cache.stats.hits += 1
+                self.cache.stats.bytes_saved += len(entry.body.encode('utf-8'))
+                record.method = record.cache = 'cache'
+                self.records.append(record)
+                logger.info(f"Fetched {url} from the cache (rendered)")
+                return entry.body, record
+            if self.mode == 'browser':
+                self.cache.stats.misses += 1
+
+        if self.mode != 'browser':
+            start = time.perf_counter()
+            html, reason, record.cache = await asyncio.to_thread(self._fetch_http, url)
+            record.http_time = time.perf_counter() - start
+            record.method = 'http'
+            if reason:
+                record.reason = reason
+                if self.mode == 'auto':
+                    logger.debug(f"Escalating {url} to the browser: {reason}")
+                    html = None
+
+        if self.mode == 'browser' or (self.mode == 'auto' and html is None):
+            start = time.perf_counter()
+            try:
+                html = await self._fetch_browser(url)
+            except Exception as e:
+                logger.error(f"Error fetching {url} in the browser: {str(e)}")
+                html = None
+            record.browser_time = time.perf_counter() - start
+            record.method = 'browser' if self.mode == 'browser' else 'http+browser'
+            if html is not None and self.cache is not None:
+                await asyncio.to_thread(self.cache.store, url, html, rendered=True)
+
+        record.ok = html is not None
+        self.records.append(record)
+        detail = f" ({record.reason})" if record.reason else ""
+        source = f", {record.cache}" if record.cache else ""
+        logger.info(f"Fetched {url} via {record.method}{source} in {record.total_time:.2f}s{detail}")
+        return html, record
+
+    def _fetch_http(self, url: str) -> Tuple[Optional[str], Optional[str], str]:
+        """
+        Blocking HTTP GET through the cache.
+
+        Returns (html, reason the response needs a browser, cache source).
+        """
+        try:
+            response = cached_get(self._session, url, self.cache, timeout=self.timeout)
+        except requests.RequestException as e:
+            return None, f"request failed: {e}", ''
+        source = '' if response.source == 'network' else response.source
+        if response.status_code in (404, 410):
+            # A browser would get the same missing page
+            return response.text, None, source
+        if response.status_code >= 400:
+            return response.text, f"HTTP {response.status_code}", source
+        if 'html' not in (response.content_type or 'text/html'):
+            return response.text, None, source
+        return (response.text, needs_js_rendering(response.text, self.min_text_chars, self.js_markers),
+                source)
+
+    async def _fetch_browser(self, url: str) -> Optional[str]:
+        context = await self._acquire_context()
         try:
-            # Create browser contexts
-            n_contexts = min(len(urls), max_concurrent)
-            contexts = [await browser.new_context() for _ in range(n_contexts)]
-            
-            # Create tasks for each URL
-            tasks = []
-            for i, url in enumerate(urls):
-                context = contexts[i % len(contexts)]
-                task = fetch_page(url, context)
-                tasks.append(task)
-            
-            # Gather results
-            html_contents = await asyncio.gather(*tasks)
-            
-            # Parse HTML contents in parallel
-            with Pool() as pool:
-                results = pool.map(parse_html, html_contents)
-                
-            return results
-            
+            return await fetch_page(url, context)
         finally:
-            # Cleanup
-            for context in contexts:
-                await context.close()
-            await browser.close()
+            self._contexts.put_nowait(context)
+
+    async def _acquire_context(self):
+        async with self._browser_lock:
+            if self._browser is None:
+                self._playwright = await async_playwright().start()
+                self._browser = await self._playwright.chromium.launch()
+            if self._contexts.empty() and len(self._all_contexts) < self.max_concurrent:
+                context = await self._browser.new_context()
+                if self.limiter is not None:
+                    # Registered first so blocked requests never take a token
+                    await apply_rate_limit(context, self.limiter)
+                await apply_profile(context, self.block_profile, self.blocking)
+                self._all_contexts.append(context)
+                return context
+        return await self._contexts.get()
+
+    async def close(self) -> None:
+        """Close browser contexts, the browser and the HTTP session."""
+        for context in self._all_contexts:
+            await context.close()
+        self._all_contexts.clear()
+        if self._browser is not None:
+            await self._browser.close()
+            await self._playwright.stop()
+            self._browser = None
+            self._playwright = None
+        self._session.close()
+
+    def summary(self) -> str:
+        """Per-URL fetch path and timings, followed by totals per path."""
+        lines = [f"{'method':<14}{'cache':<13}{'http':>8}{'browser':>9}{'total':>8}  url"]
+        for r in self.records:
+            status = "" if r.ok else "  FAILED"
+            detail = f"  ({r.reason})" if r.reason else ""
+            lines.append(f"{r.method:<14}{r.cache or '-':<13}{r.http_time:>7.2f}s{r.browser_time:>8.2f}s"
+                         f"{r.total_time:>7.2f}s  {r.url}{detail}{status}")
+        counts = {}
+        for r in self.records:
+            counts[r.method] = counts.get(r.method, 0) + 1
+        lines.append("Pages by path: " + ", ".join(f"{method}={n}" for method, n in sorted(counts.items())))
+        if self._all_contexts or self.blocking.allowed_requests:
+            lines.append(f"Browser requests ({self.block_profile}): {self.blocking.summary()}")
+        if self.cache is not None:
+            lines.append(self.cache.stats.summary())
+        if self.limiter is not None:
+            lines.append("Rate limits: " + self.limiter.summary().replace("\n", "; "))
+        return "\n".join(lines)
+
+# Parse tasks per pipeline, and processes in the shared parse pool
+PARSE_WORKERS = os.cpu_count() or 1
+
+_parse_executor: Optional[ProcessPoolExecutor] = None
+
+def parse_executor() -> ProcessPoolExecutor:
+    """Process pool shared by every stream_urls and crawl call not given an executor."""
+    global _parse_executor
+    if _parse_executor is None:
+        _parse_executor = ProcessPoolExecutor(PARSE_WORKERS)
+    return _parse_executor
+
+async def stream_urls(urls: List[str], max_concurrent: int = 5,
+                      queue_size: Optional[int] = None,
+                      executor: Optional[Executor] = None,
+                      parser: str = 'html5lib',
+                      fetcher: Optional[PageFetcher] = None,
+                      parse_workers: int = PARSE_WORKERS) -> AsyncIterator[Tuple[str, str]]:
+    """
+    Fetch and parse URLs as a pipeline, yielding results as each page finishes.
+
+    At most ``max_concurrent`` pages are fetched at once. Raw HTML is handed to
+    the parse stage through a bounded queue, so only ``queue_size`` pages wait in
+    memory at any time and slow consumers apply backpressure to the fetchers.
+
+    Args:
+        urls (List[str]): URLs to process
+        max_concurrent (int): Maximum number of pages fetched concurrently
+        queue_size (int, optional): Maximum number of fetched pages waiting to be
+            parsed. Defaults to twice ``max_concurrent``.
+        executor (Executor, optional): Executor used for parsing, owned by the
+            caller. Defaults to the long-lived pool of parse_executor().
+        parser (str): HTML parser backend, see PARSERS
+        fetcher (PageFetcher, optional): Fetcher to use. An 'auto' fetcher is
+            created and closed by the call if none is given; pass one to choose
+            the fetch mode or to read its records afterwards.
+        parse_workers (int): Pages parsed at once; match it to the size of
+            ``executor`` when passing one
+
+    Yields:
+        Tuple[str, str]: (url, extracted text) in completion order
+    """
+    if parser not in PARSERS:
+        raise ValueError(f"Unsupported parser: {parser}")
+    if not urls:
+        return
+
+    max_concurrent = max(1, max_concurrent)
+    queue_size = queue_size or max_concurrent * 2
+    if executor is None:
+        executor = parse_executor()
+    own_fetcher = fetcher is None
+    if own_fetcher:
+        fetcher = PageFetcher(max_concurrent=max_concurrent)
+
+    loop = asyncio.get_running_loop()
+    url_queue: asyncio.Queue = asyncio.Queue()
+    for url in urls:
+        url_queue.put_nowait(url)
+    html_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    result_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+    async def fetch_worker():
+        while True:
+            try:
+                url = url_queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                html = await fetcher.fetch(url)
+            except Exception as e:
+                # Cache or limiter errors must not stop the worker: every URL needs a result
+                logger.error(f"Error fetching {url}: {str(e)}")
+                html = None
+            await html_queue.put((url, html))
+
+    async def parse_worker():
+        while True:
+            item = await html_queue.get()
+            if item is None:
+                return
+            url, html = item
+            try:
+                text = await loop.run_in_executor(executor, parse_html, html, parser)
+            except Exception as e:
+                logger.error(f"Error parsing {url}: {str(e)}")
+                text = ""
+            await result_queue.put((url, text))
+
+    tasks = []
+    try:
+        fetchers = [asyncio.create_task(fetch_worker())
+                    for _ in range(min(len(urls), max_concurrent))]
+        parsers = [asyncio.create_task(parse_worker()) for _ in range(max(1, parse_workers))]
+        tasks = fetchers + parsers
+
+        async def close_parse_stage():
+            await asyncio.gather(*fetchers)
+            for _ in parsers:
+                await html_queue.put(None)
+
+        tasks.append(asyncio.create_task(close_parse_stage()))
+
+        for _ in range(len(urls)):
+            yield await result_queue.get()
+
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if own_fetcher:
+            await fetcher.close()
+
+async def process_urls(urls: List[str], max_concurrent: int = 5, parser: str = 'html5lib',
+                       fetch_mode: str = 'auto') -> List[str]:
+    """Process multiple URLs concurrently, returning results in input order."""
+    results = {}
+    async with PageFetcher(fetch_mode, max_concurrent) as fetcher:
+        async for url, text in stream_urls(urls, max_concurrent, parser=parser, fetcher=fetcher):
+            results[url] = text
+    return [results.get(url, "") for url in urls]
+
+# Links to these never lead to HTML pages
+NON_PAGE_EXTENSIONS = (
+    '.png', '.jpg', '.jpeg', '.gif', '.webp', '.svg', '.ico', '.pdf', '.zip',
+    '.css', '.js', '.json', '.xml', '.txt', '.mp4', '.webm', '.mp3', '.woff', '.woff2'
+)
+
+MARKDOWN_LINK_RE = re.compile(r'\[[^\]]*\]\(([^)\s]+)\)')
+
+def normalize_url(url: str, base: Optional[str] = None) -> str:
+    """
+    Normalize a URL so that equivalent links dedupe.
+
+    Resolves it against ``base``, lowercases scheme and host, drops default
+    ports, fragments and trailing slashes (except for the root path) and sorts
+    query parameters.
+    """
+    if base is not None:
+        url = urljoin(base, url)
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    port = parts.port
+    if port and not (scheme == 'http' and port == 80) and not (scheme == 'https' and port == 443):
+        host = f"{host}:{port}"
+    path = parts.path or '/'
+    if len(path) > 1:
+        path = path.rstrip('/')
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, path, query, ''))
+
+def extract_links(text: str, page_url: str, origin: str) -> List[str]:
+    """Same-origin page links found in extracted markdown text, normalized and in order."""
+    links = []
+    seen = set()
+    for href in MARKDOWN_LINK_RE.findall(text):
+        if href.startswith(('mailto:', 'tel:', 'javascript:', '#')):
+            continue
+        url = normalize_url(href, page_url)
+        parts = urlsplit(url)
+        if f"{parts.scheme}://{parts.netloc}" != origin:
+            continue
+        if parts.path.lower().endswith(NON_PAGE_EXTENSIONS):
+            continue
+        if url not in seen:
+            seen.add(url)
+            links.append(url)
+    return links
+
+@dataclass
+class RoutePage:
+    """One page of a crawl, as written to the route inventory."""
+    url: str
+    path: str
+    depth: int
+    found_on: Optional[str]
+    ok: bool
+    fetch_method: str
+    fetch_time: float
+    parse_time: float
+    text_chars: int
+    links: int
+
+async def crawl(base_url: str, max_depth: int = 2, max_pages: int = 50, max_concurrent: int = 5,
+                parser: str = 'html5lib', fetcher: Optional[PageFetcher] = None,
+                executor: Optional[Executor] = None) -> AsyncIterator[Tuple[RoutePage, str]]:
+    """
+    Crawl same-origin pages breadth-first from ``base_url``.
+
+    Links are discovered from the extracted markdown of each page, normalized
+    with normalize_url and visited once. Pages further than ``max_depth`` links
+    from the base are not fetched and at most ``max_pages`` pages are fetched
+    in total, ``max_concurrent`` at a time.
+
+    Args:
+        base_url (str): Starting URL; its scheme and host define the origin
+        max_depth (int): Maximum number of links followed from the base URL
+        max_pages (int): Page budget for the whole crawl
+        max_concurrent (int): Maximum number of pages fetched concurrently
+        parser (str): HTML parser backend, see PARSERS
+        fetcher (PageFetcher, optional): Fetcher to use; created and closed by the call if None
+        executor (Executor, optional): Executor used for parsing, owned by the
+            caller. Defaults to the long-lived pool of parse_executor().
+
+    Yields:
+        Tuple[RoutePage, str]: Inventory entry and extracted text, in completion order
+    """
+    if parser not in PARSERS:
+        raise ValueError(f"Unsupported parser: {parser}")
+    max_concurrent = max(1, max_concurrent)
+    start_url = normalize_url(base_url)
+    parts = urlsplit(start_url)
+    origin = f"{parts.scheme}://{parts.netloc}"
+
+    own_fetcher = fetcher is None
+    if own_fetcher:
+        fetcher = PageFetcher(max_concurrent=max_concurrent)
+    if executor is None:
+        executor = parse_executor()
+
+    loop = asyncio.get_running_loop()
+    url_queue: asyncio.Queue = asyncio.Queue()
+    result_queue: asyncio.Queue = asyncio.Queue(maxsize=max_concurrent * 2)
+    seen = {start_url}
+    url_queue.put_nowait((start_url, 0, None))
+
+    async def worker():
+        while True:
+            url, depth, found_on = await url_queue.get()
+            try:
+                try:
+                    html, record = await fetcher.fetch_with_record(url)
+                except Exception as e:
+                    # Cache or limiter errors must not stop the worker, or join() never returns
+                    logger.error(f"Error fetching {url}: {str(e)}")
+                    html, record = None, FetchRecord(url, fetcher.mode, reason=str(e), ok=False)
+                start = time.perf_counter()
+                try:
+                    text = await loop.run_in_executor(executor, parse_html, html, parser)
+                except Exception as e:
+                    logger.error(f"Error parsing {url}: {str(e)}")
+                    text = ""
+                parse_time = time.perf_counter() - start
+
+                links = extract_links(text, url, origin)
+                if depth < max_depth:
+                    for link in links:
+                        if link not in seen and len(seen) < max_pages:
+                            seen.add(link)
+                            url_queue.put_nowait((link, depth + 1, url))
+
+                page = RoutePage(url, urlsplit(url).path, depth, found_on, record.ok,
+                                 record.method, round(record.total_time, 3), round(parse_time, 3),
+                                 sum(not c.isspace() for c in text), len(links))
+                await result_queue.put((page, text))
+            finally:
+                url_queue.task_done()
+
+    async def wait_done():
+        await url_queue.join()
+        await result_queue.put(None)
+
+    tasks = []
+    try:
+        tasks = [asyncio.create_task(worker()) for _ in range(max_concurrent)]
+        tasks.append(asyncio.create_task(wait_done()))
+        while True:
+            item = await result_queue.get()
+            if item is None:
+                break
+            yield item
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if own_fetcher:
+            await fetcher.close()
+
+def write_route_inventory(path: Path, base_url: str, pages: List[RoutePage],
+                          max_depth: int, max_pages: int) -> None:
+    """Write crawl results as JSON for other tools (see load_route_inventory)."""
+    inventory = {
+        'base_url': base_url,
+        'generated_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'max_depth': max_depth,
+        'max_pages': max_pages,
+        'pages': [asdict(page) for page in sorted(pages, key=lambda p: (p.depth, p.path))],
+    }
+    Path(path).write_text(json.dumps(inventory, indent=2) + '\n', encoding='utf-8')
+
+def load_route_inventory(path: Path, include_failed: bool = False) -> List[str]:
+    """Return the page URLs of a route inventory written by a crawl."""
+    inventory = json.loads(Path(path).read_text(encoding='utf-8'))
+    return [page['url'] for page in inventory['pages'] if include_failed or page['ok']]
 
 def validate_url(url: str) -> bool:
     """Validate if the given string is a valid URL."""
@@ -162,11 +1029,112 @@ def validate_url(url: str) -> bool:
     except:
         return False
 
+def index_result(index: Optional[SiteIndex], url: str, text: str, ok: bool = True) -> None:
+    """Add a page to the local search index, or drop it if it no longer loads."""
+    if index is None:
+        return
+    if ok and text.strip():
+        index.add(url, text)
+    else:
+        index.delete(url)
+
+def print_result(url: str, text: str):
+    """Print the extracted content of a page to stdout."""
+    print(f"\n=== Content from {url} ===")
+    print(text)
+    print("=" * 80)
+
+async def run(urls: List[str], args) -> None:
+    """Fetch, parse and print pages for the command line, then report fetch paths."""
+    cache = PageCache(args.cache_path, args.cache_ttl,
+                      int(args.cache_max_mb * 1024 * 1024)) if args.cache else None
+    index = SiteIndex(args.index) if args.index else None
+    async with PageFetcher(args.fetch, args.max_concurrent, args.min_text_chars,
+                           DEFAULT_JS_MARKERS + args.js_marker, cache=cache,
+                           block_profile=args.block,
+                           limiter=default_limiter() if args.rate_limit else None) as fetcher:
+        if args.crawl:
+            crawled = []
+            async for page, text in crawl(urls[0], args.max_depth, args.max_pages, args.max_concurrent,
+                                          parser=args.parser, fetcher=fetcher):
+                crawled.append(page)
+                index_result(index, page.url, text, page.ok)
+                print_result(page.url, text)
+                sys.stdout.flush()
+            if args.inventory_out:
+                write_route_inventory(args.inventory_out, urls[0], crawled, args.max_depth, args.max_pages)
+                logger.info(f"Wrote route inventory with {len(crawled)} pages to {args.inventory_out}")
+        else:
+            pages = stream_urls(urls, args.max_concurrent, args.queue_size,
+                                parser=args.parser, fetcher=fetcher)
+            if args.stream:
+                async for url, text in pages:
+                    index_result(index, url, text)
+                    print_result(url, text)
+                    sys.stdout.flush()
+            else:
+                results = {}
+                async for url, text in pages:
+                    index_result(index, url, text)
+                    results[url] = text
+                for url in urls:
+                    print_result(url, results.get(url, ""))
+        logger.info("Fetch summary:\n" + fetcher.summary())
+    if cache is not None:
+        cache.close()
+    if index is not None:
+        stats = index.stats()
+        logger.info(f"Search index {args.index}: {stats['pages']} pages")
+        index.close()
+
 def main():
-    parser = argparse.ArgumentParser(description='Fetch and extract text content from webpages.')
-    parser.add_argument('urls', nargs='+', help='URLs to process')
+    parser = argparse.ArgumentParser(
+        description='Fetch and extract text content from webpages.',
+        epilog='Pages are requested over plain HTTP first and loaded in Chromium only when they '
+               'need JavaScript (see --fetch). Nothing is cached or written under ~/.cache '
+               'unless --cache, --rate-limit or --index is given.')
+    parser.add_argument('urls', nargs='*', help='URLs to process (the base URL with --crawl)')
+    parser.add_argument('--urls-from', type=Path, metavar='INVENTORY',
+                       help='Also process the pages of a route inventory written by --crawl')
+    parser.add_argument('--crawl', action='store_true',
+                       help='Crawl same-origin links starting from the first URL')
+    parser.add_argument('--max-depth', type=int, default=2,
+                       help='With --crawl, maximum number of links followed from the base URL (default: 2)')
+    parser.add_argument('--max-pages', type=int, default=50,
+                       help='With --crawl, maximum number of pages fetched (default: 50)')
+    parser.add_argument('--inventory-out', type=Path, metavar='FILE',
+                       help='With --crawl, write the route inventory with per-page timings to FILE (JSON)')
+    parser.add_argument('--index', type=Path, nargs='?', const=DEFAULT_INDEX_PATH, metavar='DIR',
+                       help='Add extracted pages to the local search index queried by site_index.py and '
+                            f'search_engine.py --site (default DIR: {DEFAULT_INDEX_PATH})')
     parser.add_argument('--max-concurrent', type=int, default=5,
-                       help='Maximum number of concurrent browser instances (default: 5)')
+                       help='Maximum number of pages fetched concurrently (default: 5)')
+    parser.add_argument('--stream', action='store_true',
+                       help='Print each page as soon as it is parsed instead of in input order')
+    parser.add_argument('--queue-size', type=int, default=None,
+                       help='Maximum number of fetched pages waiting to be parsed (default: 2x --max-concurrent)')
+    parser.add_argument('--parser', choices=list(PARSERS), default='html5lib',
+                       help='HTML parser backend; "stream" never builds a tree (default: html5lib)')
+    parser.add_argument('--fetch', choices=FETCH_MODES, default='auto',
+                       help='auto: plain HTTP first, browser only when the page needs JavaScript; '
+                            'http/browser: force one path (default: auto)')
+    parser.add_argument('--min-text-chars', type=int, default=200,
+                       help='Escalate HTTP responses with less text than this to the browser (default: 200)')
+    parser.add_argument('--js-marker', action='append', default=[], metavar='REGEX',
+                       help='Extra regex marking a page that needs JavaScript rendering (repeatable)')
+    parser.add_argument('--block', choices=list(PROFILES), default='text-only',
+                       help='Requests to skip when a page is loaded in the browser (default: text-only)')
+    parser.add_argument('--rate-limit', action='store_true',
+                       help='Pace requests per host with the rate limiter shared by the tools, whose state '
+                            'is kept under ~/.cache')
+    parser.add_argument('--cache', action='store_true',
+                       help='Serve pages from the on-disk page cache for --cache-ttl seconds, then revalidate')
+    parser.add_argument('--cache-path', type=Path, default=DEFAULT_CACHE_PATH,
+                       help=f'With --cache, page cache file (default: {DEFAULT_CACHE_PATH})')
+    parser.add_argument('--cache-ttl', type=float, default=DEFAULT_TTL,
+                       help=f'With --cache, seconds a cached page is used without revalidation (default: {DEFAULT_TTL})')
+    parser.add_argument('--cache-max-mb', type=float, default=DEFAULT_MAX_BYTES / 1024 / 1024,
+                       help='With --cache, evict least recently used pages beyond this size (default: 200)')
     parser.add_argument('--debug', action='store_true',
                        help='Enable debug logging')
     
@@ -175,6 +1143,9 @@ def main():
     if args.debug:
         logger.setLevel(logging.DEBUG)
     
+    if args.urls_from:
+        args.urls += load_route_inventory(args.urls_from)
+    
     # Validate URLs
     valid_urls = []
     for url in args.urls:
@@ -189,13 +1160,7 @@ def main():
     
     start_time = time.time()
     try:
-        results = asyncio.run(process_urls(valid_urls, args.max_concurrent))
-        
-        # Print results to stdout
-        for url, text in zip(valid_urls, results):
-            print(f"\n=== Content from {url} ===")
-            print(text)
-            print("=" * 80)
+        asyncio.run(run(valid_urls, args))
         
         logger.info(f"Total processing time: {time.time() - start_time:.2f}s")
         
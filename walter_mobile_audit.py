@@ -11,6 +11,9 @@ from playwright.async_api import async_playwright
 import json
 from datetime import datetime
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tools', 'utilities'))
+from artifact_store import ArtifactStore
+
 class WalterMobileAuditor:
     def __init__(self, environment="localhost"):
         if environment == "localhost":
@@ -23,6 +26,8 @@ class WalterMobileAuditor:
         self.screenshots_dir = f"walter_mobile_audit_{self.env_name}"
         self.mobile_viewport = {"width": 375, "height": 812}  # iPhone 13 Pro
         self.audit_results = []
+        self.artifacts = ArtifactStore()
+        self.run_id = self.artifacts.start_run(self.screenshots_dir)
         
         # Walter's credentials
         self.test_user = {
@@ -52,7 +57,10 @@ class WalterMobileAuditor:
     async def take_screenshot(self, page, name, description=""):
         """Take a screenshot and analyze mobile UX"""
         screenshot_path = f"{self.screenshots_dir}/{name}.png"
-        await page.screenshot(path=screenshot_path, full_page=True)
+        # Stored once per distinct render; the audit directory gets a hard link
+        data = await page.screenshot(full_page=True)
+        # PNG recompression is CPU-bound; keep it off the event loop
+        await asyncio.to_thread(self.artifacts.save_screenshot, self.run_id, f"{name}.png", data, screenshot_path)
         
         # Analyze touch targets
         touch_issues = await self.analyze_touch_targets(page)
@@ -256,6 +264,9 @@ class WalterMobileAuditor:
         
         with open(f"{self.screenshots_dir}/mobile_ux_report.json", "w") as f:
             json.dump(report, f, indent=2)
+        self.artifacts.put_file(self.run_id, "mobile_ux_report.json",
+                                f"{self.screenshots_dir}/mobile_ux_report.json")
+        print(self.artifacts.stats.summary())
         
         print(f"📁 Screenshots: {self.screenshots_dir}/")
         print(f"📄 Report: {self.screenshots_dir}/mobile_ux_report.json")